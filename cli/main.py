@@ -4,26 +4,149 @@
 
 import argparse
 import asyncio
-import json
+import functools
 import logging
 import os
 import sys
 
-from dotenv import load_dotenv
-load_dotenv()
-
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-from llm_api.config import settings
-from cli.handler import CogniQuantumCLIV2Fixed
-from llm_api.providers import list_providers, list_enhanced_providers
-from llm_api.utils.helper_functions import format_json_output, read_from_pipe_or_file
+from llm_api.config import get_settings
+
+# 重いサブモジュール（spaCy、各プロバイダーSDK、RAG依存関係）は、
+# --help や --list-providers などの短命な実行パスでロードしないよう、
+# 実際に使用する分岐の中で遅延インポートする。
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _ensure_env_loaded() -> None:
+    """.envファイルを一度だけ読み込む。環境変数を必要とする分岐からのみ呼び出す。"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+# APIキーが必要なプロバイダーと、そのキーを保持する環境変数名
+_PROVIDER_ENV = {
+    'openai': 'OPENAI_API_KEY',
+    'claude': 'CLAUDE_API_KEY',
+    'gemini': 'GEMINI_API_KEY',
+    'huggingface': 'HF_TOKEN',
+}
+
+# Ollamaサーバーへの生存確認が応答しない場合に起動が止まらないようにするための上限（秒）
+_OLLAMA_PROBE_TIMEOUT = 5.0
+
+async def _check_provider_available(cli, provider_name: str) -> bool:
+    """プロバイダーの事前チェック。APIキー型は環境変数のみ、Ollamaはサーバーへ問い合わせる。"""
+    if provider_name == 'ollama':
+        try:
+            ollama_health = await asyncio.wait_for(cli._check_ollama_models(), timeout=_OLLAMA_PROBE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Ollamaサーバーの確認が{_OLLAMA_PROBE_TIMEOUT}秒以内に完了しませんでした。")
+            return False
+        return bool(ollama_health.get('server_available'))
+
+    env_var = _PROVIDER_ENV.get(provider_name)
+    if env_var and not os.environ.get(env_var):
+        print(f"警告: プロバイダー '{provider_name}' のAPIキーが設定されていません。")
+        return False
+    return True
+
+def _print_minimal_usage():
+    """引数なしで起動された場合の簡易ヘルプ。argparseの構築を行わずに表示する。"""
+    prog = os.path.basename(sys.argv[0]) if sys.argv else "fetch_llm_v2.py"
+    print(f"usage: {prog} [provider] [prompt] [--mode MODE] [options]")
+    print(f"詳細なオプションは `{prog} --help` を参照してください。")
+
+def _print_provider_list():
+    """利用可能なプロバイダー一覧を表示する。"""
+    from llm_api.providers import list_providers, list_enhanced_providers
+    print("標準プロバイダー:", ", ".join(list_providers()))
+    enhanced_info = list_enhanced_providers()
+    print("拡張プロバイダー V2:", ", ".join(enhanced_info['v2']))
+
+# --install-nlp でモデル名が省略された場合にダウンロードするspaCyモデル
+_DEFAULT_NLP_MODELS = ['en_core_web_sm', 'ja_core_news_sm']
+
+def _install_nlp_models(model_names):
+    """複雑性分析で使用するspaCyモデルを明示的にダウンロードする。"""
+    try:
+        from spacy.cli import download
+    except ImportError:
+        print("spaCyがインストールされていません: pip install spacy")
+        return
+    for model_name in model_names:
+        print(f"spaCyモデル '{model_name}' をダウンロード中...")
+        try:
+            download(model_name)
+        except SystemExit as e:
+            print(f"spaCyモデル '{model_name}' のダウンロードに失敗しました: {e}")
+
+def _use_block_buffered_stdout():
+    """JSON出力時は改行ごとのフラッシュを止め、出力をまとめて書き込む（対話的な出力では使用しない）。"""
+    reconfigure = getattr(sys.stdout, 'reconfigure', None)
+    if reconfigure is not None:
+        reconfigure(line_buffering=False, write_through=False)
+
+def _render_text_response(response: dict) -> str:
+    """テキスト出力モードの表示内容を組み立て、一度の書き込みで出力できる文字列として返す。"""
+    # 先頭の本文は改行を付けずに出力し、以降の各行は print() と同じく改行で終端する
+    lines = []
+    
+    if response.get('image_url'):
+        lines.append(f"\n\n関連画像: {response['image_url']}")
+
+    if response.get('error') or response.get('fallback_used') or response.get('version') == 'v2':
+        lines.append("")
+
+    if response.get('error'):
+        lines.append("\n⚠️  エラーが発生しました")
+        if response.get('all_errors'):
+            lines.append("詳細エラー:")
+            for i, error in enumerate(response['all_errors'], 1):
+                lines.append(f"  {i}. {error}")
+        
+        if response.get('suggestions'):
+            lines.append("\n💡 改善提案:")
+            for suggestion in response['suggestions']:
+                lines.append(f"  • {suggestion}")
+    
+    elif response.get('fallback_used'):
+        lines.append(f"\n✓ フォールバック実行: {response.get('fallback_type')}")
+        if response.get('original_errors'):
+            lines.append("元のエラー:")
+            for error in response['original_errors']:
+                lines.append(f"  • {error}")
+    
+    elif response.get('version') == 'v2':
+        v2_info = response.get('paper_based_improvements', {})
+        lines.append("\n📊 V2処理情報:")
+        lines.append(f"  複雑性体制: {v2_info.get('regime', 'N/A')}")
+        lines.append(f"  推論アプローチ: {v2_info.get('reasoning_approach', 'N/A')}")
+        if v2_info.get('overthinking_prevention'):
+            lines.append("  ✓ Overthinking防止有効")
+        if v2_info.get('collapse_prevention'):
+            lines.append("  ✓ 崩壊防止機構有効")
+        if v2_info.get('real_time_adjustment_active'):
+            lines.append("  ✓ リアルタイム複雑性調整有効")
+        if v2_info.get('rag_enabled'):
+            rag_source = "Wikipedia" if v2_info.get('rag_source') == 'wikipedia' else 'Knowledge Base'
+            lines.append(f"  ✓ RAGによる知識拡張有効 (ソース: {rag_source})")
+
+    return response.get("text", "") + "".join(f"{line}\n" for line in lines)
+
 async def main():
+    # 自明に即時終了する呼び出しでは、argparseの構築自体を省略する
+    cli_args = sys.argv[1:]
+    if not cli_args:
+        _print_minimal_usage()
+        return
+    if cli_args == ['--list-providers']:
+        _print_provider_list()
+        return
+
     parser = argparse.ArgumentParser(
         description="CogniQuantum V2統合LLM CLI（設定管理改善版）",
         formatter_class=argparse.RawTextHelpFormatter
@@ -37,7 +160,7 @@ async def main():
         'efficient', 'balanced', 'decomposed', 'adaptive', 'paper_optimized', 'parallel',
         'quantum_inspired', 'edge'
     ]
-    parser.add_argument("--mode", default=settings.V2_DEFAULT_MODE, choices=mode_choices, help="実行モード")
+    parser.add_argument("--mode", default=get_settings().V2_DEFAULT_MODE, choices=mode_choices, help="実行モード")
     
     parser.add_argument("--model", help="使用するモデル名（デフォルトはプロバイダー毎に設定）")
     parser.add_argument("-f", "--file", help="ファイルからプロンプトを読み込み")
@@ -50,6 +173,7 @@ async def main():
     parser.add_argument("--system-status", action="store_true", help="システム状態表示")
     parser.add_argument("--health-check", action="store_true", help="健全性チェック実行")
     parser.add_argument("--troubleshooting", action="store_true", help="トラブルシューティングガイド")
+    parser.add_argument("--install-nlp", nargs='*', metavar="MODEL", help="複雑性分析用のspaCyモデルをダウンロード（省略時は英語・日本語モデル）")
     
     v2_group = parser.add_argument_group('V2 Options')
     v2_group.add_argument("--force-v2", action="store_true", help="V2機能強制使用")
@@ -63,14 +187,20 @@ async def main():
 
     args = parser.parse_args()
 
-    cli = CogniQuantumCLIV2Fixed()
+    if args.json:
+        _use_block_buffered_stdout()
 
     if args.list_providers:
-        print("標準プロバイダー:", ", ".join(list_providers()))
-        enhanced_info = list_enhanced_providers()
-        print("拡張プロバイダー V2:", ", ".join(enhanced_info['v2']))
+        _print_provider_list()
         return
 
+    if args.install_nlp is not None:
+        _install_nlp_models(args.install_nlp or _DEFAULT_NLP_MODELS)
+        return
+
+    from cli.handler import CogniQuantumCLIV2Fixed
+    cli = CogniQuantumCLIV2Fixed()
+
     if args.system_status:
         cli.print_system_status()
         return
@@ -83,30 +213,18 @@ async def main():
         parser.print_help()
         return
         
-    is_available = True
-    if args.provider == 'ollama':
-        ollama_health = await cli._check_ollama_models()
-        if not ollama_health.get('server_available'):
-            is_available = False
-    else:
-        key_map = {
-            'openai': settings.OPENAI_API_KEY, 
-            'claude': settings.CLAUDE_API_KEY, 
-            'gemini': settings.GEMINI_API_KEY, 
-            'huggingface': settings.HF_TOKEN
-        }
-        if args.provider in key_map and not key_map.get(args.provider):
-            print(f"警告: プロバイダー '{args.provider}' のAPIキーが設定されていません。")
-            is_available = False
-    
-    if not is_available:
+    _ensure_env_loaded()
+
+    if not await _check_provider_available(cli, args.provider):
         print("プロバイダーが利用できないため、処理を中断します。")
         return
 
+    from llm_api.utils.helper_functions import format_json_output, read_from_pipe_or_file
+
     if args.health_check:
         try:
             health_report = await cli.check_system_health(args.provider)
-            print(format_json_output(health_report) if args.json else json.dumps(health_report, indent=2, ensure_ascii=False))
+            print(format_json_output(health_report))
             return
         except Exception as e:
             print(f"健全性チェック中にエラー: {e}")
@@ -125,55 +243,17 @@ async def main():
     kwargs.pop('prompt', None)
 
     try:
+        _ensure_env_loaded()
         response = await cli.process_request_with_fallback(
             args.provider, prompt, **kwargs
         )
         
         if args.json:
             print(format_json_output(response))
+            sys.stdout.flush()
         else:
-            text_output = response.get("text", "")
-            print(text_output, end='')
-            
-            if response.get('image_url'):
-                print(f"\n\n関連画像: {response['image_url']}")
-
-            if response.get('error') or response.get('fallback_used') or response.get('version') == 'v2':
-                print() 
-
-            if response.get('error'):
-                print(f"\n⚠️  エラーが発生しました")
-                if response.get('all_errors'):
-                    print("詳細エラー:")
-                    for i, error in enumerate(response['all_errors'], 1):
-                        print(f"  {i}. {error}")
-                
-                if response.get('suggestions'):
-                    print("\n💡 改善提案:")
-                    for suggestion in response['suggestions']:
-                        print(f"  • {suggestion}")
-            
-            elif response.get('fallback_used'):
-                print(f"\n✓ フォールバック実行: {response.get('fallback_type')}")
-                if response.get('original_errors'):
-                    print("元のエラー:")
-                    for error in response['original_errors']:
-                        print(f"  • {error}")
-            
-            elif response.get('version') == 'v2':
-                v2_info = response.get('paper_based_improvements', {})
-                print(f"\n📊 V2処理情報:")
-                print(f"  複雑性体制: {v2_info.get('regime', 'N/A')}")
-                print(f"  推論アプローチ: {v2_info.get('reasoning_approach', 'N/A')}")
-                if v2_info.get('overthinking_prevention'):
-                    print("  ✓ Overthinking防止有効")
-                if v2_info.get('collapse_prevention'):
-                    print("  ✓ 崩壊防止機構有効")
-                if v2_info.get('real_time_adjustment_active'):
-                    print("  ✓ リアルタイム複雑性調整有効")
-                if v2_info.get('rag_enabled'):
-                    rag_source = "Wikipedia" if v2_info.get('rag_source') == 'wikipedia' else 'Knowledge Base'
-                    print(f"  ✓ RAGによる知識拡張有効 (ソース: {rag_source})")
+            sys.stdout.write(_render_text_response(response))
+            sys.stdout.flush()
 
     except KeyboardInterrupt:
         print("\n中断されました。")
@@ -184,6 +264,9 @@ async def main():
 if __name__ == "__main__":
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    else:
+        from llm_api._eventloop import install as install_event_loop
+        install_event_loop()
     
     from llm_api import setup_logging
     setup_logging()
@@ -19,6 +19,8 @@ from cli.main import main
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 
 if __name__ == "__main__":
+    from llm_api._eventloop import install as install_event_loop
+    install_event_loop()
     try:
         asyncio.run(main())
     except Exception as e:
@@ -1,6 +1,6 @@
 # /llm_api/__init__.py
 # タイトル: CogniQuantum統合LLM APIモジュール (Refactored)
-# 役割: モジュールの初期化とロギング設定を行う。設定読み込みはconfigモジュールに委譲。
+# 役割: モジュールの初期化とロギング設定関数を提供する。設定読み込みはconfigモジュールに委譲。
 
 __version__ = "2.1.0"
 __author__ = "CogniQuantum Project"
@@ -8,11 +8,17 @@ __description__ = "CogniQuantum統合LLM CLI - 革新的認知量子推論シス
 
 import logging
 import os
-from llm_api.config import settings
 
 # ロギング設定
+# インポート時には自動で呼び出さない。ライブラリ利用時に利用者側のロギング設定を上書きしないよう、
+# エントリーポイント（cli/main.pyなど）から明示的に呼び出す。
 def setup_logging():
-    """ロギングの設定"""
+    """ロギングの設定（ルートロガーにハンドラが設定済みの場合は何もしない）"""
+    if logging.getLogger().handlers:
+        return
+
+    from llm_api.config import settings
+
     log_level_str = os.getenv("LOG_LEVEL", settings.LOG_LEVEL).upper()
     log_level = getattr(logging, log_level_str, logging.INFO)
     
@@ -24,7 +30,4 @@ def setup_logging():
     
     # CogniQuantum特有のロガー
     cq_logger = logging.getLogger('cogniquantum')
-    cq_logger.setLevel(log_level)
-
-# モジュール初期化時にロギングを設定
-setup_logging()
\ No newline at end of file
+    cq_logger.setLevel(log_level)
\ No newline at end of file
@@ -0,0 +1,30 @@
+# /llm_api/_eventloop.py
+# タイトル: Optional uvloop Event Loop Installer
+# 役割: uvloopが利用可能な環境では、asyncioのイベントループをlibuvベースの実装に切り替える。
+
+import asyncio
+import logging
+import sys
+
+logger = logging.getLogger(__name__)
+
+_installed = False
+
+def install() -> bool:
+    """
+    uvloopのイベントループポリシーを設定する。asyncio.run()の前に呼び出す必要がある。
+    Windows・uvloop未インストール時は何もしない。複数回呼び出しても安全。
+    """
+    global _installed
+    if _installed:
+        return True
+    if sys.platform == 'win32':
+        return False
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    _installed = True
+    logger.debug("uvloopのイベントループポリシーを設定しました。")
+    return True
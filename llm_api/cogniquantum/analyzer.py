@@ -2,9 +2,13 @@
 # タイトル: Multi-Language and Edge-Aware Complexity Analyzer (Corrected)
 # 役割: 複雑性分析ロジックを修正し、日本語のような非スペース区切り言語でもNLP分析が正しくトリガーされるようにする。
 
+import functools
+import hashlib
 import logging
+import re
 import spacy
-from typing import Tuple, Optional, Dict, Any
+from collections import OrderedDict
+from typing import NamedTuple, Tuple, Optional, Dict, Any
 
 from langdetect import detect, LangDetectException
 
@@ -13,14 +17,86 @@ from .learner import ComplexityLearner
 
 logger = logging.getLogger(__name__)
 
+try:
+    from numba import njit
+except ImportError:  # numbaは任意依存。未インストール時は同じ関数を純粋なPythonとして実行する
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+
+# 複雑性分析が参照する属性（sents, noun_chunks, ents, pos_, tag_, lemma_, is_stop）を
+# 生成するために必要なパイプラインコンポーネント。attribute_rulerはpos_の付与に必要なため残す。
+_REQUIRED_PIPES = frozenset({
+    'tok2vec', 'transformer', 'tagger', 'morphologizer', 'attribute_ruler',
+    'lemmatizer', 'parser', 'senter', 'ner',
+})
+
+_COGNITIVE_KEYWORDS = frozenset({
+    'compare', 'contrast', 'analyze', 'evaluate', 'synthesize', 'create', 'argue', 'derive', 'prove',
+    '比較', '対比', '分析', '評価', '統合', '創造', '議論', '導出', '証明',
+})
+_WH_TAGS = frozenset({'WDT', 'WP', 'WP$', 'WRB'})
+_DEEP_WH_LEMMAS = frozenset({'why', 'how', 'なぜ', 'どのように'})
+_NON_CONTENT_POS = frozenset({'PUNCT', 'SPACE', 'SYM', 'NUM'})
+# ドメインキーワードは「含まれるか否か」のみが重要なため、カテゴリごとの加点をまとめて定義する
+_DOMAIN_WEIGHTS = {'math': 15, 'planning': 20, 'analysis': 15}
+# この文字数未満のプロンプトは言語検出・NLP・キーワード走査を行わずに低複雑性とみなす。
+# 日本語のような非スペース区切り言語があるため、単語数ではなく文字数で判定する。
+_TRIVIAL_PROMPT_CHARS = 15
+
+class _DocFeatures(NamedTuple):
+    """spaCyのDocから抽出した、複雑性スコア算出に必要なスカラー値。"""
+    token_count: int
+    num_sentences: int
+    num_noun_chunks: int
+    num_entities: int
+    unique_entity_labels: int
+    content_word_count: int
+    cognitive_hits: int
+    wh_bonus: int
+
+@njit(cache=True, fastmath=True)
+def _nlp_score_kernel(token_count, num_sentences, num_noun_chunks, num_entities,
+                      unique_entity_labels, content_word_count, cognitive_hits, wh_bonus):
+    """
+    NLP特徴量から(構文, 語彙, 認知, 合計)の正規化スコアを算出する数値カーネル。
+    numbaが利用可能な場合はJITコンパイルされる。
+    """
+    avg_sent_length = token_count / num_sentences
+    syntactic_score = (num_sentences * 1.5) + (avg_sent_length * 0.5) + (num_noun_chunks * 1.0)
+    normalized_syntactic = min(syntactic_score / 40.0, 1.0) * 100
+
+    entity_score = (num_entities * 2.0) + (unique_entity_labels * 3.0)
+    lexical_diversity_score = content_word_count * 0.2
+    lexical_score = entity_score + lexical_diversity_score
+    normalized_lexical = min(lexical_score / 50.0, 1.0) * 100
+
+    cognitive_demand_score = cognitive_hits * 10 + wh_bonus
+    normalized_cognitive = min(cognitive_demand_score / 30.0, 1.0) * 100
+
+    total_score = (normalized_syntactic * 0.40 +
+                   normalized_lexical * 0.35 +
+                   normalized_cognitive * 0.25)
+    return normalized_syntactic, normalized_lexical, normalized_cognitive, min(max(total_score, 0.0), 100.0)
+
 class AdaptiveComplexityAnalyzer:
     """
     プロンプトの言語を自動検出し、その言語に最適化された複雑性分析を行う。
     Edgeモードに対応し、リソース消費を抑制する。
     """
+    DOC_CACHE_SIZE = 128
+    RESULT_CACHE_SIZE = 256
+
     def __init__(self, learner: Optional[ComplexityLearner] = None):
         self.learner = learner
         self.nlp_models: Dict[str, Any] = {}
+        # 同一プロンプトの再分析（リトライやRAG再クエリ）でspaCyパイプラインを再実行しないためのLRUキャッシュ
+        self._doc_cache: "OrderedDict[Tuple[str, str], _DocFeatures]" = OrderedDict()
+        # 言語検出からレジーム決定までの結果をプロンプト単位で保持するLRUキャッシュ。
+        # 学習済みの提案は随時更新されるため、キャッシュ参照はショートカット判定の後に行う。
+        # RAGで拡張された長いプロンプトを保持し続けないよう、キーはプロンプトのダイジェストにする。
+        self._result_cache: "OrderedDict[bytes, Tuple[float, ComplexityRegime]]" = OrderedDict()
         self.keyword_sets = {
             'en': {
                 'conditional': ['if', 'when', 'unless', 'provided', 'given'],
@@ -39,6 +115,20 @@ class AdaptiveComplexityAnalyzer:
                 'analysis': ['分析', '比較', '評価', '検討', '考察'],
             }
         }
+        # 構造スコアはキーワードごとの出現回数（str.count）の合計で数える。
+        # 1つの選択パターンで走査すると、重なり合うキーワードの一方しか数えられずスコアが変わるため使わない
+        self.structure_keywords = {
+            lang: {category: tuple(categories[category]) for category in ('conditional', 'constraint')}
+            for lang, categories in self.keyword_sets.items()
+        }
+        # ドメイン判定用: 全カテゴリを名前付きグループの先読みパターンにまとめ、プロンプトを一度だけ走査する
+        self.domain_patterns = {
+            lang: self._compile_domain_pattern(categories) for lang, categories in self.keyword_sets.items()
+        }
+        # 階層キーワードは単語単位の照合なので、O(1)で判定できるfrozensetとして保持する
+        self.hierarchy_words = {
+            lang: frozenset(categories['hierarchy']) for lang, categories in self.keyword_sets.items()
+        }
         self.spacy_model_map = {
             'en': 'en_core_web_sm',
             'ja': 'ja_core_news_sm',
@@ -47,10 +137,63 @@ class AdaptiveComplexityAnalyzer:
             'fr': 'fr_core_news_sm',
         }
     
+    @staticmethod
+    def _compile_domain_pattern(categories) -> "re.Pattern[str]":
+        """
+        ドメインカテゴリを1つのパターンにまとめる。ゼロ幅の先読みにすることで、
+        カテゴリをまたいで重なり合うキーワードも取りこぼさない。
+        """
+        groups = '|'.join(
+            f"(?P<{category}>" + '|'.join(re.escape(kw) for kw in categories[category]) + ")"
+            for category in _DOMAIN_WEIGHTS
+        )
+        return re.compile(f"(?=(?:{groups}))")
+
+    def _domain_categories_present(self, prompt_lower: str, lang: str) -> set:
+        """プロンプトに含まれるドメインカテゴリを1回の走査で求める。全カテゴリが見つかった時点で打ち切る。"""
+        pattern = self.domain_patterns.get(lang, self.domain_patterns['en'])
+        found = set()
+        for match in pattern.finditer(prompt_lower):
+            found.add(match.lastgroup)
+            if len(found) == len(_DOMAIN_WEIGHTS):
+                break
+        return found
+
     def analyze_complexity(self, prompt: str, mode: str = 'adaptive') -> Tuple[float, ComplexityRegime]:
         """
         多言語とEdgeモードに対応した複雑性分析。
         """
+        shortcut = self._shortcut_complexity(prompt, mode)
+        if shortcut is not None:
+            return shortcut
+
+        cached = self._get_cached_result(prompt)
+        if cached is not None:
+            return cached
+
+        lang = self._detect_language(prompt)
+        return self._store_result(prompt, self._analyze_detected(prompt, lang))
+
+    @staticmethod
+    def _result_cache_key(prompt: str) -> bytes:
+        return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).digest()
+
+    def _get_cached_result(self, prompt: str) -> Optional[Tuple[float, ComplexityRegime]]:
+        key = self._result_cache_key(prompt)
+        cached = self._result_cache.get(key)
+        if cached is not None:
+            self._result_cache.move_to_end(key)
+            logger.debug("複雑性分析の結果をキャッシュから返します。")
+        return cached
+
+    def _store_result(self, prompt: str, result: Tuple[float, ComplexityRegime]) -> Tuple[float, ComplexityRegime]:
+        self._result_cache[self._result_cache_key(prompt)] = result
+        if len(self._result_cache) > self.RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
+        return result
+
+    def _shortcut_complexity(self, prompt: str, mode: str) -> Optional[Tuple[float, ComplexityRegime]]:
+        """Edgeモード・学習済みの提案・極端に短いプロンプトの場合に、分析を行わずに結果を返す。"""
         if mode == 'edge':
             logger.info("エッジモードのため、軽量なキーワード分析を実行し、低複雑性レジームに固定します。")
             return 10.0, ComplexityRegime.LOW
@@ -63,17 +206,23 @@ class AdaptiveComplexityAnalyzer:
                 if suggestion == ComplexityRegime.MEDIUM: return 50.0, suggestion
                 if suggestion == ComplexityRegime.HIGH: return 85.0, suggestion
 
-        lang = self._detect_language(prompt)
-        
+        if len(prompt.strip()) < _TRIVIAL_PROMPT_CHARS:
+            logger.info("プロンプトが非常に短いため、分析を省略して低複雑性レジームとします。")
+            return 5.0, ComplexityRegime.LOW
+
+        return None
+
+    def _analyze_detected(self, prompt: str, lang: str) -> Tuple[float, ComplexityRegime]:
+        """言語検出済みのプロンプトについて複雑性スコアとレジームを算出する。"""
         nlp = self._get_spacy_model(lang)
         
         # len(prompt.split()) > 10 では日本語の単語数を正しく判定できないため、
         # トークン化後の長さで判定するように修正。
         if nlp:
-            doc = nlp(prompt)
-            if len(doc) > 5: # トークン数が5より大きい場合にNLP分析を実行
+            features = self._get_doc_features(nlp, lang, prompt)
+            if features.token_count > 5: # トークン数が5より大きい場合にNLP分析を実行
                 logger.info(f"'{lang}'言語のNLPベース高度分析を実行します。")
-                complexity_score = self._nlp_enhanced_analysis(doc)
+                complexity_score = self._nlp_enhanced_analysis(features)
             else:
                 logger.info(f"プロンプトが短いため、'{lang}'言語のキーワードベース分析を実行します。")
                 complexity_score = self._keyword_based_analysis(prompt, lang)
@@ -118,40 +267,40 @@ class AdaptiveComplexityAnalyzer:
             return None
             
         try:
-            if not spacy.util.is_package(model_name):
-                logger.info(f"spaCyモデル '{model_name}' が見つかりません。ダウンロードを試みます...")
-                spacy.cli.download(model_name)
-                logger.info(f"モデル '{model_name}' のダウンロードが完了しました。")
-            
             nlp = spacy.load(model_name)
+            unused_pipes = [name for name in nlp.pipe_names if name not in _REQUIRED_PIPES]
+            if unused_pipes:
+                nlp.select_pipes(disable=unused_pipes)
+                logger.debug(f"spaCyモデル '{model_name}' の未使用コンポーネントを無効化しました: {unused_pipes}")
             logger.info(f"spaCyモデル '{model_name}' のロードに成功しました。")
             self.nlp_models[lang] = nlp
             return nlp
-        except (ImportError, OSError, SystemExit) as e:
-            logger.error(
-                f"spaCyモデル '{model_name}' のロードまたはダウンロードに失敗しました: {e}\n"
-                f"高度な分析を有効にするには、手動でインストールしてください: python -m spacy download {model_name}"
+        except (ImportError, OSError) as e:
+            logger.warning(
+                f"spaCyモデル '{model_name}' をロードできませんでした: {e} "
+                f"(高度な分析を有効にするには: python fetch_llm_v2.py --install-nlp {model_name})"
             )
             self.nlp_models[lang] = None
             return None
 
     def _keyword_based_analysis(self, prompt: str, lang: str) -> float:
         """言語に応じたキーワードセットを使用して複雑性を分析する。"""
-        keywords = self.keyword_sets.get(lang, self.keyword_sets['en'])
+        structure_keywords = self.structure_keywords.get(lang, self.structure_keywords['en'])
+        hierarchy_words = self.hierarchy_words.get(lang, self.hierarchy_words['en'])
+        # 小文字化と単語分割はここで一度だけ行い、以降の各指標で共有する
         prompt_lower = prompt.lower()
+        words = prompt_lower.split()
+        word_count = len(words)
         
-        length_score = min(len(prompt.split()) / 5.0, 40)
+        length_score = min(word_count / 5.0, 40)
 
         structural_complexity = 0
-        structural_complexity += sum(prompt_lower.count(p) for p in keywords['conditional']) * 3
-        structural_complexity += sum(1 for word in prompt_lower.split() if word in keywords['hierarchy']) * 2
-        structural_complexity += sum(prompt_lower.count(p) for p in keywords['constraint']) * 4
+        structural_complexity += sum(map(prompt_lower.count, structure_keywords['conditional'])) * 3
+        structural_complexity += sum(map(hierarchy_words.__contains__, words)) * 2
+        structural_complexity += sum(map(prompt_lower.count, structure_keywords['constraint'])) * 4
         structure_score = min(structural_complexity, 30)
 
-        domain_complexity = 0
-        if any(kw in prompt_lower for kw in keywords['math']): domain_complexity += 15
-        if any(kw in prompt_lower for kw in keywords['planning']): domain_complexity += 20
-        if any(kw in prompt_lower for kw in keywords['analysis']): domain_complexity += 15
+        domain_complexity = sum(_DOMAIN_WEIGHTS[c] for c in self._domain_categories_present(prompt_lower, lang))
         domain_score = min(domain_complexity, 30)
 
         weights = {'length': 0.2, 'structure': 0.4, 'domain': 0.4}
@@ -161,41 +310,77 @@ class AdaptiveComplexityAnalyzer:
         
         return min(max(total_score, 0), 100.0)
 
-    def _nlp_enhanced_analysis(self, doc) -> float:
+    def _get_doc_features(self, nlp, lang: str, prompt: str) -> _DocFeatures:
+        """spaCyで解析した特徴量を返す。同一の(言語, プロンプト)はキャッシュから返す。"""
+        key = (lang, prompt)
+        cached = self._doc_cache.get(key)
+        if cached is not None:
+            self._doc_cache.move_to_end(key)
+            return cached
+
+        features = self._extract_doc_features(nlp(prompt))
+        self._store_doc_features(key, features)
+        return features
+
+    def _store_doc_features(self, key: Tuple[str, str], features: _DocFeatures) -> None:
+        self._doc_cache[key] = features
+        if len(self._doc_cache) > self.DOC_CACHE_SIZE:
+            self._doc_cache.popitem(last=False)
+
+    def _extract_doc_features(self, doc) -> _DocFeatures:
+        """spaCyのDocオブジェクトから複雑性分析に必要なスカラー値を抽出する。"""
+        content_words = set()
+        cognitive_matches = set()
+        has_wh = False
+        has_deep_wh = False
+        # トークン列を一度だけ走査し、内容語・認知動詞・疑問詞を同時に集計する
+        for token in doc:
+            lemma = token.lemma_.lower()
+            pos = token.pos_
+            if pos not in _NON_CONTENT_POS and not token.is_stop:
+                content_words.add(lemma)
+            if pos == 'VERB' and lemma in _COGNITIVE_KEYWORDS:
+                cognitive_matches.add(lemma)
+            if token.tag_ in _WH_TAGS or 'なぜ' in token.text or 'どのように' in token.text:
+                has_wh = True
+                if lemma in _DEEP_WH_LEMMAS:
+                    has_deep_wh = True
+
+        ents = doc.ents
+        wh_bonus = (15 if has_deep_wh else 5) if has_wh else 0
+
+        return _DocFeatures(
+            token_count=len(doc),
+            num_sentences=sum(1 for _ in doc.sents),
+            num_noun_chunks=sum(1 for _ in doc.noun_chunks),
+            num_entities=len(ents),
+            unique_entity_labels=len({ent.label_ for ent in ents}),
+            content_word_count=len(content_words),
+            cognitive_hits=len(cognitive_matches),
+            wh_bonus=wh_bonus,
+        )
+
+    def _nlp_enhanced_analysis(self, features: _DocFeatures) -> float:
         """
-        言語に依存しない、spaCyのDocオブジェクトを使用した高度な複雑性分析。
+        言語に依存しない、spaCyのDocから抽出した特徴量を使用した高度な複雑性分析。
         """
-        sentences = list(doc.sents)
-        num_sentences = len(sentences)
-        if num_sentences == 0: return 5.0
-        avg_sent_length = len(doc) / num_sentences
-        num_noun_chunks = len(list(doc.noun_chunks))
-        syntactic_score = (num_sentences * 1.5) + (avg_sent_length * 0.5) + (num_noun_chunks * 1.0)
-        normalized_syntactic = min(syntactic_score / 40.0, 1.0) * 100
-
-        num_entities = len(doc.ents)
-        unique_entity_labels = len(set(ent.label_ for ent in doc.ents))
-        entity_score = (num_entities * 2.0) + (unique_entity_labels * 3.0)
-        content_words = {token.lemma_.lower() for token in doc if token.pos_ not in ['PUNCT', 'SPACE', 'SYM', 'NUM'] and not token.is_stop}
-        lexical_diversity_score = len(content_words) * 0.2
-        lexical_score = entity_score + lexical_diversity_score
-        normalized_lexical = min(lexical_score / 50.0, 1.0) * 100
-
-        cognitive_keywords = {'compare', 'contrast', 'analyze', 'evaluate', 'synthesize', 'create', 'argue', 'derive', 'prove', '比較', '対比', '分析', '評価', '統合', '創造', '議論', '導出', '証明'}
-        cognitive_lemmas = {token.lemma_.lower() for token in doc if token.pos_ == 'VERB'}
-        cognitive_demand_score = len(cognitive_keywords.intersection(cognitive_lemmas)) * 10
-        wh_words = {token.lemma_.lower() for token in doc if token.tag_ in ['WDT', 'WP', 'WP$', 'WRB'] or 'なぜ' in token.text or 'どのように' in token.text}
-        if wh_words:
-            cognitive_demand_score += 15 if any(w in wh_words for w in ['why', 'how', 'なぜ', 'どのように']) else 5
-        normalized_cognitive = min(cognitive_demand_score / 30.0, 1.0) * 100
-
-        weights = {'syntactic': 0.40, 'lexical': 0.35, 'cognitive': 0.25}
-        total_score = (normalized_syntactic * weights['syntactic'] +
-                       normalized_lexical * weights['lexical'] +
-                       normalized_cognitive * weights['cognitive'])
+        if features.num_sentences == 0: return 5.0
+        normalized_syntactic, normalized_lexical, normalized_cognitive, total_score = _nlp_score_kernel(*features)
 
         logger.debug(
             f"NLP Analysis Scores (Normalized): Syntactic={normalized_syntactic:.2f}, "
             f"Lexical={normalized_lexical:.2f}, Cognitive={normalized_cognitive:.2f}"
         )
-        return min(max(total_score, 0), 100.0)
\ No newline at end of file
+        return total_score
+
+
+@functools.lru_cache(maxsize=1)
+def get_analyzer() -> AdaptiveComplexityAnalyzer:
+    """
+    プロセス内で共有するAdaptiveComplexityAnalyzerを返す。
+    spaCyモデルのロードと学習データの読み込みを、リクエストごとではなくプロセスごとに一度だけ行う。
+    """
+    # 数値カーネルを実際と同じ整数型の引数で一度呼び、JITコンパイル（またはディスクキャッシュの読み込み）を
+    # 最初のリクエストではなく初期化時に済ませておく
+    _nlp_score_kernel(*_DocFeatures(1, 1, 0, 0, 0, 0, 0, 0))
+    return AdaptiveComplexityAnalyzer(learner=ComplexityLearner())
\ No newline at end of file
@@ -0,0 +1,244 @@
+# /llm_api/cogniquantum/cache.py
+# タイトル: Response Cache for LLM Providers
+# 役割: プロバイダーのcall()をラップし、同一の(プロンプト, システムプロンプト, 生成パラメータ)に対する決定的な応答を
+#       プロセス内のLRUとSQLiteに保存・再利用する。応答キャッシュはこの層に一本化し、RESPONSE_CACHE_ENABLEDで有効化する。
+
+import asyncio
+import atexit
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# キャッシュファイルのパスごとに1つのSQLite接続（とその排他ロック）を全CachedProviderで共有する
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_connections_lock = threading.Lock()
+
+
+def _shared_connection(cache_path: str) -> Tuple[sqlite3.Connection, threading.Lock]:
+    """パスに対応する共有接続を返す。初回のみ接続を開いてテーブルを作成する。"""
+    with _connections_lock:
+        entry = _connections.get(cache_path)
+        if entry is None:
+            conn = sqlite3.connect(cache_path, check_same_thread=False)
+            try:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS response_cache ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                conn.commit()
+            except sqlite3.Error:
+                conn.close()
+                raise
+            entry = (conn, threading.Lock())
+            _connections[cache_path] = entry
+        return entry
+
+
+# 同一プロセス内の繰り返しはSQLiteまで行かずに返すための、全CachedProviderで共有するLRU（キー -> (保存時刻, 応答)）
+_MEMORY_TIER_SIZE = 4096
+_memory_tier: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """応答キャッシュのヒット・ミス数を返す（全CachedProvider共通）。"""
+    return dict(_stats)
+
+
+@atexit.register
+def close_connections() -> None:
+    """共有しているSQLite接続をすべて閉じる（プロセス終了時にも自動で呼ばれる）。"""
+    with _connections_lock:
+        for conn, lock in _connections.values():
+            with lock:
+                conn.close()
+        _connections.clear()
+
+
+class CachedProvider:
+    """
+    LLMProviderをラップし、call()の応答を完全一致キーでキャッシュするデコレータ。
+    call()以外の属性アクセスはラップ対象のプロバイダーへそのまま委譲する。
+    エラーを含む応答はキャッシュしない。
+    既定ではtemperatureが明示的に0以下の決定的な呼び出しのみを対象とし、それより高いtemperatureの呼び出しと、
+    temperatureを指定しない（プロバイダー既定のサンプリングになる）呼び出しはキャッシュを経由しない。
+    評価のようにほぼ決定的な呼び出しでは、max_temperatureで上限を引き上げられる。
+    """
+
+    def __init__(self, provider, cache_path: Optional[str] = None, ttl_seconds: Optional[float] = None,
+                 static_kwargs: Optional[Dict[str, Any]] = None, max_temperature: float = 0.0):
+        self._provider = provider
+        self.max_temperature = max_temperature
+        # 呼び出しごとに変わらない生成パラメータ（エンジンのbase_model_kwargs）は、キー用のJSON断片を一度だけ作っておく
+        self._static_kwargs = dict(static_kwargs or {})
+        self._static_fragment = json.dumps(sorted(self._static_kwargs.items()), ensure_ascii=False, default=str)
+        self.cache_path = cache_path or settings.RESPONSE_CACHE_PATH
+        self.ttl_seconds = settings.RESPONSE_CACHE_TTL if ttl_seconds is None else ttl_seconds
+        self._conn, self._lock = _shared_connection(self.cache_path)
+
+    @classmethod
+    def wrap(cls, provider, static_kwargs: Optional[Dict[str, Any]] = None, max_temperature: float = 0.0):
+        """設定でキャッシュが有効な場合のみプロバイダーをラップする（二重ラップはしない）。"""
+        if isinstance(provider, cls) or not settings.RESPONSE_CACHE_ENABLED:
+            return provider
+        try:
+            return cls(provider, static_kwargs=static_kwargs, max_temperature=max_temperature)
+        except sqlite3.Error as e:
+            logger.warning(f"応答キャッシュを初期化できませんでした。キャッシュなしで続行します: {e}")
+            return provider
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._provider, name)
+
+    def _bypasses_cache(self, kwargs: Dict[str, Any]) -> bool:
+        temperature = kwargs.get('temperature')
+        return temperature is None or temperature > self.max_temperature
+
+    def _make_key(self, prompt: str, system_prompt: str, kwargs: Dict[str, Any]) -> str:
+        static = self._static_kwargs
+        if static and all(key in kwargs and kwargs[key] == value for key, value in static.items()):
+            # 静的なパラメータはエンコード済みの断片を使い、呼び出しごとに変わる部分だけをエンコードする
+            dynamic = [(key, value) for key, value in sorted(kwargs.items()) if key not in static]
+            fragment = self._static_fragment
+        else:
+            dynamic = sorted(kwargs.items())
+            fragment = ''
+        payload = json.dumps(
+            [self._provider.provider_name, prompt, system_prompt, dynamic],
+            ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(f"{payload}\x00{fragment}".encode('utf-8')).hexdigest()
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key: str, created_at: float, response: Dict[str, Any]) -> None:
+        _memory_tier[key] = (created_at, response)
+        _memory_tier.move_to_end(key)
+        if len(_memory_tier) > _MEMORY_TIER_SIZE:
+            _memory_tier.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        return created_at, json.loads(response)
+
+    def _store(self, key: str, created_at: float, response: Dict[str, Any]) -> None:
+        serialized = json.dumps(response, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, response, created_at) VALUES (?, ?, ?)",
+                (key, serialized, created_at)
+            )
+            self._conn.commit()
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        """プロセス内のLRU、SQLiteの順に有効期限内の応答を探す。見つからなければNone。"""
+        entry = _memory_tier.get(key)
+        if entry is None:
+            try:
+                entry = await asyncio.to_thread(self._lookup, key)
+            except (sqlite3.Error, json.JSONDecodeError) as e:
+                logger.warning(f"応答キャッシュの読み込みに失敗しました: {e}")
+                entry = None
+            if entry is not None and not self._is_expired(entry[0]):
+                self._remember(key, *entry)
+        else:
+            _memory_tier.move_to_end(key)
+        if entry is None or self._is_expired(entry[0]):
+            _stats["misses"] += 1
+            return None
+        _stats["hits"] += 1
+        logger.debug(f"応答キャッシュにヒットしました (key={key[:12]})")
+        return dict(entry[1])
+
+    async def _put(self, key: str, response: Dict[str, Any]) -> None:
+        if response.get('error'):
+            return
+        created_at = time.time()
+        self._remember(key, created_at, dict(response))
+        try:
+            await asyncio.to_thread(self._store, key, created_at, response)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"応答キャッシュへの保存に失敗しました: {e}")
+
+    async def call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
+        if self._bypasses_cache(kwargs):
+            return await self._provider.call(prompt, system_prompt, **kwargs)
+        key = self._make_key(prompt, system_prompt, kwargs)
+        cached = await self._get(key)
+        if cached is not None:
+            return cached
+
+        response = await self._provider.call(prompt, system_prompt, **kwargs)
+        await self._put(key, response)
+        return response
+
+    async def batch_call(self, requests: List[Tuple[str, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        キャッシュにヒットしたリクエストは保存済みの応答を使い、残りだけをラップ対象のbatch_callにまとめて送る。
+        プロバイダー固有のバッチ処理（同時実行数の制限など）を活かしつつキャッシュも効かせる。
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        pending: List[Tuple[int, Optional[str]]] = []
+        for i, (prompt, system_prompt, kwargs) in enumerate(requests):
+            if self._bypasses_cache(kwargs):
+                pending.append((i, None))
+                continue
+            key = self._make_key(prompt, system_prompt, kwargs)
+            cached = await self._get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, key))
+
+        if pending:
+            responses = await self._provider.batch_call([requests[i] for i, _ in pending])
+            for (i, key), response in zip(pending, responses):
+                results[i] = response
+                if key is not None:
+                    await self._put(key, response)
+        return results
+
+    async def stream_call(self, prompt: str, system_prompt: str = "", **kwargs) -> AsyncIterator[str]:
+        """
+        キャッシュにヒットした場合は保存済みのテキストを1チャンクで返す。
+        ミス時はプロバイダーのストリームを中継し、最後まで受信できた場合のみ保存する。
+        """
+        if self._bypasses_cache(kwargs):
+            stream = self._provider.stream_call(prompt, system_prompt, **kwargs)
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
+            return
+        key = self._make_key(prompt, system_prompt, kwargs)
+        cached = await self._get(key)
+        if cached is not None:
+            yield cached.get('text', '')
+            return
+
+        chunks = []
+        stream = self._provider.stream_call(prompt, system_prompt, **kwargs)
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            await stream.aclose()
+        await self._put(key, {'text': ''.join(chunks), 'error': None})
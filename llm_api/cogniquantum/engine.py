@@ -6,21 +6,260 @@ import logging
 import json
 import re
 import asyncio
-from typing import Any, Dict, List, Optional
+import functools
+import io
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
-from .analyzer import AdaptiveComplexityAnalyzer
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # orjsonは任意依存。未インストール時は標準のjsonを使用する
+    _json_loads = json.loads
+
+try:
+    import tiktoken
+except ImportError:  # tiktokenは任意依存。未インストール時はバイト長から概算する
+    tiktoken = None
+
+from .analyzer import AdaptiveComplexityAnalyzer, get_analyzer
+from .cache import CachedProvider
 from .enums import ComplexityRegime
-from ..providers.base import LLMProvider
+from ..providers.base import LLMProvider, ProviderCapability
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+# 各推論パスの固定指示文。プロンプトの先頭に置き、実行ごとにバイト単位で同一に保つことで、
+# プロバイダー側のプレフィックスキャッシュ（OpenAIの自動キャッシュ、Claudeのcache_control）が効くようにする。
+_LOW_PREAMBLE = """以下の問題に対して、簡潔で効率的な解答を提供してください。
+過度な分析や長時間の検討は避け、直接的なアプローチを取ってください。
+
+"""
+_MEDIUM_PREAMBLE = """以下の中程度の複雑性を持つ問題を、段階的かつ体系的に解決してください。
+
+"""
+_DECOMPOSITION_PREAMBLE = """以下の複雑な問題を、解決可能な独立したサブ問題に分解してください。
+思考プロセスを段階的に示し、最終的にサブ問題のリストをJSON配列として出力してください。
+
+"""
+_STAGED_PREAMBLE = """以下の背景情報と元の問題を踏まえ、指定された「サブ問題」を解決してください。
+これは大きな問題の一部です。このサブ問題に集中して、詳細かつ具体的な解決策を提示してください。
+
+# 背景
+"""
+_BATCHED_STAGED_PREAMBLE = """以下の背景情報と元の問題を踏まえ、列挙された各「サブ問題」をそれぞれ解決してください。
+これらは大きな問題の一部です。各サブ問題に集中して、詳細かつ具体的な解決策を提示してください。
+
+# 背景
+"""
+_INTEGRATION_PREAMBLE = """以下の「これまでの統合結果」と「新しい情報」を論理的に結合し、より包括的で一貫性のある一つの文章にまとめてください。
+
+"""
+_FINAL_POLISH_PREAMBLE = """以下の文章は、複数の部分的な解答を統合して作成されました。
+全体の構成を整え、冗長な部分を削除し、一貫性のある流れるような最終レポートとして完成させてください。元の質問に明確に答える形で締めくくってください。
+
+"""
+_SUMMARY_PREAMBLE = """以下の文章は、大きな問題の一部に対する解決策です。後で他の解決策と統合するため、
+重要な結論・根拠・具体的な数値や手順を失わないように要約してください。
+
+"""
+
+# 各推論パスの可変部分のテンプレート。呼び出しごとにf-stringを組み立てず、format_mapで値だけを差し込む。
+_LOW_BODY_TEMPLATE = """問題: {prompt}
+
+重要: 最初に思いついた合理的な解答が往々にして正解です。"""
+_MEDIUM_BODY_TEMPLATE = """問題: {prompt}
+
+推論プロセス:
+1. 問題の核心的要素を特定
+2. 解決に必要な情報を整理
+3. 段階的解決戦略を構築
+4. 各段階を実行し、中間結果を検証
+5. 最終解を統合
+
+各段階で中間結果を明示し、次の段階への論理的接続を示してください。"""
+_DECOMPOSITION_BODY_TEMPLATE = """問題: {prompt}
+
+出力形式は必ず以下のJSONフォーマットに従ってください。
+{{
+  "sub_problems": [
+    "サブ問題1: ...",
+    "サブ問題2: ...",
+    "サブ問題3: ..."
+  ]
+}}
+"""
+_ORIGINAL_PROBLEM_TEMPLATE = "元の問題: {original_prompt}\n\n"
+_STAGED_BODY_TEMPLATE = """# 解決すべきサブ問題
+{sub_problem}
+"""
+_BATCHED_STAGED_BODY_TEMPLATE = """# 解決すべきサブ問題
+{enumerated}
+
+出力形式は必ず以下のJSONフォーマットに従ってください。indexは上記の番号です。
+{{
+  "solutions": [
+    {{"index": 0, "solution": "..."}}
+  ]
+}}
+"""
+_INTEGRATION_BODY_TEMPLATE = """# これまでの統合結果
+---
+{integrated_solution}
+---
+
+# 新しい情報
+---
+{next_solution}
+---
+
+# 統合された新しい結果
+（ここまでの内容を自然に統合した、より完全な文章を生成してください）
+"""
+_FINAL_POLISH_BODY_TEMPLATE = """# 元の質問
+{original_prompt}
+
+# 統合された文章
+{integrated_solution}
+
+# 完成された最終レポート
+"""
+_SUMMARY_BODY_TEMPLATE = """# 要約の上限
+{max_tokens}トークン以内
+
+# 解決策
+{solution}
+
+# 要約
+"""
+
+_NUMBERED_LINE_RE = re.compile(r'^\d+\.')
+
+
+class _JsonObjectScanner:
+    """
+    テキストを先頭から一度だけ走査し、最初に現れるJSONとして解析可能なトップレベルの{...}を返す。
+    括弧の深さと文字列リテラル（エスケープを含む）の状態を保持するため、feed()で追記された部分だけを走査すればよく、
+    ストリーミング中に受信済みのテキストを再走査しない。解析に失敗した{...}の内側は読み直さず、その直後から走査を続ける。
+    """
+
+    def __init__(self):
+        self._text = ''
+        self._pos = 0  # 次に走査する位置
+        self._start = -1  # 走査中のトップレベルの{の位置（-1は括弧の外）
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> Optional[Dict[str, Any]]:
+        self._text += chunk
+        text = self._text
+        n = len(text)
+        i = self._pos
+        start, depth, in_string, escaped = self._start, self._depth, self._in_string, self._escaped
+        while i < n:
+            if start == -1:
+                i = text.find('{', i)
+                if i == -1:
+                    i = n
+                    break
+                start, depth, in_string, escaped = i, 0, False, False
+            ch = text[i]
+            i += 1
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth -= 1
+                if depth == 0:
+                    span_start, start = start, -1
+                    try:
+                        parsed = _json_loads(text[span_start:i])
+                    except ValueError:
+                        continue
+                    if isinstance(parsed, dict):
+                        self._pos, self._start = i, -1
+                        return parsed
+        self._pos = i
+        self._start, self._depth, self._in_string, self._escaped = start, depth, in_string, escaped
+        return None
+
+
+def _find_json_object(text: str) -> Optional[Dict[str, Any]]:
+    """テキスト中で最初に現れる、JSONとして解析可能なトップレベルの{...}を返す（一度だけの走査）。"""
+    return _JsonObjectScanner().feed(text)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_token_encoding():
+    return tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
+
+
+def _count_tokens(text: str) -> int:
+    """テキストのトークン数を返す。tiktokenがない場合は、英語で約4バイト・日本語で約3バイトを1トークンとして概算する。"""
+    encoding = _get_token_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text.encode('utf-8')) // 3
+
+
 class EnhancedReasoningEngine:
-    # ... (init, execute_reasoning, low/medium/high, decompose, solve_decomposed は変更なし) ...
     def __init__(self, provider: LLMProvider, base_model_kwargs: Dict[str, Any], complexity_analyzer: Optional[AdaptiveComplexityAnalyzer] = None):
-        self.provider = provider
+        # 全ての推論パスのprovider.call()が応答キャッシュを経由するよう、ここで一度だけラップする。
+        # サンプリングを伴う生成（temperature>0や未指定）の応答は固定しないよう、決定的な呼び出しだけを対象にする
+        self.provider = CachedProvider.wrap(provider, static_kwargs=base_model_kwargs, max_temperature=0.0)
         self.base_model_kwargs = base_model_kwargs
-        self.complexity_analyzer = complexity_analyzer or AdaptiveComplexityAnalyzer()
+        self.complexity_analyzer = complexity_analyzer or get_analyzer()
+        # サブ問題解決の同時実行数を制限するセマフォ。呼び出しごとに作らず、イベントループごとに1つを使い回す
+        self._solve_semaphore: Optional[asyncio.Semaphore] = None
+        self._solve_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def _call_until_json(self, prefix: str, body: str, system_prompt: str) -> Dict[str, Any]:
+        """
+        ストリーミング対応のプロバイダーでは応答を逐次受信し、JSONオブジェクトが閉じた時点で生成を打ち切る。
+        JSON以降のトークンを生成させないことで、待ち時間と課金トークンを削減する。
+        ストリーミングに失敗した場合は通常の呼び出しにフォールバックする。
+        """
+        if not self.provider.get_capabilities().get(ProviderCapability.STREAMING, False):
+            return await self._call_with_prefix(prefix, body, system_prompt)
+
+        chunks: List[str] = []
+        # 受信済みの部分は再走査せず、追記されたチャンクだけを走査する
+        scanner = _JsonObjectScanner()
+        stream = self.provider.stream_call(prefix + body, system_prompt, cache_prefix=prefix, **self.base_model_kwargs)
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                if scanner.feed(chunk) is not None:
+                    logger.debug("応答中のJSONオブジェクトが完結したため、ストリーミングを打ち切ります。")
+                    break
+        except Exception as e:
+            logger.warning(f"ストリーミング呼び出しに失敗したため、通常の呼び出しにフォールバックします: {e}")
+            return await self._call_with_prefix(prefix, body, system_prompt)
+        finally:
+            await stream.aclose()
+        return {'text': ''.join(chunks), 'error': None}
+
+    def _get_solve_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._solve_semaphore is None or self._solve_semaphore_loop is not loop:
+            limit = settings.ollama_total_concurrency()
+            self._solve_semaphore = asyncio.Semaphore(limit)
+            self._solve_semaphore_loop = loop
+            logger.info(f"同時リクエスト数を{limit}に制限します。")
+        return self._solve_semaphore
+
+    async def _call_with_prefix(self, prefix: str, body: str, system_prompt: str) -> Dict[str, Any]:
+        """固定のプレフィックスと可変部分を連結して呼び出す。プレフィックスはcache_prefixとしてプロバイダーに伝える。"""
+        return await self.provider.call(prefix + body, system_prompt, cache_prefix=prefix, **self.base_model_kwargs)
         
     async def execute_reasoning(
         self,
@@ -44,6 +283,72 @@ class EnhancedReasoningEngine:
         else:
             return await self._execute_high_complexity_reasoning(prompt, system_prompt)
 
+    async def execute_reasoning_batch(
+        self,
+        prompt: str,
+        system_prompt: str,
+        regimes: List[ComplexityRegime]
+    ) -> List[Any]:
+        """
+        同じプロンプトを複数のレジームで推論する。結果はregimesと同じ順序で返し、
+        失敗したレジームの位置には例外を入れる。
+        """
+        results: List[Any] = [None] * len(regimes)
+        async for index, result in self.iter_reasoning_batch(prompt, system_prompt, regimes):
+            results[index] = result
+        return results
+
+    async def iter_reasoning_batch(
+        self,
+        prompt: str,
+        system_prompt: str,
+        regimes: List[ComplexityRegime],
+        eager: Tuple[ComplexityRegime, ...] = ()
+    ) -> AsyncIterator[Tuple[int, Any]]:
+        """
+        同じプロンプトを複数のレジームで推論し、完了した順に(regimesでのインデックス, 結果)をyieldする。
+        単発呼び出しで済む低・中複雑性のリクエストはprovider.batch_call()にまとめ、
+        高複雑性の多段推論はそれと並行して実行する。失敗したレジームの結果は例外になる。
+        eagerに含まれるレジームはバッチに入れず個別に実行し、他の完了を待たずに結果をyieldする。
+        呼び出し側が途中で反復をやめた場合、未完了の推論はキャンセルされる。
+        """
+        single_call_builders = {
+            ComplexityRegime.LOW: (_LOW_PREAMBLE, _LOW_BODY_TEMPLATE, self._low_complexity_result),
+            ComplexityRegime.MEDIUM: (_MEDIUM_PREAMBLE, _MEDIUM_BODY_TEMPLATE, self._medium_complexity_result),
+        }
+        batched = [i for i, regime in enumerate(regimes) if regime in single_call_builders and regime not in eager]
+        requests = []
+        for i in batched:
+            preamble, body_template, _ = single_call_builders[regimes[i]]
+            body = body_template.format_map({'prompt': prompt})
+            requests.append((preamble + body, system_prompt, {'cache_prefix': preamble, **self.base_model_kwargs}))
+
+        async def run_batch() -> List[Tuple[int, Any]]:
+            try:
+                responses = await self.provider.batch_call(requests)
+            except Exception as e:
+                return [(i, e) for i in batched]
+            return [(i, single_call_builders[regimes[i]][2](response)) for i, response in zip(batched, responses)]
+
+        async def run_single(index: int) -> List[Tuple[int, Any]]:
+            try:
+                return [(index, await self.execute_reasoning(prompt, system_prompt, regime=regimes[index]))]
+            except Exception as e:
+                return [(index, e)]
+
+        others = [i for i in range(len(regimes)) if i not in batched]
+        logger.info(f"レジーム別推論をまとめて実行: バッチ{len(requests)}件, 個別{len(others)}件")
+        tasks = [asyncio.create_task(run_single(i)) for i in others]
+        if requests:
+            tasks.append(asyncio.create_task(run_batch()))
+        try:
+            for next_completed in asyncio.as_completed(tasks):
+                for index, result in await next_completed:
+                    yield index, result
+        finally:
+            for task in tasks:
+                task.cancel()
+
     async def _execute_low_complexity_reasoning(
         self, 
         prompt: str, 
@@ -52,21 +357,20 @@ class EnhancedReasoningEngine:
         """低複雑性問題の推論（overthinking防止）"""
         logger.info("低複雑性推論モード: 簡潔・効率重視")
         
-        efficient_prompt = f"""以下の問題に対して、簡潔で効率的な解答を提供してください。
-過度な分析や長時間の検討は避け、直接的なアプローチを取ってください。
-
-問題: {prompt}
-
-重要: 最初に思いついた合理的な解答が往々にして正解です。"""
-        
-        response = await self.provider.call(efficient_prompt, system_prompt, **self.base_model_kwargs)
+        efficient_body = _LOW_BODY_TEMPLATE.format_map({'prompt': prompt})
         
+        response = await self._call_with_prefix(_LOW_PREAMBLE, efficient_body, system_prompt)
+        return self._low_complexity_result(response)
+
+    @staticmethod
+    def _low_complexity_result(response: Dict[str, Any]) -> Dict[str, Any]:
         return {
             'solution': response.get('text', ''),
             'error': response.get('error'),
             'complexity_regime': ComplexityRegime.LOW.value,
             'reasoning_approach': 'efficient_direct',
-            'overthinking_prevention': True
+            'overthinking_prevention': True,
+            'completion_tokens': (response.get('usage') or {}).get('completion_tokens'),
         }
     
     async def _execute_medium_complexity_reasoning(
@@ -77,27 +381,20 @@ class EnhancedReasoningEngine:
         """中程度複雑性問題の推論（最適体制）"""
         logger.info("中複雑性推論モード: バランス型思考")
         
-        structured_prompt = f"""以下の中程度の複雑性を持つ問題を、段階的かつ体系的に解決してください。
-
-問題: {prompt}
-
-推論プロセス:
-1. 問題の核心的要素を特定
-2. 解決に必要な情報を整理
-3. 段階的解決戦略を構築
-4. 各段階を実行し、中間結果を検証
-5. 最終解を統合
-
-各段階で中間結果を明示し、次の段階への論理的接続を示してください。"""
-        
-        response = await self.provider.call(structured_prompt, system_prompt, **self.base_model_kwargs)
+        structured_body = _MEDIUM_BODY_TEMPLATE.format_map({'prompt': prompt})
         
+        response = await self._call_with_prefix(_MEDIUM_PREAMBLE, structured_body, system_prompt)
+        return self._medium_complexity_result(response)
+
+    @staticmethod
+    def _medium_complexity_result(response: Dict[str, Any]) -> Dict[str, Any]:
         return {
             'solution': response.get('text', ''),
             'error': response.get('error'),
             'complexity_regime': ComplexityRegime.MEDIUM.value,
             'reasoning_approach': 'structured_progressive',
-            'stage_verification': True
+            'stage_verification': True,
+            'completion_tokens': (response.get('usage') or {}).get('completion_tokens'),
         }
     
     async def _execute_high_complexity_reasoning(
@@ -108,19 +405,44 @@ class EnhancedReasoningEngine:
         """高複雑性問題の推論（崩壊回避戦略）- サブ問題の並列解決を導入"""
         logger.info("高複雑性推論モード: 分解・並列解決・統合")
         
-        sub_problems = await self._decompose_complex_problem(prompt, system_prompt)
-        if isinstance(sub_problems, dict) and sub_problems.get('error'):
-            return {'solution': '', 'error': sub_problems['error']}
-        
-        if not sub_problems:
+        # SPECULATIVE_MEDIUM_DRAFTが有効な場合、分解と並行してフォールバック用の中複雑性推論を投機的に開始しておく。
+        # 分解に失敗した場合は追加の呼び出しなしでこの結果を返し、成功した場合はキャンセルする。
+        # Ollamaを逐次実行に制限している場合は、同時リクエストを避けるため投機実行しない。
+        draft_task = None
+        if settings.SPECULATIVE_MEDIUM_DRAFT and self._allows_concurrent_requests():
+            draft_task = asyncio.create_task(self._execute_medium_complexity_reasoning(prompt, system_prompt))
+
+        try:
+            sub_problems = await self._decompose_complex_problem(prompt, system_prompt)
+        except BaseException:
+            if draft_task:
+                draft_task.cancel()
+            raise
+
+        decomposition_error = sub_problems.get('error') if isinstance(sub_problems, dict) else None
+        if decomposition_error and not draft_task:
+            return {'solution': '', 'error': decomposition_error}
+
+        if decomposition_error or not sub_problems:
             logger.warning("問題の分解に失敗、またはサブ問題がありません。標準的なアプローチにフォールバックします。")
-            return await self._execute_medium_complexity_reasoning(prompt, system_prompt)
+            draft = await draft_task if draft_task else await self._execute_medium_complexity_reasoning(prompt, system_prompt)
+            if decomposition_error and draft.get('error'):
+                return {'solution': '', 'error': decomposition_error}
+            return draft
+
+        if draft_task:
+            draft_task.cancel()
 
-        staged_solutions = await self._solve_decomposed_problems(sub_problems, prompt, system_prompt)
+        if self._allows_concurrent_requests() and not self._should_batch_solve(sub_problems):
+            staged_solutions, final_solution = await self._solve_and_integrate_incrementally(sub_problems, prompt, system_prompt)
+        else:
+            staged_solutions = await self._solve_decomposed_problems(sub_problems, prompt, system_prompt)
+            final_solution = None
         if any(s.get('error') for s in staged_solutions):
              logger.warning("一部のサブ問題の解決中にエラーが発生しました。")
         
-        final_solution = await self._integrate_staged_solutions(staged_solutions, prompt, system_prompt)
+        if final_solution is None:
+            final_solution = await self._integrate_staged_solutions(staged_solutions, prompt, system_prompt)
         if isinstance(final_solution, dict) and final_solution.get('error'):
             return {'solution': '', 'error': final_solution['error']}
         
@@ -140,32 +462,18 @@ class EnhancedReasoningEngine:
         system_prompt: str
     ) -> List[str] | Dict:
         """複雑な問題を解決可能なサブ問題のJSONリストに分解する"""
-        decomposition_prompt = f"""以下の複雑な問題を、解決可能な独立したサブ問題に分解してください。
-思考プロセスを段階的に示し、最終的にサブ問題のリストをJSON配列として出力してください。
-
-問題: {prompt}
-
-出力形式は必ず以下のJSONフォーマットに従ってください。
-{{
-  "sub_problems": [
-    "サブ問題1: ...",
-    "サブ問題2: ...",
-    "サブ問題3: ..."
-  ]
-}}
-"""
-        response = await self.provider.call(decomposition_prompt, system_prompt, **self.base_model_kwargs)
+        decomposition_body = _DECOMPOSITION_BODY_TEMPLATE.format_map({'prompt': prompt})
+        response = await self._call_until_json(_DECOMPOSITION_PREAMBLE, decomposition_body, system_prompt)
         if response.get('error'):
             return {'error': response['error']}
         
         try:
             response_text = response.get('text', '{}').strip()
-            match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if not match:
+            parsed_json = _find_json_object(response_text)
+            if parsed_json is None:
                 logger.warning(f"分解応答からJSONを抽出できませんでした。箇条書きとしてパースを試みます。: {response_text}")
-                return [line.strip() for line in response_text.split('\n') if line.strip() and (line.strip().startswith('*') or line.strip().startswith('-') or re.match(r'^\d+\.', line.strip()))]
+                return [line.strip() for line in response_text.split('\n') if line.strip() and (line.strip().startswith('*') or line.strip().startswith('-') or _NUMBERED_LINE_RE.match(line.strip()))]
 
-            parsed_json = json.loads(match.group(0))
             sub_problems = parsed_json.get("sub_problems", [])
             if not isinstance(sub_problems, list):
                 logger.error("分解結果の'sub_problems'がリスト形式ではありません。")
@@ -176,6 +484,14 @@ class EnhancedReasoningEngine:
             logger.error(f"問題の分解結果の解析中にエラー: {e}")
             return []
     
+    def _allows_concurrent_requests(self) -> bool:
+        """プロバイダーへの同時リクエストが許容されるか。Ollamaを逐次実行に制限している場合はFalse。"""
+        return self.provider.provider_name != 'ollama' or settings.ollama_total_concurrency() > 1
+
+    def _should_batch_solve(self, sub_problems: List[str]) -> bool:
+        return (len(sub_problems) <= settings.BATCH_SOLVE_THRESHOLD
+                and sum(len(sp) for sp in sub_problems) < settings.BATCH_SOLVE_CHAR_BUDGET)
+
     async def _solve_decomposed_problems(
         self, 
         sub_problems: List[str], 
@@ -183,32 +499,135 @@ class EnhancedReasoningEngine:
         system_prompt: str
     ) -> List[Dict]:
         """分解されたサブ問題を並列で解決する（同時実行数制限付き）"""
+        if self._should_batch_solve(sub_problems):
+            batched = await self._solve_decomposed_problems_batched(sub_problems, original_prompt, system_prompt)
+            if batched is not None:
+                return batched
+            logger.info("一括解決の結果を解析できなかったため、サブ問題ごとの並列解決にフォールバックします。")
+
         logger.info(f"{len(sub_problems)}個のサブ問題を並列解決します。")
-        
-        concurrency_limit = settings.OLLAMA_CONCURRENCY_LIMIT
-        semaphore = asyncio.Semaphore(concurrency_limit)
-        logger.info(f"同時リクエスト数を{concurrency_limit}に制限します。")
+        solved_parts: List[Optional[Dict]] = [None] * len(sub_problems)
+        async for index, result in self._iter_solved_sub_problems(sub_problems, original_prompt, system_prompt):
+            solved_parts[index] = result
+        return solved_parts
 
-        async def solve_task(sub_problem: str, index: int) -> Dict:
-            async with semaphore:
-                staged_prompt = f"""以下の背景情報と元の問題を踏まえ、指定された「サブ問題」を解決してください。
-これは大きな問題の一部です。このサブ問題に集中して、詳細かつ具体的な解決策を提示してください。
+    async def _iter_solved_sub_problems(
+        self,
+        sub_problems: List[str],
+        original_prompt: str,
+        system_prompt: str
+    ) -> AsyncIterator[Tuple[int, Dict]]:
+        """サブ問題を並列で解決し、完了した順に(インデックス, 結果)をyieldする（同時実行数制限付き）"""
+        semaphore = self._get_solve_semaphore()
 
-# 背景
-元の問題: {original_prompt}
+        # 元の問題までは全サブ問題で共通なので、プレフィックスに含めてキャッシュ対象にする
+        staged_prefix = _STAGED_PREAMBLE + _ORIGINAL_PROBLEM_TEMPLATE.format_map({'original_prompt': original_prompt})
 
-# 解決すべきサブ問題
-{sub_problem}
-"""
+        async def solve_task(sub_problem: str, index: int) -> Tuple[int, Dict]:
+            async with semaphore:
+                staged_body = _STAGED_BODY_TEMPLATE.format_map({'sub_problem': sub_problem})
                 logger.debug(f"サブ問題 {index+1}/{len(sub_problems)} の解決を開始...")
-                response = await self.provider.call(staged_prompt, system_prompt, **self.base_model_kwargs)
+                response = await self._call_with_prefix(staged_prefix, staged_body, system_prompt)
                 logger.debug(f"サブ問題 {index+1}/{len(sub_problems)} の解決が完了。")
-                return {'sub_problem': sub_problem, 'solution': response.get('text', ''), 'error': response.get('error')}
+                return index, {'index': index, 'sub_problem': sub_problem, 'solution': response.get('text', ''), 'error': response.get('error')}
 
-        tasks = [solve_task(sp, i) for i, sp in enumerate(sub_problems)]
-        solved_parts = await asyncio.gather(*tasks)
-        return solved_parts
+        tasks = [asyncio.create_task(solve_task(sp, i)) for i, sp in enumerate(sub_problems)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _solve_and_integrate_incrementally(
+        self,
+        sub_problems: List[str],
+        original_prompt: str,
+        system_prompt: str
+    ) -> Tuple[List[Dict], str | Dict]:
+        """
+        サブ問題の解決と逐次統合を重ねて実行する。先頭から連続して解決済みになった解を順に統合するため、
+        最も遅いサブ問題の待ち時間と統合呼び出しが重なる。
+        統合順序は常に元のサブ問題の順序と一致させ、同じ問題に対する統合プロンプトを実行間で同一に保つ
+        （プロバイダーのプレフィックスキャッシュと応答キャッシュが効くようにする）。
+        """
+        logger.info(f"{len(sub_problems)}個のサブ問題を並列解決し、解決済みのものから順に逐次統合します。")
+        solved_parts: List[Optional[Dict]] = [None] * len(sub_problems)
+        integrated_solution = None
+        integration_failed = False
+        step = 0
+        next_index = 0
+        async for index, result in self._iter_solved_sub_problems(sub_problems, original_prompt, system_prompt):
+            solved_parts[index] = result
+            while next_index < len(solved_parts) and solved_parts[next_index] is not None:
+                ready = solved_parts[next_index]
+                next_index += 1
+                if integration_failed or ready.get('error') or not ready.get('solution'):
+                    continue
+                solution, = await self._fit_solutions_to_budget([ready['solution']], len(sub_problems), system_prompt)
+                if integrated_solution is None:
+                    integrated_solution = solution
+                    continue
+                step += 1
+                merged = await self._integrate_pair(integrated_solution, solution, system_prompt, step)
+                if merged is None:
+                    integration_failed = True
+                else:
+                    integrated_solution = merged
+
+        if integrated_solution is None:
+            logger.error("有効なサブ問題の解決策がないため、統合できません。")
+            return solved_parts, {"error": "No valid sub-solutions to integrate."}
+        if integration_failed:
+            # エラーが発生した場合は、その時点での統合結果を返す
+            return solved_parts, integrated_solution
+        return solved_parts, await self._polish_integrated_solution(integrated_solution, original_prompt, system_prompt)
     
+    async def _solve_decomposed_problems_batched(
+        self,
+        sub_problems: List[str],
+        original_prompt: str,
+        system_prompt: str
+    ) -> Optional[List[Dict]]:
+        """
+        少数のサブ問題を1回の呼び出しでまとめて解決する。共有する背景情報の送信と往復を1回で済ませる。
+        応答を解析できない場合はNoneを返し、呼び出し側で並列解決にフォールバックさせる。
+        """
+        logger.info(f"{len(sub_problems)}個のサブ問題を1回の呼び出しで一括解決します。")
+        # サブ問題ごとの中間文字列を作らず、1つのバッファに直接書き込む
+        buffer = io.StringIO()
+        for i, sp in enumerate(sub_problems):
+            if i:
+                buffer.write("\n")
+            buffer.write(str(i))
+            buffer.write(". ")
+            buffer.write(str(sp))
+        enumerated = buffer.getvalue()
+        batched_body = _BATCHED_STAGED_BODY_TEMPLATE.format_map({'enumerated': enumerated})
+        batched_prefix = _BATCHED_STAGED_PREAMBLE + _ORIGINAL_PROBLEM_TEMPLATE.format_map({'original_prompt': original_prompt})
+        response = await self._call_with_prefix(batched_prefix, batched_body, system_prompt)
+        if response.get('error'):
+            return [{'index': i, 'sub_problem': sp, 'solution': '', 'error': response['error']} for i, sp in enumerate(sub_problems)]
+
+        parsed_json = _find_json_object(response.get('text', ''))
+        if parsed_json is None:
+            return None
+        try:
+            entries = parsed_json.get("solutions", [])
+            solutions_by_index = {
+                int(entry["index"]): str(entry.get("solution", ""))
+                for entry in entries if isinstance(entry, dict) and "index" in entry
+            }
+        except (AttributeError, TypeError, ValueError) as e:
+            logger.warning(f"一括解決の応答の解析中にエラー: {e}")
+            return None
+        if any(not solutions_by_index.get(i) for i in range(len(sub_problems))):
+            return None
+        return [
+            {'index': i, 'sub_problem': sp, 'solution': solutions_by_index[i], 'error': None}
+            for i, sp in enumerate(sub_problems)
+        ]
+
     async def _integrate_staged_solutions(
         self, 
         staged_solutions: List[Dict], 
@@ -216,55 +635,74 @@ class EnhancedReasoningEngine:
         system_prompt: str
     ) -> str | Dict:
         """段階的解決策を「逐次統合」し、一貫性のある最終解を生成する"""
-        valid_solutions = [s['solution'] for s in staged_solutions if s.get('solution') and not s.get('error')]
+        # 統合プロンプトが実行間で同一になるよう、元のサブ問題の順序で統合する
+        ordered = sorted(staged_solutions, key=lambda s: s.get('index', 0))
+        valid_solutions = [s['solution'] for s in ordered if s.get('solution') and not s.get('error')]
         if not valid_solutions:
             logger.error("有効なサブ問題の解決策がないため、統合できません。")
             return {"error": "No valid sub-solutions to integrate."}
 
+        valid_solutions = await self._fit_solutions_to_budget(valid_solutions, len(valid_solutions), system_prompt)
         logger.info(f"{len(valid_solutions)}個の有効な解決策を逐次統合します。")
         
         # 最初の統合
         integrated_solution = valid_solutions[0]
-        if len(valid_solutions) > 1:
-            # 2番目以降の解を順番に統合していく
-            for i, next_solution in enumerate(valid_solutions[1:]):
-                logger.info(f"統合ステップ {i+1}/{len(valid_solutions)-1} を実行中...")
-                integration_prompt = f"""以下の「これまでの統合結果」と「新しい情報」を論理的に結合し、より包括的で一貫性のある一つの文章にまとめてください。
+        # 2番目以降の解を順番に統合していく
+        for i, next_solution in enumerate(valid_solutions[1:]):
+            merged = await self._integrate_pair(integrated_solution, next_solution, system_prompt, i + 1)
+            if merged is None:
+                # エラーが発生した場合は、その時点での統合結果を返す
+                return integrated_solution
+            integrated_solution = merged
 
-# これまでの統合結果
----
-{integrated_solution}
----
+        return await self._polish_integrated_solution(integrated_solution, original_prompt, system_prompt)
 
-# 新しい情報
----
-{next_solution}
----
+    async def _fit_solutions_to_budget(self, solutions: List[str], total_count: int, system_prompt: str) -> List[str]:
+        """
+        統合プロンプトが肥大化しないよう、1件あたりの上限（INTEGRATION_TOKEN_BUDGET / 解の総数）を
+        超えるサブ解を並列で要約して置き換える。要約に失敗した場合は元の解を使う。
+        """
+        budget = settings.INTEGRATION_TOKEN_BUDGET
+        if budget <= 0 or not solutions:
+            return solutions
+        per_solution_cap = max(budget // max(total_count, 1), 1)
+        over_budget = [i for i, sol in enumerate(solutions) if _count_tokens(sol) > per_solution_cap]
+        if not over_budget:
+            return solutions
 
-# 統合された新しい結果
-（ここまでの内容を自然に統合した、より完全な文章を生成してください）
-"""
-                response = await self.provider.call(integration_prompt, system_prompt, **self.base_model_kwargs)
-                if response.get('error'):
-                    logger.error(f"統合ステップ {i+1} でエラーが発生しました: {response['error']}")
-                    # エラーが発生した場合は、その時点での統合結果を返す
-                    return integrated_solution
-                
-                integrated_solution = response.get('text', integrated_solution)
-
-        # 最終的な仕上げ
-        final_polish_prompt = f"""以下の文章は、複数の部分的な解答を統合して作成されました。
-全体の構成を整え、冗長な部分を削除し、一貫性のある流れるような最終レポートとして完成させてください。元の質問に明確に答える形で締めくくってください。
+        logger.info(f"{len(over_budget)}個のサブ解がトークン予算を超えるため、統合前に要約します。")
+        semaphore = self._get_solve_semaphore()
+        summary_tokens = min(per_solution_cap, settings.INTEGRATION_SUMMARY_TOKENS)
 
-# 元の質問
-{original_prompt}
+        async def summarize(solution: str) -> str:
+            async with semaphore:
+                body = _SUMMARY_BODY_TEMPLATE.format_map({'max_tokens': summary_tokens, 'solution': solution})
+                response = await self._call_with_prefix(_SUMMARY_PREAMBLE, body, system_prompt)
+            if response.get('error') or not response.get('text'):
+                logger.warning(f"サブ解の要約に失敗したため、元の解を使用します: {response.get('error')}")
+                return solution
+            return response['text']
 
-# 統合された文章
-{integrated_solution}
+        summaries = await asyncio.gather(*(summarize(solutions[i]) for i in over_budget))
+        fitted = list(solutions)
+        for i, summary in zip(over_budget, summaries):
+            fitted[i] = summary
+        return fitted
 
-# 完成された最終レポート
-"""
-        final_response = await self.provider.call(final_polish_prompt, system_prompt, **self.base_model_kwargs)
+    async def _integrate_pair(self, integrated_solution: str, next_solution: str, system_prompt: str, step: int) -> Optional[str]:
+        """これまでの統合結果に新しい解を1つ統合する。エラー時はNoneを返す。"""
+        logger.info(f"統合ステップ {step} を実行中...")
+        integration_body = _INTEGRATION_BODY_TEMPLATE.format_map({'integrated_solution': integrated_solution, 'next_solution': next_solution})
+        response = await self._call_with_prefix(_INTEGRATION_PREAMBLE, integration_body, system_prompt)
+        if response.get('error'):
+            logger.error(f"統合ステップ {step} でエラーが発生しました: {response['error']}")
+            return None
+        return response.get('text', integrated_solution)
+
+    async def _polish_integrated_solution(self, integrated_solution: str, original_prompt: str, system_prompt: str) -> str:
+        """統合済みの文章を最終レポートとして仕上げる。失敗した場合は統合結果をそのまま返す。"""
+        final_polish_body = _FINAL_POLISH_BODY_TEMPLATE.format_map({'original_prompt': original_prompt, 'integrated_solution': integrated_solution})
+        final_response = await self._call_with_prefix(_FINAL_POLISH_PREAMBLE, final_polish_body, system_prompt)
         if final_response.get('error'):
             return integrated_solution # 仕上げに失敗しても、それまでの結果を返す
             
@@ -6,37 +6,130 @@ import logging
 import json
 import re
 import asyncio
-from typing import Any, Dict, Optional, List
+import copy
+import hashlib
+import time
+import math
+from collections import Counter, OrderedDict
+from types import MappingProxyType
+from typing import Any, Dict, Optional, List, Tuple
 
-from .analyzer import AdaptiveComplexityAnalyzer
-from .engine import EnhancedReasoningEngine
+from .analyzer import get_analyzer
+from .cache import CachedProvider
+from .engine import EnhancedReasoningEngine, _find_json_object
 from .enums import ComplexityRegime
-from .learner import ComplexityLearner
 from ..quantum_engine import QuantumReasoningEngine
 from .tracker import SolutionTracker, ReasoningMetrics
-from ..providers.base import LLMProvider
+from ..providers.base import LLMProvider, ProviderCapability
 from ..rag import RAGManager
+from ..config import settings
 
 
 logger = logging.getLogger(__name__)
 
+_CONTENT_TOKEN_RE = re.compile(r'\w{2,}')
+_STOPWORDS = frozenset(['the', 'and', 'for', 'with', 'that', 'this', 'what', 'how', 'why', 'are', 'is', 'of', 'to', 'in', 'on', 'an'])
+# 評価・選択・改善のプロンプト。固定部分を先頭のプリアンブルにまとめ、可変部分（質問・解答）を末尾に置くことで
+# プロバイダー側のプレフィックスキャッシュが効くようにする。
+_EVALUATION_PREAMBLE = """以下の「元の質問」に対する「回答」が、質問の意図を十分に満たしているかを評価してください。
+評価結果は次の形式のJSONで出力してください。
+
+{
+  "is_sufficient": <十分ならtrue、不十分ならfalse>,
+  "reason": "判断の簡潔な理由"
+}
+
+"""
+_EVALUATION_BODY_TEMPLATE = """# 元の質問
+{original_prompt}
+
+# 回答
+{solution}
+"""
+_SELECTION_PREAMBLE = """以下の「元の質問」に対して、複数の「回答案」が生成されました。
+それぞれの回答案を慎重に評価し、最も高品質で、質問の意図を完全に満たすものを1つ選択してください。
+全ての回答案を比較検討し、最も優れている回答案の番号を次の形式のJSONで出力してください。
+
+{
+  "best_choice_index": <選択した回答案のインデックス (0始まり)>,
+  "reason": "その回答案が最も優れていると判断した簡潔な理由"
+}
+
+"""
+_SELECTION_HEADER_TEMPLATE = """# 元の質問
+{original_prompt}
+
+# 回答案
+---
+"""
+_SELECTION_CANDIDATE_TEMPLATE = """## 回答案 {number} ({regime})
+{solution}
+
+---
+"""
+_REFINEMENT_PREAMBLE = """以下の解答を簡潔に検証し、誤り・不足・冗長な部分があれば修正した最終版の解答を出力してください。
+問題がなければ、解答をそのまま出力してください。修正後の解答のみを出力し、検証過程の説明は含めないでください。
+
+検証ポイント:
+- 元の問題に正確に答えているか
+- 事実や論理に誤りがないか
+- 不要な繰り返しがないか
+
+"""
+_REFINEMENT_BODY_TEMPLATE = """元の問題: {original_prompt}
+
+現在の解答: {solution}
+"""
+# 自己評価で不十分と判断された場合に引き上げる先のレジーム
+_NEXT_REGIME = {
+    ComplexityRegime.LOW: ComplexityRegime.MEDIUM,
+    ComplexityRegime.MEDIUM: ComplexityRegime.HIGH,
+    ComplexityRegime.HIGH: ComplexityRegime.HIGH,
+}
+
 class CogniQuantumSystemV2:
+    RESULT_CACHE_SIZE = 256
+    # 評価・選択など、ほぼ決定的な呼び出しのみ応答キャッシュを使う（これより高いtemperatureはキャッシュしない）
+    EVALUATION_CACHE_MAX_TEMPERATURE = 0.3
+    # 並列パイプラインの回答案が全てこの類似度を超えて一致する場合、LLMによる選択を省略する
+    SELECTION_AGREEMENT_THRESHOLD = 0.9
+
     def __init__(self, provider: LLMProvider, base_model_kwargs: Dict[str, Any]):
         logger.info("CogniQuantumシステムV2（自己改善機能付き）を初期化中")
         if not provider:
             raise ValueError("有効なLLMプロバイダーがCogniQuantumSystemV2に必要です。")
         
-        self.learner = ComplexityLearner()
         self.provider = provider
         self.base_model_kwargs = base_model_kwargs
-        self.complexity_analyzer = AdaptiveComplexityAnalyzer(learner=self.learner)
-        self.reasoning_engine = EnhancedReasoningEngine(provider, base_model_kwargs, complexity_analyzer=self.complexity_analyzer)
+        # 自己評価・最良解選択・改善などの定型プロンプトによる呼び出しは、応答キャッシュを経由させる
+        self.evaluation_provider = CachedProvider.wrap(provider, max_temperature=self.EVALUATION_CACHE_MAX_TEMPERATURE)
+        # 評価・選択用の生成パラメータは固定なので、呼び出しごとにコピーせず読み取り専用で保持する
+        self._eval_kwargs = MappingProxyType({**base_model_kwargs, 'temperature': 0.1})
+        self._select_kwargs = MappingProxyType({**base_model_kwargs, 'temperature': 0.0})
+        self.complexity_analyzer = get_analyzer()
+        self.learner = self.complexity_analyzer.learner
+        self.reasoning_engine = EnhancedReasoningEngine(provider, self._engine_model_kwargs(provider, base_model_kwargs), complexity_analyzer=self.complexity_analyzer)
         self.quantum_engine = None
         self.solution_tracker = SolutionTracker()
         self.max_refinement_cycles = 1
         self.max_adjustment_attempts = 2
+        # 同一の問い合わせ（リトライや上位ループからの再入）でパイプライン全体を再実行しないためのLRUキャッシュ（SOLUTION_CACHE_ENABLED時のみ）
+        # 値は(保存時刻, 結果)。SOLUTION_CACHE_TTL_SECを過ぎたエントリは使わない
+        self._result_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # RAGManagerはナレッジベースのベクトルストアを保持するため、(ナレッジベースのパス, Wikipedia利用)ごとに使い回す
+        self._rag_managers: Dict[Tuple[Optional[str], bool], RAGManager] = {}
         logger.info("CogniQuantumシステムV2の初期化完了")
     
+    @staticmethod
+    def _engine_model_kwargs(provider: LLMProvider, base_model_kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        推論エンジンの呼び出しは全て同じシステムプロンプトを共有する（並列パイプラインの3レジームも同様）。
+        プレフィックスキャッシュに対応するプロバイダーでは、システムプロンプトをキャッシュ対象として指定する。
+        """
+        if not provider.get_capabilities().get(ProviderCapability.PREFIX_CACHE, False):
+            return base_model_kwargs
+        return {**base_model_kwargs, 'cache_system_prompt': True}
+
     async def solve_problem(
         self,
         prompt: str,
@@ -48,23 +141,152 @@ class CogniQuantumSystemV2:
         real_time_adjustment: bool = True,
         mode: str = 'adaptive'
     ) -> Dict[str, Any]:
-        logger.info(f"問題解決プロセス開始（V2, モード: {mode}）: {prompt[:80]}...")
-        
-        # ★★★ 変更箇所 ★★★
-        # solve_problemの各実行パスで共通のフォーマットで返すためのヘルパーを定義
-        def format_final_response(solution, thought_process, v2_improvements, success=True, error=None):
-            base_response = {
-                'success': success,
-                'final_solution': solution,
-                'image_url': None, # 画像検索は無効化済み
-                'thought_process': thought_process,
-                'v2_improvements': v2_improvements,
-                'version': 'v2',
-            }
-            if error:
-                base_response['error'] = error
-            return base_response
+        if not settings.SOLUTION_CACHE_ENABLED:
+            # 解決結果の再利用はオプトイン。既定では毎回パイプラインを実行し、再送信で新しい解答を得られるようにする
+            return await self._solve_problem_uncached(
+                prompt, system_prompt, force_regime, use_rag, knowledge_base_path, use_wikipedia, real_time_adjustment, mode
+            )
+
+        cache_key = self._make_result_cache_key(
+            prompt, system_prompt, force_regime, use_rag, knowledge_base_path, use_wikipedia, real_time_adjustment, mode
+        )
+        cached = self._get_cached_result(cache_key)
+        if cached is not None:
+            logger.info("同一の問い合わせの解決結果をキャッシュから返します。推論パイプラインは実行しません。")
+            return cached
+
+        result = await self._solve_problem_uncached(
+            prompt, system_prompt, force_regime, use_rag, knowledge_base_path, use_wikipedia, real_time_adjustment, mode
+        )
+        if result.get('success') and self._is_deterministic() and self._is_high_confidence(result, prompt):
+            self._result_cache[cache_key] = (time.monotonic(), copy.deepcopy(result))
+            if len(self._result_cache) > self.RESULT_CACHE_SIZE:
+                self._result_cache.popitem(last=False)
+        return result
+
+    def _is_deterministic(self) -> bool:
+        """生成パラメータでtemperatureが明示的に0以下に指定されているか（サンプリングした解答は再利用しない）。"""
+        temperature = self.base_model_kwargs.get('temperature')
+        return temperature is not None and temperature <= 0
+
+    def _is_high_confidence(self, result: Dict[str, Any], original_prompt: str) -> bool:
+        """
+        解決結果が再利用してよいほど確からしいかを判定する。
+        自己評価がある場合はその判定に従い、並列パイプラインで低複雑性の解答が早期採用された場合は確からしいとみなす。
+        それ以外はヒューリスティックで十分と判定できる場合のみTrueを返す。
+        """
+        thought_process = result.get('thought_process') or {}
+        self_evaluation = thought_process.get('self_evaluation')
+        if self_evaluation is not None:
+            return self_evaluation.get('outcome') == 'sufficient'
+        if thought_process.get('early_exit'):
+            return True
+        return self._heuristic_sufficiency(result.get('final_solution') or '', original_prompt, ComplexityRegime.MEDIUM) is True
+
+    def _get_cached_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        entry = self._result_cache.get(cache_key)
+        if entry is None:
+            return None
+        stored_at, result = entry
+        ttl = settings.SOLUTION_CACHE_TTL_SEC
+        if ttl and time.monotonic() - stored_at > ttl:
+            del self._result_cache[cache_key]
+            return None
+        self._result_cache.move_to_end(cache_key)
+        cached = copy.deepcopy(result)
+        cached['cached'] = True
+        return cached
+
+    def _get_rag_manager(self, knowledge_base_path: Optional[str], use_wikipedia: bool) -> RAGManager:
+        key = (knowledge_base_path, use_wikipedia)
+        rag_manager = self._rag_managers.get(key)
+        if rag_manager is None:
+            rag_manager = RAGManager(provider=self.provider, use_wikipedia=use_wikipedia, knowledge_base_path=knowledge_base_path)
+            self._rag_managers[key] = rag_manager
+        return rag_manager
+
+    @staticmethod
+    def _make_result_cache_key(prompt: str, system_prompt: str, force_regime: Optional[ComplexityRegime], *options: Any) -> str:
+        """解決結果を左右する全ての引数から、キャッシュキーとなるダイジェストを生成する。"""
+        regime = force_regime.value if force_regime else ''
+        material = "\x00".join([prompt, system_prompt, regime, *map(str, options)])
+        return hashlib.blake2b(material.encode('utf-8'), digest_size=16).hexdigest()
+
+    async def _solve_single_regime(self, current_prompt: str, system_prompt: str, complexity_score: Optional[float], regime: ComplexityRegime) -> Dict[str, Any]:
+        """レジームが固定されている場合（強制指定・リアルタイム調整なし）の推論。自己評価のループを経由しない。"""
+        logger.info("推論実行 (レジーム: %s)", regime.value)
+        return await self.reasoning_engine.execute_reasoning(current_prompt, system_prompt, complexity_score, regime)
+
+    async def _solve_with_adjustment(
+        self,
+        prompt: str,
+        current_prompt: str,
+        system_prompt: str,
+        complexity_score: Optional[float],
+        current_regime: ComplexityRegime
+    ) -> Tuple[Dict[str, Any], ComplexityRegime, str]:
+        """
+        自己評価に基づいてレジームを引き上げながら推論する。
+        (最終的な推論結果, 最終レジーム, 最後に使用したプロンプト)を返す。エラー時は推論結果にerrorが入る。
+        """
+        final_reasoning_result: Dict[str, Any] = {}
+        for attempt in range(self.max_adjustment_attempts):
+            logger.info("推論試行 %d/%d (レジーム: %s)", attempt + 1, self.max_adjustment_attempts, current_regime.value)
+            reasoning_result = await self.reasoning_engine.execute_reasoning(current_prompt, system_prompt, complexity_score, current_regime)
+            final_reasoning_result = reasoning_result.copy()
+            
+            if reasoning_result.get('error'):
+                break
+            
+            final_solution = reasoning_result.get('solution')
+            
+            if (attempt + 1) >= self.max_adjustment_attempts:
+                break
+            
+            evaluation = await self._self_evaluate_solution(final_solution, prompt, current_regime)
+            if evaluation.get("is_sufficient"):
+                final_reasoning_result['self_evaluation'] = {'outcome': 'sufficient', 'reason': evaluation.get('reason')}
+                break 
+            else:
+                final_reasoning_result['self_evaluation'] = {'outcome': 'insufficient', 'reason': evaluation.get('reason'), 'next_regime': evaluation.get("next_regime").value}
+                new_regime = evaluation.get("next_regime", current_regime)
+                if new_regime != current_regime:
+                    logger.info("自己評価に基づき複雑性を再調整: %s -> %s", current_regime.value, new_regime.value)
+                    current_regime = new_regime
+                    current_prompt = f"前回の回答は不十分でした。より深く、包括的な分析を行ってください。\n元の質問: {prompt}\n前回の回答: {final_solution}\n"
+                else:
+                    logger.info("同じ複雑性レジームが推奨されたため、調整を終了します。")
+                    break
+        return final_reasoning_result, current_regime, current_prompt
+
+    @staticmethod
+    def _format_final_response(solution, thought_process, v2_improvements, success=True, error=None) -> Dict[str, Any]:
+        """solve_problemの各実行パスで共通のフォーマットの応答を返す。"""
+        base_response = {
+            'success': success,
+            'final_solution': solution,
+            'image_url': None, # 画像検索は無効化済み
+            'thought_process': thought_process,
+            'v2_improvements': v2_improvements,
+            'version': 'v2',
+        }
+        if error:
+            base_response['error'] = error
+        return base_response
 
+    async def _solve_problem_uncached(
+        self,
+        prompt: str,
+        system_prompt: str,
+        force_regime: Optional[ComplexityRegime],
+        use_rag: bool,
+        knowledge_base_path: Optional[str],
+        use_wikipedia: bool,
+        real_time_adjustment: bool,
+        mode: str
+    ) -> Dict[str, Any]:
+        logger.info("問題解決プロセス開始（V2, モード: %s）: %.80s...", mode, prompt)
+        
         is_edge_mode = (mode == 'edge')
         if is_edge_mode:
             logger.info("エッジデバイス最適化モードで実行。RAG、画像検索、自己評価などの高度な機能は無効化されます。")
@@ -81,47 +303,27 @@ class CogniQuantumSystemV2:
         current_prompt = prompt
         rag_source = None
         if use_rag or use_wikipedia:
-            rag_manager = RAGManager(provider=self.provider, use_wikipedia=use_wikipedia, knowledge_base_path=knowledge_base_path)
+            rag_manager = self._get_rag_manager(knowledge_base_path, use_wikipedia)
             current_prompt = await rag_manager.retrieve_and_augment(prompt)
             rag_source = 'wikipedia' if use_wikipedia else 'knowledge_base'
         
         try:
-            complexity_score, current_regime = self.complexity_analyzer.analyze_complexity(current_prompt, mode=mode)
-            
             if force_regime:
-                current_regime = force_regime
-                logger.info(f"レジームを '{current_regime.value}' に強制設定しました。")
+                # レジームが指定されている場合、複雑性分析の結果は使われないため実行しない
+                complexity_score, current_regime = None, force_regime
+                logger.info("レジームを '%s' に強制設定しました。", current_regime.value)
+            else:
+                complexity_score, current_regime = self.complexity_analyzer.analyze_complexity(current_prompt, mode=mode)
             
             initial_regime = current_regime
-            final_reasoning_result = None
-            
-            for attempt in range(self.max_adjustment_attempts):
-                logger.info(f"推論試行 {attempt + 1}/{self.max_adjustment_attempts} (レジーム: {current_regime.value})")
-                reasoning_result = await self.reasoning_engine.execute_reasoning(current_prompt, system_prompt, complexity_score, current_regime)
-                final_reasoning_result = reasoning_result.copy()
-                
-                if reasoning_result.get('error'):
-                    return format_final_response(None, None, None, success=False, error=reasoning_result['error'])
-                
-                final_solution = reasoning_result.get('solution')
-                
-                if force_regime or not real_time_adjustment or (attempt + 1) >= self.max_adjustment_attempts:
-                    break
-                
-                evaluation = await self._self_evaluate_solution(final_solution, prompt, current_regime)
-                if evaluation.get("is_sufficient"):
-                    final_reasoning_result['self_evaluation'] = {'outcome': 'sufficient', 'reason': evaluation.get('reason')}
-                    break 
-                else:
-                    final_reasoning_result['self_evaluation'] = {'outcome': 'insufficient', 'reason': evaluation.get('reason'), 'next_regime': evaluation.get("next_regime").value}
-                    new_regime = evaluation.get("next_regime", current_regime)
-                    if new_regime != current_regime:
-                        logger.info(f"自己評価に基づき複雑性を再調整: {current_regime.value} -> {new_regime.value}")
-                        current_regime = new_regime
-                        current_prompt = f"前回の回答は不十分でした。より深く、包括的な分析を行ってください。\n元の質問: {prompt}\n前回の回答: {final_solution}\n"
-                    else:
-                        logger.info("同じ複雑性レジームが推奨されたため、調整を終了します。")
-                        break
+            if force_regime or not real_time_adjustment:
+                final_reasoning_result = await self._solve_single_regime(current_prompt, system_prompt, complexity_score, current_regime)
+            else:
+                final_reasoning_result, current_regime, current_prompt = await self._solve_with_adjustment(
+                    prompt, current_prompt, system_prompt, complexity_score, current_regime
+                )
+            if final_reasoning_result.get('error'):
+                return self._format_final_response(None, None, None, success=False, error=final_reasoning_result['error'])
             
             if real_time_adjustment and current_regime != initial_regime:
                 self.learner.record_outcome(prompt, current_regime)
@@ -150,34 +352,106 @@ class CogniQuantumSystemV2:
                 'is_edge_optimized': is_edge_mode,
             }
 
-            return format_final_response(final_solution, thought_process, v2_improvements)
+            return self._format_final_response(final_solution, thought_process, v2_improvements)
 
         except Exception as e:
-            logger.error(f"問題解決中にエラーが発生しました（V2）: {e}", exc_info=True)
-            return format_final_response(None, None, None, success=False, error=str(e))
+            logger.error("問題解決中にエラーが発生しました（V2）: %s", e, exc_info=True)
+            return self._format_final_response(None, None, None, success=False, error=str(e))
+
+    @staticmethod
+    def _heuristic_sufficiency(solution: str, original_prompt: str, current_regime: ComplexityRegime) -> Optional[bool]:
+        """
+        LLMを呼ばずに判定できる明らかなケースを処理する。
+        十分に長く、質問の主要な語を網羅している解答はTrue、空または極端に短い解答はFalse、それ以外はNoneを返す。
+        LOWレジームでは短い解答（「2」など）が正解であることも多いため、空でない限り長さだけでは不十分と判定しない。
+        """
+        if not solution.strip():
+            return False
+        if len(solution) < 50:
+            return None if current_regime == ComplexityRegime.LOW else False
+        if len(solution.split()) <= 200 or current_regime == ComplexityRegime.HIGH:
+            return None
+        tokens = [t for t in _CONTENT_TOKEN_RE.findall(original_prompt.lower()) if t not in _STOPWORDS]
+        if not tokens:
+            return None
+        top_tokens = sorted(set(tokens), key=lambda t: (-tokens.count(t), tokens.index(t)))[:5]
+        solution_lower = solution.lower()
+        overlap = sum(t in solution_lower for t in top_tokens) / len(top_tokens)
+        return True if overlap > 0.8 else None
+
+    async def _is_confident(self, result: Any, original_prompt: str) -> bool:
+        """
+        並列パイプラインの結果が、他の候補を待たずに採用できるほど十分な低複雑性の解答かを判定する。
+        低複雑性の解答は短いのが普通なので、長さではなく自己評価の判定に基づく。
+        評価が失敗して既定値で「十分」とされた場合は確信ありとは見なさない。
+        """
+        if isinstance(result, Exception) or result.get('error'):
+            return False
+        if result.get('complexity_regime') != ComplexityRegime.LOW.value:
+            return False
+        solution = result.get('solution') or ''
+        if not solution.strip():
+            return False
+        evaluation = await self._self_evaluate_solution(solution, original_prompt, ComplexityRegime.LOW)
+        return evaluation['judged'] and evaluation['is_sufficient']
 
     async def _self_evaluate_solution(self, solution: str, original_prompt: str, current_regime: ComplexityRegime) -> Dict[str, Any]:
-        # (変更なし)
-        # ...
-        pass
+        next_regime = _NEXT_REGIME[current_regime]
+        heuristic = self._heuristic_sufficiency(solution or '', original_prompt, current_regime)
+        if heuristic is not None:
+            logger.info("ヒューリスティックにより自己評価を省略しました（十分: %s）", heuristic)
+            reason = '解答が十分な長さを持ち、質問の主要な語を網羅しています。' if heuristic else '解答が空または極端に短いため不十分と判断しました。'
+            return {'is_sufficient': heuristic, 'reason': reason, 'next_regime': next_regime, 'judged': True}
+
+        evaluation_body = _EVALUATION_BODY_TEMPLATE.format_map({'original_prompt': original_prompt, 'solution': solution})
+        try:
+            response = await self.evaluation_provider.call(
+                _EVALUATION_PREAMBLE + evaluation_body, "You are an expert solution evaluator.",
+                cache_prefix=_EVALUATION_PREAMBLE, **self._eval_kwargs
+            )
+            parsed_json = _find_json_object(response.get('text', ''))
+            if parsed_json is None:
+                logger.warning("自己評価の応答からJSONを抽出できませんでした。十分と見なします。")
+                return {'is_sufficient': True, 'reason': 'Failed to parse evaluation JSON.', 'next_regime': next_regime, 'judged': False}
+            return {
+                'is_sufficient': bool(parsed_json.get('is_sufficient', True)),
+                'reason': parsed_json.get('reason', 'No reason provided.'),
+                'next_regime': next_regime,
+                'judged': True,
+            }
+        except Exception as e:
+            logger.error("自己評価中にエラー: %s。十分と見なします。", e)
+            return {'is_sufficient': True, 'reason': f'Error during evaluation: {e}', 'next_regime': next_regime, 'judged': False}
 
     async def _execute_parallel_pipelines(self, prompt: str, system_prompt: str, use_rag: bool, knowledge_base_path: Optional[str], use_wikipedia: bool) -> Dict[str, Any]:
         logger.info("並列推論パイプライン実行開始: efficient, balanced, decomposed")
         final_prompt = prompt
         rag_source = None
         if use_rag:
-            rag_manager = RAGManager(provider=self.provider, use_wikipedia=use_wikipedia, knowledge_base_path=knowledge_base_path)
+            rag_manager = self._get_rag_manager(knowledge_base_path, use_wikipedia)
             final_prompt = await rag_manager.retrieve_and_augment(prompt)
             rag_source = 'wikipedia' if use_wikipedia else 'knowledge_base'
         
-        tasks = [
-            self.reasoning_engine.execute_reasoning(final_prompt, system_prompt, regime=ComplexityRegime.LOW),
-            self.reasoning_engine.execute_reasoning(final_prompt, system_prompt, regime=ComplexityRegime.MEDIUM),
-            self.reasoning_engine.execute_reasoning(final_prompt, system_prompt, regime=ComplexityRegime.HIGH),
-        ]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 完了した順に受け取り、低複雑性の解答が明らかに十分であれば残りのパイプライン（主に高複雑性）を待たずに打ち切る
+        results = []
+        early_exit = False
+        pipeline_results = self.reasoning_engine.iter_reasoning_batch(
+            final_prompt, system_prompt, [ComplexityRegime.LOW, ComplexityRegime.MEDIUM, ComplexityRegime.HIGH],
+            eager=(ComplexityRegime.LOW,)
+        )
+        try:
+            async for _, result in pipeline_results:
+                results.append(result)
+                if await self._is_confident(result, prompt):
+                    logger.info("低複雑性パイプラインの解答が十分と判断されたため、残りのパイプラインをキャンセルします。")
+                    early_exit = True
+                    break
+        finally:
+            await pipeline_results.aclose()
         
         valid_solutions_details = [res for res in results if not isinstance(res, Exception) and not res.get('error')]
+        if early_exit:
+            valid_solutions_details = [results[-1]]
         if not valid_solutions_details:
             return {'success': False, 'error': "全ての並列パイプラインが失敗しました。", 'version': 'v2'}
             
@@ -191,6 +465,7 @@ class CogniQuantumSystemV2:
             'candidates_considered': len(valid_solutions_details),
             'selected_regime': best_solution_info.get('complexity_regime'),
             'selection_reason': selection_details.get('reason'),
+            'early_exit': early_exit,
             'all_candidates': valid_solutions_details # 全候補の情報も追加
         }
         
@@ -216,7 +491,7 @@ class CogniQuantumSystemV2:
         final_prompt = prompt
         rag_source = None
         if use_rag:
-            rag_manager = RAGManager(provider=self.provider, use_wikipedia=use_wikipedia, knowledge_base_path=knowledge_base_path)
+            rag_manager = self._get_rag_manager(knowledge_base_path, use_wikipedia)
             final_prompt = await rag_manager.retrieve_and_augment(prompt)
             rag_source = 'wikipedia' if use_wikipedia else 'knowledge_base'
         
@@ -247,36 +522,60 @@ class CogniQuantumSystemV2:
             'version': 'v2'
         }
 
+    @staticmethod
+    def _min_pairwise_similarity(texts: List[str]) -> float:
+        """文字バイグラムの出現頻度ベクトルによるコサイン類似度を全ペアで計算し、その最小値を返す。"""
+        vectors = []
+        for text in texts:
+            normalized = ''.join(text.split())
+            vector = Counter(normalized[i:i + 2] for i in range(len(normalized) - 1))
+            vectors.append((vector, math.sqrt(sum(v * v for v in vector.values()))))
+        minimum = 1.0
+        for i in range(len(vectors)):
+            for j in range(i + 1, len(vectors)):
+                (a, norm_a), (b, norm_b) = vectors[i], vectors[j]
+                if not norm_a or not norm_b:
+                    return 0.0
+                dot = sum(count * b[gram] for gram, count in a.items() if gram in b)
+                minimum = min(minimum, dot / (norm_a * norm_b))
+        return minimum
+
     async def _select_best_solution(self, solutions: List[Dict[str, Any]], original_prompt: str) -> Dict[str, Any]:
         if len(solutions) == 1:
             return {'best_solution': solutions[0], 'reason': 'Only one valid solution generated.'}
-        solution_texts = [s.get('solution', '') for s in solutions]
-        selection_prompt = f"以下の「元の質問」に対して、複数の「回答案」が生成されました。\nそれぞれの回答案を慎重に評価し、最も高品質で、質問の意図を完全に満たすものを1つ選択してください。\n\n# 元の質問\n{original_prompt}\n\n# 回答案\n---\n"
-        for i, sol_text in enumerate(solution_texts):
-            selection_prompt += f"## 回答案 {i+1} ({solutions[i].get('complexity_regime')})\n{sol_text}\n\n---\n"
-        selection_prompt += "\n# あなたのタスク\n全ての回答案を比較検討し、最も優れている回答案の番号をJSON形式で出力してください。\n\n出力形式:\n{{\n  \"best_choice_index\": <選択した回答案のインデックス (0始まり)>,\n  \"reason\": \"その回答案が最も優れていると判断した簡潔な理由\"\n}}\n"
+        similarity = self._min_pairwise_similarity([s.get('solution', '') for s in solutions])
+        if similarity > self.SELECTION_AGREEMENT_THRESHOLD:
+            balanced = next((s for s in solutions if s.get('complexity_regime') == ComplexityRegime.MEDIUM.value), solutions[0])
+            logger.info("回答案が互いに一致しているため（最小類似度: %.2f）、LLMによる選択を省略します。", similarity)
+            return {'best_solution': balanced, 'reason': 'Candidate solutions agree; selected the balanced one without an LLM call.'}
+        parts = [_SELECTION_PREAMBLE, _SELECTION_HEADER_TEMPLATE.format_map({'original_prompt': original_prompt})]
+        for i, solution in enumerate(solutions):
+            parts.append(_SELECTION_CANDIDATE_TEMPLATE.format_map({
+                'number': i + 1, 'regime': solution.get('complexity_regime'), 'solution': solution.get('solution', '')
+            }))
+        selection_prompt = "".join(parts)
         try:
-            eval_kwargs = self.base_model_kwargs.copy()
-            eval_kwargs['temperature'] = 0.0
-            response = await self.provider.call(selection_prompt, "You are an expert solution evaluator.", **eval_kwargs)
+            response = await self.evaluation_provider.call(
+                selection_prompt, "You are an expert solution evaluator.",
+                cache_prefix=_SELECTION_PREAMBLE, **self._select_kwargs
+            )
             response_text = response.get('text', '{}').strip()
-            match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if not match:
+            parsed_json = _find_json_object(response_text)
+            if parsed_json is None:
                 logger.warning("最良解の選択応答からJSONを抽出できませんでした。最初の解を選択します。")
                 return {'best_solution': solutions[0], 'reason': 'Failed to parse selection JSON.'}
             
-            parsed_json = json.loads(match.group(0))
             best_index = parsed_json.get("best_choice_index", 0)
             reason = parsed_json.get('reason', 'No reason provided.')
             
             if not isinstance(best_index, int) or not (0 <= best_index < len(solutions)):
-                logger.warning(f"無効なインデックス {best_index} が返されました。最初の解を選択します。")
+                logger.warning("無効なインデックス %s が返されました。最初の解を選択します。", best_index)
                 return {'best_solution': solutions[0], 'reason': 'Invalid index returned from selection.'}
             
-            logger.info(f"最良解としてインデックス {best_index} ({solutions[best_index].get('complexity_regime')}) が選択されました。理由: {reason}")
+            logger.info("最良解としてインデックス %d (%s) が選択されました。理由: %s", best_index, solutions[best_index].get('complexity_regime'), reason)
             return {'best_solution': solutions[best_index], 'reason': reason}
         except (json.JSONDecodeError, Exception) as e:
-            logger.error(f"最良解の選択中にエラー: {e}。最初の解を選択します。")
+            logger.error("最良解の選択中にエラー: %s。最初の解を選択します。", e)
             return {'best_solution': solutions[0], 'reason': f'Error during selection: {e}'}
 
     async def _evaluate_and_refine(self, solution: str, original_prompt: str, system_prompt: str, regime: ComplexityRegime) -> str:
@@ -288,9 +587,38 @@ class CogniQuantumSystemV2:
         return solution
     
     async def _perform_limited_refinement(self, solution: str, original_prompt: str, system_prompt: str) -> str:
-        # (変更なし)
-        pass
+        """解答を1回だけ検証・修正する。失敗した場合や空の応答の場合は元の解答を返す。"""
+        refinement_body = _REFINEMENT_BODY_TEMPLATE.format_map({'original_prompt': original_prompt, 'solution': solution})
+        try:
+            response = await self.evaluation_provider.call(
+                _REFINEMENT_PREAMBLE + refinement_body, system_prompt,
+                cache_prefix=_REFINEMENT_PREAMBLE, **self.base_model_kwargs
+            )
+        except Exception as e:
+            logger.error("解答の改善中にエラー: %s。元の解答を使用します。", e)
+            return solution
+        refined = response.get('text', '').strip()
+        if response.get('error') or not refined:
+            logger.warning("解答の改善に失敗したため、元の解答を使用します。")
+            return solution
+        return refined
     
     def _collect_metrics(self, complexity_score: float, regime: ComplexityRegime, reasoning_result: Dict[str, Any]) -> ReasoningMetrics:
         # (このメソッドは現在最終出力では使われていないが、将来の拡張のために残す)
-        pass
\ No newline at end of file
+        # トークン数はプロバイダーが返したcompletion_tokensを優先し、得られない場合のみ単語数で概算する
+        thinking_tokens_used = reasoning_result.get('completion_tokens') or len((reasoning_result.get('solution') or '').split())
+        patterns = self.solution_tracker.analyze_solution_patterns()
+        return ReasoningMetrics(
+            complexity_score=complexity_score,
+            regime=regime,
+            thinking_tokens_used=thinking_tokens_used,
+            solution_positions=list(self.solution_tracker.token_positions),
+            correct_solution_positions=[
+                sol['token_position'] for sol in self.solution_tracker.solutions if sol['is_correct']
+            ],
+            first_correct_position=next(
+                (sol['token_position'] for sol in self.solution_tracker.solutions if sol['is_correct']), None
+            ),
+            overthinking_detected=patterns.get('overthinking_detected', False),
+            consistency_score=patterns.get('solution_distribution', {}).get('early_concentration', 0.0),
+        )
\ No newline at end of file
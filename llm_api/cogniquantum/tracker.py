@@ -7,7 +7,7 @@ from typing import Any, Dict, List, Optional
 
 from .enums import ComplexityRegime
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ReasoningMetrics:
     """推論プロセスのメトリクス"""
     complexity_score: float
@@ -21,6 +21,8 @@ class ReasoningMetrics:
 
 class SolutionTracker:
     """中間解の追跡と分析（論文のthinking trace分析に基づく）"""
+    __slots__ = ('solutions', 'token_positions')
+
     def __init__(self):
         self.solutions = []
         self.token_positions = []
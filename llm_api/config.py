@@ -2,7 +2,8 @@
 # タイトル: Centralized Settings Management for Maximum Stability
 # 役割: Ollamaの同時実行数制限を1に設定し、処理を逐次化してサーバーのクラッシュを完全に防ぐ。
 
-from typing import Optional
+import functools
+from typing import List, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -23,6 +24,8 @@ class Settings(BaseSettings):
 
     # --- Provider Defaults ---
     OLLAMA_API_BASE_URL: str = "http://localhost:11434"
+    # 複数のOllamaサーバーに負荷分散する場合、カンマ区切りでURLを列挙する（指定時はOLLAMA_API_BASE_URLより優先）
+    OLLAMA_ENDPOINTS: str = ""
     OLLAMA_TIMEOUT: float = 600.0
     
     # ★★★ 修正箇所 ★★★
@@ -38,9 +41,50 @@ class Settings(BaseSettings):
 
     # --- CogniQuantum V2 Settings ---
     V2_DEFAULT_MODE: str = "adaptive"
+    # サブ問題がこの数以下かつ合計文字数が予算未満なら、1回の呼び出しでまとめて解決する（0で無効）
+    BATCH_SOLVE_THRESHOLD: int = 3
+    BATCH_SOLVE_CHAR_BUDGET: int = 2000
+    # 統合時に許容するサブ解の合計トークン数。1件あたりの上限を超えるサブ解は統合前に要約する（0で無効）
+    INTEGRATION_TOKEN_BUDGET: int = 6000
+    INTEGRATION_SUMMARY_TOKENS: int = 500
+    # 高複雑性推論で、問題の分解と並行してフォールバック用の中複雑性推論を投機的に実行するか
+    # （分解の失敗時に待ち時間を短縮できるが、成功時も途中までのトークンが課金されるためオプトイン）
+    SPECULATIVE_MEDIUM_DRAFT: bool = False
+
+    # --- Retry ---
+    # 429・5xx・接続エラーで失敗したAPI呼び出しの最大試行回数（初回を含む）
+    PROVIDER_RETRY_ATTEMPTS: int = 5
+
+    # --- Response Cache ---
+    # 同一プロンプト・同一パラメータのLLM応答をSQLiteに保存して再利用する（オプトイン。決定的な呼び出しのみが対象）
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_PATH: str = "llm_response_cache.sqlite3"
+    RESPONSE_CACHE_TTL: float = 86400.0
+    # CogniQuantumSystemV2が同一の問い合わせに対して解決結果を再利用するか（オプトイン）と、その期間（秒、0で無期限）
+    SOLUTION_CACHE_ENABLED: bool = False
+    SOLUTION_CACHE_TTL_SEC: float = 3600.0
 
     # --- Logging ---
     LOG_LEVEL: str = "INFO"
 
+    def ollama_endpoints(self) -> List[str]:
+        """リクエストを振り分けるOllamaサーバーのURL一覧を返す。"""
+        endpoints = [url.strip().rstrip('/') for url in self.OLLAMA_ENDPOINTS.split(',') if url.strip()]
+        return endpoints or [self.OLLAMA_API_BASE_URL]
+
+    def ollama_total_concurrency(self) -> int:
+        """全Ollamaサーバー合計の同時リクエスト数の上限（サーバーごとの上限 × サーバー数）。"""
+        return self.OLLAMA_CONCURRENCY_LIMIT * len(self.ollama_endpoints())
+
+
+@functools.lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """設定を初回アクセス時に一度だけ読み込んで返す。"""
+    return Settings()
+
 
-settings = Settings()
\ No newline at end of file
+def __getattr__(name: str):
+    # `from llm_api.config import settings` は初回アクセス時に .env と環境変数を読み込む
+    if name == 'settings':
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,79 @@
+# /llm_api/providers/_retry.py
+# タイトル: Jittered Exponential Backoff for Provider HTTP Calls
+# 役割: 一時的なエラー（429・5xx・接続エラー）で失敗したAPI呼び出しを、ジッター付き指数バックオフで再試行する。
+#       パイプライン全体をやり直す代わりに、失敗した1回の呼び出しだけをプロバイダー内で回復させる。
+
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# 再試行する価値のあるHTTPステータス（レート制限とゲートウェイ・サーバー側の一時的な障害）
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+def status_code_of(exc: BaseException) -> Optional[int]:
+    """SDKごとに異なる例外から、HTTPステータスコードを取り出す（取れない場合はNone）。"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        # aiohttpのClientResponseErrorはstatus属性を持つ
+        status = getattr(exc, "status", None)
+    if status is None:
+        response = getattr(exc, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable_status(exc: BaseException) -> bool:
+    return status_code_of(exc) in RETRYABLE_STATUS
+
+
+def _retry_after_of(exc: BaseException) -> Optional[float]:
+    """応答にRetry-Afterヘッダー（秒数）があれば、その値を返す。"""
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+async def with_retry(
+    coro_factory: Callable[[], Awaitable[T]],
+    *,
+    retryable: Callable[[BaseException], bool],
+    description: str = "API呼び出し",
+    attempts: Optional[int] = None,
+    min_wait: float = 0.5,
+    max_wait: float = 16.0,
+) -> T:
+    """
+    coro_factoryが返すコルーチンを実行し、retryableが真を返す例外で失敗した場合に再試行する。
+    待機時間は0〜min(max_wait, min_wait * 2^試行回数)の一様乱数（フルジッター）とし、
+    Retry-Afterヘッダーがあればそれ以上待つ。最後の試行で失敗した場合、または再試行対象外の例外はそのまま送出する。
+    """
+    attempts = attempts or settings.PROVIDER_RETRY_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        try:
+            return await coro_factory()
+        except Exception as e:
+            if attempt >= attempts or not retryable(e):
+                raise
+            delay = max(min_wait, random.uniform(0, min(max_wait, min_wait * 2 ** attempt)))
+            retry_after = _retry_after_of(e)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, max_wait * 4))
+            logger.warning(
+                "%sが一時的なエラーで失敗しました (%d/%d回目)。%.1f秒後に再試行します: %s",
+                description, attempt, attempts, delay, e
+            )
+            await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")
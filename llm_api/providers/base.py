@@ -2,10 +2,14 @@
 # タイトル: Abstract Base Classes for LLM Providers with Corrected Initialization Order
 # 役割: 全てのLLMプロバイダーの基底クラスを定義する。EnhancedLLMProviderのコンストラクタの処理順序を修正し、初期化時のエラーを解決する。
 
+import asyncio
+import contextlib
 import logging
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from enum import Enum
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
 
 # 循環参照を避けるため、型チェック時のみインポート
 from typing import TYPE_CHECKING
@@ -16,6 +20,22 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# モードごとに強制する複雑性レジーム（ComplexityRegimeの値）。循環参照を避けるため値の文字列で保持する
+_FORCE_REGIME_BY_MODE = {
+    'efficient': 'low',
+    'edge': 'low',
+    'balanced': 'medium',
+    'decomposed': 'high',
+}
+
+def _ok(text: str, model: Optional[str], usage: Optional[Dict[str, int]] = None, **extra: Any) -> Dict[str, Any]:
+    """成功時の標準化された応答辞書を組み立てる。全プロバイダーで同じキー構成になる。"""
+    return {"text": text, "model": model, "usage": usage or {}, "error": None, **extra}
+
+def _err(message: Any) -> Dict[str, Any]:
+    """エラー時の標準化された応答辞書を組み立てる。"""
+    return {"text": "", "error": str(message)}
+
 class ProviderCapability(Enum):
     """プロバイダーの機能を定義するEnum"""
     STANDARD_CALL = "standard_call"
@@ -24,6 +44,8 @@ class ProviderCapability(Enum):
     SYSTEM_PROMPT = "system_prompt"
     TOOLS = "tools"
     JSON_MODE = "json_mode"
+    PREFIX_CACHE = "prefix_cache"
+    BATCH_CALL = "batch_call"
 
 class LLMProvider(ABC):
     """
@@ -33,7 +55,7 @@ class LLMProvider(ABC):
         self.provider_name = self.__class__.__name__.replace("Provider", "").lower()
         self.capabilities = self._get_default_capabilities()
 
-    def _get_default_capabilities(self) -> Dict[ProviderCapability, bool]:
+    def _get_default_capabilities(self) -> Mapping[ProviderCapability, bool]:
         """capabilitiesのデフォルト値を生成する。実装クラスでオーバーライド推奨。"""
         if hasattr(self, 'get_capabilities'):
             try:
@@ -44,8 +66,11 @@ class LLMProvider(ABC):
 
 
     @abstractmethod
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
-        """プロバイダーの機能を定義した辞書を返す。"""
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
+        """
+        プロバイダーの機能を定義したマッピングを返す。
+        ケイパビリティは静的なものとし、実装クラスは変更不可のマッピング（MappingProxyType）を使い回す。
+        """
         pass
 
     async def call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
@@ -67,6 +92,52 @@ class LLMProvider(ABC):
         logger.debug(f"プロバイダー '{self.provider_name}' の standard_call を呼び出します。")
         return await self.standard_call(prompt, system_prompt, **kwargs)
 
+    def _concurrency_limit(self) -> Optional[int]:
+        """
+        同時に実行できるAPI呼び出しの上限。Noneは無制限。
+        処理スロットが限られるバックエンド（ローカルのOllamaなど）のプロバイダーでオーバーライドする。
+        """
+        return None
+
+    def _call_slot(self):
+        """
+        API呼び出しを囲む非同期コンテキストを返す。上限がある場合はイベントループごとのセマフォ、
+        無制限の場合は何もしないコンテキストになる。具象クラスのstandard_call内で `async with self._call_slot():` として使う。
+        """
+        limit = self._concurrency_limit()
+        if not limit:
+            return contextlib.nullcontext()
+        loop = asyncio.get_running_loop()
+        if getattr(self, '_call_semaphore_loop', None) is not loop:
+            self._call_semaphore = asyncio.Semaphore(limit)
+            self._call_semaphore_loop = loop
+        return self._call_semaphore
+
+    async def batch_call(self, requests: List[Tuple[str, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        (prompt, system_prompt, kwargs)のリストをまとめて処理し、同じ順序で応答を返す。
+        デフォルトではcall()を並行実行する。バッチAPIを持つプロバイダーはオーバーライドできる。
+        """
+        responses = await asyncio.gather(
+            *(self.call(prompt, system_prompt, **kwargs) for prompt, system_prompt, kwargs in requests),
+            return_exceptions=True
+        )
+        return [
+            _err(response) if isinstance(response, Exception) else response
+            for response in responses
+        ]
+
+    async def stream_call(self, prompt: str, system_prompt: str = "", **kwargs) -> AsyncIterator[str]:
+        """
+        生成テキストを逐次yieldするストリーミング呼び出し。
+        ストリーミングに対応しないプロバイダーでは、standard_callの結果を1チャンクとして返す。
+        エラー時は例外を送出する。
+        """
+        response = await self.standard_call(prompt, system_prompt, **kwargs)
+        if response.get('error'):
+            raise RuntimeError(response['error'])
+        yield response.get('text', '')
+
     @abstractmethod
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
         """
@@ -86,6 +157,9 @@ class EnhancedLLMProvider(LLMProvider):
     """
     標準プロバイダーをラップし、CogniQuantum V2システムを介して追加機能を提供する拡張プロバイダーの基底クラス。
     """
+    # 生成パラメータごとに保持するCogniQuantumSystemV2インスタンスの上限数
+    CQ_SYSTEM_CACHE_SIZE = 8
+
     def __init__(self, standard_provider: LLMProvider):
         if not isinstance(standard_provider, LLMProvider):
              raise TypeError("EnhancedLLMProviderには有効なstandard_providerインスタンスが必要です。")
@@ -98,15 +172,51 @@ class EnhancedLLMProvider(LLMProvider):
         # 親クラスの__init__ではクラス名からprovider_nameが設定されるため、
         # ラップしているプロバイダーの名前に上書きする。
         self.provider_name = standard_provider.provider_name
+        self._cq_cache: "OrderedDict[frozenset, CogniQuantumSystemV2]" = OrderedDict()
+
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
+        """標準プロバイダーのケイパビリティに拡張呼び出しを加えたもの。初回に一度だけ組み立てる。"""
+        capabilities = self.__dict__.get('_capabilities_view')
+        if capabilities is None:
+            capabilities = MappingProxyType({
+                **self.standard_provider.get_capabilities(),
+                ProviderCapability.ENHANCED_CALL: True,
+            })
+            self._capabilities_view = capabilities
+        return capabilities
 
     def _determine_force_regime(self, mode: str) -> 'ComplexityRegime' or None:
         """モード文字列から強制する複雑性レジームを決定する。"""
+        regime_value = _FORCE_REGIME_BY_MODE.get(mode)
+        if regime_value is None:
+            return None
         # このインポートは実行時にのみ行われる
         from ..cogniquantum.enums import ComplexityRegime
-        if mode in ['efficient', 'edge']: return ComplexityRegime.LOW
-        if mode == 'balanced': return ComplexityRegime.MEDIUM
-        if mode == 'decomposed': return ComplexityRegime.HIGH
-        return None
+        return ComplexityRegime(regime_value)
+
+    def _get_cq_system(self, base_model_kwargs: Dict[str, Any]) -> 'CogniQuantumSystemV2':
+        """
+        生成パラメータが同じ呼び出しでは同一のCogniQuantumSystemV2を再利用し、
+        解決結果キャッシュやRAGマネージャーなどの状態を呼び出し間で共有する。
+        """
+        # 循環参照を避けるため、実行時にインポート
+        from ..cogniquantum.system import CogniQuantumSystemV2
+
+        try:
+            key = frozenset(base_model_kwargs.items())
+        except TypeError:
+            # ハッシュできない値を含む場合は共有せず、その場限りのインスタンスを使う
+            return CogniQuantumSystemV2(self.standard_provider, base_model_kwargs)
+
+        cq_system = self._cq_cache.get(key)
+        if cq_system is None:
+            cq_system = CogniQuantumSystemV2(self.standard_provider, base_model_kwargs)
+            self._cq_cache[key] = cq_system
+            if len(self._cq_cache) > self.CQ_SYSTEM_CACHE_SIZE:
+                self._cq_cache.popitem(last=False)
+        else:
+            self._cq_cache.move_to_end(key)
+        return cq_system
 
     @abstractmethod
     def _get_optimized_params(self, mode: str, kwargs: Dict) -> Dict:
@@ -120,9 +230,6 @@ class EnhancedLLMProvider(LLMProvider):
         """
         CogniQuantumシステムを利用した拡張呼び出しの共通ロジック。
         """
-        # 循環参照を避けるため、実行時にインポート
-        from ..cogniquantum.system import CogniQuantumSystemV2
-
         try:
             mode = kwargs.get('mode', 'adaptive')
             logger.info(f"{self.provider_name} V2拡張呼び出し実行 (モード: {mode})")
@@ -130,7 +237,7 @@ class EnhancedLLMProvider(LLMProvider):
             force_regime = self._determine_force_regime(mode)
             base_model_kwargs = self._get_optimized_params(mode, kwargs)
 
-            cq_system = CogniQuantumSystemV2(self.standard_provider, base_model_kwargs)
+            cq_system = self._get_cq_system(base_model_kwargs)
 
             # CogniQuantumSystemV2.solve_problemに渡す引数をkwargsから抽出
             system_kwargs = {
@@ -151,20 +258,18 @@ class EnhancedLLMProvider(LLMProvider):
             if not result.get('success'):
                 error_message = result.get('error', f'CogniQuantumシステム({self.provider_name})で不明なエラーが発生しました。')
                 logger.error(f"CogniQuantumシステムがエラーを返しました: {error_message}")
-                return {"text": "", "error": error_message}
+                return _err(error_message)
 
             paper_based_improvements = result.get('complexity_analysis', {})
             paper_based_improvements.update(result.get('v2_improvements', {}))
 
-            return {
-                'text': result.get('final_solution', ''),
-                'image_url': result.get('image_url'),
-                'model': base_model_kwargs.get('model', 'default'),
-                'usage': {},
-                'error': None,
-                'version': 'v2',
-                'paper_based_improvements': paper_based_improvements
-            }
+            return _ok(
+                result.get('final_solution', ''),
+                base_model_kwargs.get('model', 'default'),
+                image_url=result.get('image_url'),
+                version='v2',
+                paper_based_improvements=paper_based_improvements,
+            )
         except Exception as e:
             logger.error(f"{self.provider_name} V2拡張プロバイダーで予期せぬエラー: {e}", exc_info=True)
-            return {"text": "", "error": str(e)}
\ No newline at end of file
+            return _err(e)
\ No newline at end of file
@@ -1,62 +1,175 @@
 # /llm_api/providers/claude.py
+import asyncio
+import functools
 import logging
-from typing import Any, Dict
+import weakref
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Mapping
 
-from anthropic import AsyncAnthropic
-from .base import LLMProvider, ProviderCapability
+import httpx
+from .base import LLMProvider, ProviderCapability, _err, _ok
+from ._retry import is_retryable_status, with_retry
 from ..config import settings
 
+try:
+    import h2  # noqa: F401  httpxのHTTP/2サポートに必要
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+if TYPE_CHECKING:
+    from anthropic import AsyncAnthropic
+
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=1)
+def _load_sdk():
+    """
+    anthropic SDKを初回利用時にインポートする。プロバイダー一覧の構築時など、
+    このプロバイダーを使わないプロセスでSDKのインポートコストを払わないようにする。
+    """
+    import anthropic
+    return anthropic
+
+
+def __getattr__(name: str):
+    # 従来の `from llm_api.providers.claude import AsyncAnthropic` との互換性を保つ
+    if name == 'AsyncAnthropic':
+        return _load_sdk().AsyncAnthropic
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 全てのClaudeProviderインスタンスで共有するクライアント。
+# httpxのコネクションはイベントループに紐づくため、ループごとに1つ持つ。終了したループのクライアントは、
+# 次に新しいループでクライアントを作る際に辞書から外し、古いクライアントが参照され続けないようにする。
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAnthropic]" = weakref.WeakKeyDictionary()
+
+
+def _new_client() -> "AsyncAnthropic":
+    anthropic = _load_sdk()
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    )
+    # 再試行はwith_retryで行うため、SDK内蔵の再試行は無効にする（二重の再試行を防ぐ）
+    return anthropic.AsyncAnthropic(api_key=settings.CLAUDE_API_KEY, max_retries=0, http_client=http_client)
+
+
+def _get_shared_client() -> "AsyncAnthropic":
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # イベントループの外では共有先のループがないため、その場限りのクライアントを返す
+        return _new_client()
+    client = _shared_clients.get(loop)
+    if client is None:
+        # 接続がループを参照していると弱参照だけでは解放されないため、終了済みのループのクライアントは明示的に手放す
+        for stale_loop in [l for l in _shared_clients if l.is_closed()]:
+            del _shared_clients[stale_loop]
+        client = _new_client()
+        _shared_clients[loop] = client
+    return client
+
 class ClaudeProvider(LLMProvider):
     """
     Anthropic Claude APIと対話するための標準プロバイダー
     """
     def __init__(self):
-        self.client = AsyncAnthropic(api_key=settings.CLAUDE_API_KEY)
+        _load_sdk()
         self.default_model = settings.CLAUDE_DEFAULT_MODEL
         super().__init__()
 
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
+    @property
+    def client(self) -> "AsyncAnthropic":
+        return _get_shared_client()
+
+    # ケイパビリティは静的なため、クラス定義時に一度だけ作り、変更できないビューとして共有する
+    _CAPABILITIES = MappingProxyType({
+        ProviderCapability.STANDARD_CALL: True,
+        ProviderCapability.ENHANCED_CALL: False,
+        ProviderCapability.STREAMING: True,
+        ProviderCapability.SYSTEM_PROMPT: True,
+        ProviderCapability.TOOLS: True,
+        ProviderCapability.JSON_MODE: False,
+        ProviderCapability.PREFIX_CACHE: True,
+    })
+
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
         """このプロバイダーのケイパビリティを返す。"""
-        return {
-            ProviderCapability.STANDARD_CALL: True,
-            ProviderCapability.ENHANCED_CALL: False,
-            ProviderCapability.STREAMING: True,
-            ProviderCapability.SYSTEM_PROMPT: True,
-            ProviderCapability.TOOLS: True,
-            ProviderCapability.JSON_MODE: False,
-        }
+        return self._CAPABILITIES
 
     def should_use_enhancement(self, prompt: str, **kwargs) -> bool:
         """標準プロバイダーは拡張機能を使用しない。"""
         return False
 
+    @staticmethod
+    def _build_user_content(prompt: str, cache_prefix: str = None):
+        """
+        プロンプトが固定のプレフィックスで始まる場合、その部分をcache_control付きのブロックに分け、
+        プロンプトキャッシュの対象にする。
+        """
+        if not cache_prefix or not prompt.startswith(cache_prefix) or len(prompt) == len(cache_prefix):
+            return prompt
+        return [
+            {"type": "text", "text": cache_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt[len(cache_prefix):]},
+        ]
+
+    @staticmethod
+    def _build_system(system_prompt: str, cache_system_prompt: bool = False):
+        """
+        cache_system_promptが指定された場合、システムプロンプトをcache_control付きのブロックにする。
+        同じシステムプロンプトで続く呼び出し（並列パイプラインやサブ問題の解決）がプロンプトキャッシュにヒットする。
+        """
+        if not cache_system_prompt or not system_prompt:
+            return system_prompt
+        return [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
+
+    async def stream_call(self, prompt: str, system_prompt: str = "", **kwargs) -> AsyncIterator[str]:
+        """Claude APIをストリーミングで呼び出し、生成されたテキストを逐次yieldする。"""
+        async with self.client.messages.stream(
+            model=kwargs.get("model", self.default_model),
+            system=self._build_system(system_prompt, kwargs.get("cache_system_prompt", False)),
+            messages=[{"role": "user", "content": self._build_user_content(prompt, kwargs.get("cache_prefix"))}],
+            temperature=kwargs.get("temperature", 0.7),
+            max_tokens=kwargs.get("max_tokens", 1024),
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+    @staticmethod
+    def _is_transient(exc: BaseException) -> bool:
+        """レート制限・5xx・過負荷(529)・接続エラーのみを再試行対象とする。"""
+        anthropic = _load_sdk()
+        return (
+            isinstance(exc, (anthropic.APIConnectionError, anthropic.InternalServerError))
+            or is_retryable_status(exc)
+        )
+
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
         """Claude APIを呼び出し、標準化された辞書形式で結果を返す。"""
         model_to_use = kwargs.get("model", self.default_model)
         try:
-            response = await self.client.messages.create(
-                model=model_to_use,
-                system=system_prompt,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=kwargs.get("temperature", 0.7),
-                max_tokens=kwargs.get("max_tokens", 1024),
+            response = await with_retry(
+                lambda: self.client.messages.create(
+                    model=model_to_use,
+                    system=self._build_system(system_prompt, kwargs.get("cache_system_prompt", False)),
+                    messages=[{"role": "user", "content": self._build_user_content(prompt, kwargs.get("cache_prefix"))}],
+                    temperature=kwargs.get("temperature", 0.7),
+                    max_tokens=kwargs.get("max_tokens", 1024),
+                ),
+                retryable=self._is_transient,
+                description="Claude API呼び出し",
             )
             
             content = response.content[0].text
             usage = response.usage
 
-            return {
-                "text": content.strip(),
-                "model": response.model,
-                "usage": {
-                    "prompt_tokens": usage.input_tokens,
-                    "completion_tokens": usage.output_tokens,
-                    "total_tokens": usage.input_tokens + usage.output_tokens,
-                },
-                "error": None,
-            }
+            return _ok(content.strip(), response.model, {
+                "prompt_tokens": usage.input_tokens,
+                "completion_tokens": usage.output_tokens,
+                "total_tokens": usage.input_tokens + usage.output_tokens,
+            })
         except Exception as e:
             logger.error(f"Claude API呼び出し中にエラー: {e}", exc_info=True)
-            return {"text": "", "error": str(e)}
\ No newline at end of file
+            return _err(e)
\ No newline at end of file
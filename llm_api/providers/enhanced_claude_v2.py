@@ -4,7 +4,16 @@
 
 from typing import Any, Dict
 
-from .base import EnhancedLLMProvider, ProviderCapability
+from .base import EnhancedLLMProvider
+
+# モードに応じたデフォルトモデル（高度なタスクにはSonnet、それ以外はHaiku）
+_CLAUDE_SONNET_DEFAULTS = {'model': 'claude-3-sonnet-20240229'}
+_CLAUDE_HAIKU_DEFAULTS = {'model': 'claude-3-haiku-20240307'}
+_CLAUDE_DEFAULTS_BY_MODE = {
+    'decomposed': _CLAUDE_SONNET_DEFAULTS,
+    'paper_optimized': _CLAUDE_SONNET_DEFAULTS,
+    'quantum_inspired': _CLAUDE_SONNET_DEFAULTS,
+}
 
 class EnhancedClaudeProviderV2(EnhancedLLMProvider):
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
@@ -18,17 +27,4 @@ class EnhancedClaudeProviderV2(EnhancedLLMProvider):
 
     def _get_optimized_params(self, mode: str, kwargs: Dict) -> Dict:
         """Claudeに最適化されたモデルパラメータを返す。"""
-        params = kwargs.copy()
-        if 'model' not in params:
-            # モードに応じてデフォルトモデルを賢く選択
-            if mode in ['decomposed', 'paper_optimized', 'quantum_inspired']:
-                params['model'] = 'claude-3-sonnet-20240229' # 高度なタスクにはSonnet
-            else:
-                params['model'] = 'claude-3-haiku-20240307' # それ以外はHaiku
-        return params
-
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
-        # 標準プロバイダーの能力を継承しつつ、拡張呼び出しを有効化
-        capabilities = self.standard_provider.get_capabilities()
-        capabilities[ProviderCapability.ENHANCED_CALL] = True
-        return capabilities
\ No newline at end of file
+        return {**_CLAUDE_DEFAULTS_BY_MODE.get(mode, _CLAUDE_HAIKU_DEFAULTS), **kwargs}
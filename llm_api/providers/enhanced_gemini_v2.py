@@ -4,7 +4,16 @@
 
 from typing import Any, Dict
 
-from .base import EnhancedLLMProvider, ProviderCapability
+from .base import EnhancedLLMProvider
+
+# 高度なタスクにはPro、それ以外はFlash
+_GEMINI_PRO_DEFAULTS = {'model': 'gemini-1.5-pro-latest'}
+_GEMINI_FLASH_DEFAULTS = {'model': 'gemini-1.5-flash-latest'}
+_GEMINI_DEFAULTS_BY_MODE = {
+    'decomposed': _GEMINI_PRO_DEFAULTS,
+    'paper_optimized': _GEMINI_PRO_DEFAULTS,
+    'quantum_inspired': _GEMINI_PRO_DEFAULTS,
+}
 
 class EnhancedGeminiProviderV2(EnhancedLLMProvider):
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
@@ -18,15 +27,4 @@ class EnhancedGeminiProviderV2(EnhancedLLMProvider):
 
     def _get_optimized_params(self, mode: str, kwargs: Dict) -> Dict:
         """Geminiに最適化されたモデルパラメータを返す。"""
-        params = kwargs.copy()
-        if 'model' not in params:
-            if mode in ['decomposed', 'paper_optimized', 'quantum_inspired']:
-                params['model'] = 'gemini-1.5-pro-latest' # 高度なタスクにはPro
-            else:
-                params['model'] = 'gemini-1.5-flash-latest' # それ以外はFlash
-        return params
-
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
-        capabilities = self.standard_provider.get_capabilities()
-        capabilities[ProviderCapability.ENHANCED_CALL] = True
-        return capabilities
\ No newline at end of file
+        return {**_GEMINI_DEFAULTS_BY_MODE.get(mode, _GEMINI_FLASH_DEFAULTS), **kwargs}
@@ -4,7 +4,9 @@
 
 from typing import Any, Dict
 
-from .base import EnhancedLLMProvider, ProviderCapability
+from .base import EnhancedLLMProvider
+
+_HF_DEFAULTS = {'model': 'meta-llama/Meta-Llama-3-8B-Instruct'}
 
 class EnhancedHuggingFaceProviderV2(EnhancedLLMProvider):
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
@@ -18,12 +20,4 @@ class EnhancedHuggingFaceProviderV2(EnhancedLLMProvider):
 
     def _get_optimized_params(self, mode: str, kwargs: Dict) -> Dict:
         """HuggingFaceに最適化されたモデルパラメータを返す。"""
-        params = kwargs.copy()
-        if 'model' not in params:
-            params['model'] = 'meta-llama/Meta-Llama-3-8B-Instruct'
-        return params
-
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
-        capabilities = self.standard_provider.get_capabilities()
-        capabilities[ProviderCapability.ENHANCED_CALL] = True
-        return capabilities
\ No newline at end of file
+        return {**_HF_DEFAULTS, **kwargs}
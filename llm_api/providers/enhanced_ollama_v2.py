@@ -5,11 +5,14 @@
 import logging
 from typing import Any, Dict
 
-from .base import EnhancedLLMProvider, ProviderCapability
+from .base import EnhancedLLMProvider
 from ..utils.helper_functions import get_model_family
 
 logger = logging.getLogger(__name__)
 
+# モードごとの既定のtemperature
+_TEMPERATURE_BY_MODE = {'efficient': 0.2, 'balanced': 0.5, 'decomposed': 0.4, 'edge': 0.3}
+
 class EnhancedOllamaProviderV2(EnhancedLLMProvider):
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
         return await self.standard_provider.standard_call(prompt, system_prompt, **kwargs)
@@ -22,7 +25,6 @@ class EnhancedOllamaProviderV2(EnhancedLLMProvider):
 
     def _get_optimized_params(self, mode: str, kwargs: Dict) -> Dict:
         """Ollamaに最適化されたモデルパラメータを返す。"""
-        params = kwargs.copy()
         model_name = kwargs.get('model')
 
         if mode == 'edge' and not model_name:
@@ -35,21 +37,12 @@ class EnhancedOllamaProviderV2(EnhancedLLMProvider):
         family = get_model_family(effective_model_name)
         logger.info(f"モデル '{effective_model_name}' (ファミリー: {family}) のパラメータを最適化中")
 
-        if 'model' not in params:
-            params['model'] = effective_model_name
-
-        temp_map = {'efficient': 0.2, 'balanced': 0.5, 'decomposed': 0.4, 'edge': 0.3}
-        if mode in temp_map and 'temperature' not in params:
-            params['temperature'] = temp_map[mode]
-
-        if family == 'llama' and 'top_p' not in params:
-            params['top_p'] = 0.9
-        elif family == 'qwen' and 'temperature' not in params:
-            params['temperature'] = temp_map.get(mode, 0.4)
-
-        return params
+        # 既定値だけの小さな辞書を組み立て、最後に呼び出し側の指定を重ねる（kwargsの複製はしない）
+        defaults = {'model': effective_model_name}
+        temperature = _TEMPERATURE_BY_MODE.get(mode, 0.4 if family == 'qwen' else None)
+        if temperature is not None:
+            defaults['temperature'] = temperature
+        if family == 'llama':
+            defaults['top_p'] = 0.9
 
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
-        capabilities = self.standard_provider.get_capabilities()
-        capabilities[ProviderCapability.ENHANCED_CALL] = True
-        return capabilities
\ No newline at end of file
+        return {**defaults, **kwargs}
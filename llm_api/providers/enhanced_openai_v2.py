@@ -2,15 +2,19 @@
 # タイトル: Refactored EnhancedOpenAIProviderV2
 # 役割: OpenAIプロバイダーにCogniQuantum V2の機能を提供する。設定はconfigモジュールから取得。
 
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
-from .base import EnhancedLLMProvider, ProviderCapability
+from .base import EnhancedLLMProvider
 from ..config import settings
 
 class EnhancedOpenAIProviderV2(EnhancedLLMProvider):
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
         return await self.standard_provider.standard_call(prompt, system_prompt, **kwargs)
 
+    async def batch_call(self, requests: List[Tuple[str, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        # 同時実行数の制限とレート制限時の再試行は標準プロバイダーのbatch_callに任せる
+        return await self.standard_provider.batch_call(requests)
+
     def should_use_enhancement(self, prompt: str, **kwargs) -> bool:
         return kwargs.get('force_v2', False) or kwargs.get('mode', 'simple') in [
             'efficient', 'balanced', 'decomposed', 'adaptive', 'paper_optimized', 'parallel',
@@ -19,12 +23,5 @@ class EnhancedOpenAIProviderV2(EnhancedLLMProvider):
 
     def _get_optimized_params(self, mode: str, kwargs: Dict) -> Dict:
         """OpenAIに最適化されたモデルパラメータを返す。"""
-        params = kwargs.copy()
-        if 'model' not in params:
-            params['model'] = settings.OPENAI_DEFAULT_MODEL
-        return params
-
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
-        capabilities = self.standard_provider.get_capabilities()
-        capabilities[ProviderCapability.ENHANCED_CALL] = True
-        return capabilities
\ No newline at end of file
+        # 既定値の上に呼び出し側の指定を重ねる（既定モデルは設定変更に追従するよう呼び出し時に読む）
+        return {'model': settings.OPENAI_DEFAULT_MODEL, **kwargs}
@@ -1,13 +1,38 @@
 # /llm_api/providers/gemini.py
+import functools
 import logging
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping
 
-import google.generativeai as genai
-from .base import LLMProvider, ProviderCapability
+from .base import LLMProvider, ProviderCapability, _err, _ok
+from ._retry import RETRYABLE_STATUS, is_retryable_status, with_retry
 from ..config import settings
 
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _load_sdk():
+    """
+    Gemini SDKを初回利用時にインポートし、(genai, genai_types, legacy_genai)を返す。
+    google-genai（スレッドプールを経由しないネイティブな非同期クライアント）を優先し、
+    未インストールの場合は従来のgoogle-generativeai SDKを使用する。
+    プロバイダー一覧の構築時など、このプロバイダーを使わないプロセスでgRPC等のインポートコストを払わないようにする。
+    """
+    try:
+        from google import genai
+        from google.genai import types as genai_types
+        return genai, genai_types, None
+    except ImportError:
+        import google.generativeai as legacy_genai
+        return None, None, legacy_genai
+
+def __getattr__(name: str):
+    # 従来の `from llm_api.providers.gemini import genai` との互換性を保つ
+    if name == 'genai':
+        genai, _, legacy_genai = _load_sdk()
+        return genai if genai is not None else legacy_genai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 class GeminiProvider(LLMProvider):
     """
     Google Gemini APIと対話するための標準プロバイダー
@@ -16,42 +41,84 @@ class GeminiProvider(LLMProvider):
         api_key = settings.GEMINI_API_KEY
         if not api_key:
             raise ValueError("GEMINI_API_KEYが設定されていません。")
-        genai.configure(api_key=api_key)
+        genai, self._genai_types, self._legacy_genai = _load_sdk()
+        if genai is not None:
+            # google-genaiのクライアントは既定で再試行しないため、再試行はstandard_callのwith_retryだけが行う
+            self._client = genai.Client(api_key=api_key)
+        else:
+            self._client = None
+            self._legacy_genai.configure(api_key=api_key)
         self.default_model = settings.GEMINI_DEFAULT_MODEL
         # モデルの初期化は呼び出し時に行うことで、モデル名の動的変更に対応
         super().__init__()
 
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
+    # ケイパビリティは静的なため、クラス定義時に一度だけ作り、変更できないビューとして共有する
+    _CAPABILITIES = MappingProxyType({
+        ProviderCapability.STANDARD_CALL: True,
+        ProviderCapability.ENHANCED_CALL: False,
+        ProviderCapability.STREAMING: True,
+        ProviderCapability.SYSTEM_PROMPT: True,
+        ProviderCapability.TOOLS: True,
+        ProviderCapability.JSON_MODE: True,
+    })
+
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
         """このプロバイダーのケイパビリティを返す。"""
-        return {
-            ProviderCapability.STANDARD_CALL: True,
-            ProviderCapability.ENHANCED_CALL: False,
-            ProviderCapability.STREAMING: True,
-            ProviderCapability.SYSTEM_PROMPT: True,
-            ProviderCapability.TOOLS: True,
-            ProviderCapability.JSON_MODE: True,
-        }
+        return self._CAPABILITIES
 
     def should_use_enhancement(self, prompt: str, **kwargs) -> bool:
         """標準プロバイダーは拡張機能を使用しない。"""
         return False
 
+    async def _generate(self, model_name: str, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        """
+        google-genaiの非同期クライアントで生成する。システムプロンプトはユーザープロンプトに連結せず、
+        system_instructionとして渡す（Gemini側のプレフィックスキャッシュが効きやすくなる）。
+        """
+        response = await self._client.aio.models.generate_content(
+            model=model_name,
+            contents=prompt,
+            config=self._genai_types.GenerateContentConfig(system_instruction=system_prompt or None),
+        )
+        usage = response.usage_metadata
+        prompt_tokens = (usage.prompt_token_count or 0) if usage else 0
+        completion_tokens = (usage.candidates_token_count or 0) if usage else 0
+        return _ok((response.text or "").strip(), model_name, {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+
+    async def _generate_legacy(self, model_name: str, prompt: str, system_prompt: str) -> Dict[str, Any]:
+        """従来のgoogle-generativeai SDKで生成する。"""
+        model = self._legacy_genai.GenerativeModel(model_name)
+        
+        full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
+
+        # SDK内蔵の再試行は使わず、再試行はwith_retryに一本化する
+        response = await model.generate_content_async(full_prompt, request_options={"retry": None})
+        
+        # 従来SDKの経路ではトークン使用量を集計しない
+        return _ok(response.text.strip(), model_name)
+
+    @staticmethod
+    def _is_transient(exc: BaseException) -> bool:
+        """
+        レート制限・5xxのみを再試行対象とする。
+        google-genaiのAPIErrorとgoogle-api-coreの例外はHTTPステータスをcode属性に持つ。
+        """
+        return is_retryable_status(exc) or getattr(exc, "code", None) in RETRYABLE_STATUS
+
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
         """Gemini APIを呼び出し、標準化された辞書形式で結果を返す。"""
         model_name = kwargs.get("model", self.default_model)
+        generate = self._generate if self._client is not None else self._generate_legacy
         try:
-            model = genai.GenerativeModel(model_name)
-            
-            full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-
-            response = await model.generate_content_async(full_prompt)
-            
-            return {
-                "text": response.text.strip(),
-                "model": model_name,
-                "usage": {}, # Gemini APIは現在、トークン使用量を直接返さない
-                "error": None,
-            }
+            return await with_retry(
+                lambda: generate(model_name, prompt, system_prompt),
+                retryable=self._is_transient,
+                description="Gemini API呼び出し",
+            )
         except Exception as e:
             logger.error(f"Gemini API呼び出し中にエラー: {e}", exc_info=True)
-            return {"text": "", "error": str(e)}
\ No newline at end of file
+            return _err(e)
\ No newline at end of file
@@ -1,32 +1,77 @@
 # /llm_api/providers/huggingface.py
+import functools
 import logging
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Dict, Mapping
 
-from huggingface_hub import AsyncInferenceClient
-from .base import LLMProvider, ProviderCapability
+from ._retry import is_retryable_status, with_retry
+from .base import LLMProvider, ProviderCapability, _err, _ok
 from ..config import settings
 
+if TYPE_CHECKING:
+    from huggingface_hub import AsyncInferenceClient
+
 logger = logging.getLogger(__name__)
 
+@functools.lru_cache(maxsize=1)
+def _load_sdk():
+    """
+    huggingface_hubを初回利用時にインポートする。プロバイダー一覧の構築時など、
+    このプロバイダーを使わないプロセスでSDKのインポートコストを払わないようにする。
+    """
+    import huggingface_hub
+    return huggingface_hub
+
+def __getattr__(name: str):
+    # 従来の `from llm_api.providers.huggingface import AsyncInferenceClient` との互換性を保つ
+    if name == 'AsyncInferenceClient':
+        return _load_sdk().AsyncInferenceClient
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@functools.lru_cache(maxsize=128)
+def _render_prefix(system_prompt: str) -> str:
+    """
+    システムプロンプト部分のテンプレートを組み立てる。
+    CogniQuantumのサブ呼び出しは同じシステムプロンプトを繰り返し使うため、組み立て結果をキャッシュする。
+    """
+    return f"<|system|>\n{system_prompt}<|end|>\n<|user|>\n"
+
+@functools.lru_cache(maxsize=32)
+def _shared_hf_client(model: str) -> "AsyncInferenceClient":
+    """モデルごとにエンドポイントを固定したクライアントを、全てのHuggingFaceProviderインスタンスで共有する。"""
+    return _load_sdk().AsyncInferenceClient(model=model, token=settings.HF_TOKEN)
+
 class HuggingFaceProvider(LLMProvider):
     """
     Hugging Face Inference APIと対話するための標準プロバイダー
     """
     def __init__(self):
-        self.client = AsyncInferenceClient(token=settings.HF_TOKEN)
+        _load_sdk()
         self.default_model = settings.HUGGINGFACE_DEFAULT_MODEL
         super().__init__()
 
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
+    @property
+    def client(self) -> "AsyncInferenceClient":
+        """デフォルトモデル用のクライアント。"""
+        return self._client_for(self.default_model)
+
+    def _client_for(self, model: str) -> "AsyncInferenceClient":
+        # モデルごとのクライアントを使い回し、呼び出しごとのモデル解決を省いてkeep-aliveを効かせる
+        return _shared_hf_client(model)
+
+    # ケイパビリティは静的なため、クラス定義時に一度だけ作り、変更できないビューとして共有する
+    _CAPABILITIES = MappingProxyType({
+        ProviderCapability.STANDARD_CALL: True,
+        ProviderCapability.ENHANCED_CALL: False,
+        ProviderCapability.STREAMING: False,
+        ProviderCapability.SYSTEM_PROMPT: True,
+        ProviderCapability.TOOLS: False,
+        ProviderCapability.JSON_MODE: False,
+    })
+
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
         """このプロバイダーのケイパビリティを返す。"""
-        return {
-            ProviderCapability.STANDARD_CALL: True,
-            ProviderCapability.ENHANCED_CALL: False,
-            ProviderCapability.STREAMING: False,
-            ProviderCapability.SYSTEM_PROMPT: True,
-            ProviderCapability.TOOLS: False,
-            ProviderCapability.JSON_MODE: False,
-        }
+        return self._CAPABILITIES
 
     def should_use_enhancement(self, prompt: str, **kwargs) -> bool:
         """標準プロバイダーは拡張機能を使用しない。"""
@@ -35,26 +80,26 @@ class HuggingFaceProvider(LLMProvider):
     async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
         """Hugging Face Inference APIを呼び出し、標準化された辞書形式で結果を返す。"""
         if system_prompt:
-            full_prompt = f"<|system|>\n{system_prompt}<|end|>\n<|user|>\n{prompt}<|end|>\n<|assistant|>"
+            full_prompt = _render_prefix(system_prompt) + prompt + "<|end|>\n<|assistant|>"
         else:
             full_prompt = prompt
             
         model_to_use = kwargs.get("model", self.default_model)
 
         try:
-            response_text = await self.client.text_generation(
-                prompt=full_prompt,
-                model=model_to_use,
-                max_new_tokens=kwargs.get("max_tokens", 1024),
-                temperature=kwargs.get("temperature", 0.7),
+            client = self._client_for(model_to_use)
+            response_text = await with_retry(
+                lambda: client.text_generation(
+                    prompt=full_prompt,
+                    max_new_tokens=kwargs.get("max_tokens", 1024),
+                    temperature=kwargs.get("temperature", 0.7),
+                ),
+                retryable=is_retryable_status,
+                description="Hugging Face API呼び出し",
             )
             
-            return {
-                "text": response_text.strip(),
-                "model": model_to_use,
-                "usage": {}, # HF APIはトークン使用量を返さない
-                "error": None,
-            }
+            # HF APIはトークン使用量を返さない
+            return _ok(response_text.strip(), model_to_use)
         except Exception as e:
             logger.error(f"Hugging Face API呼び出し中にエラー: {e}", exc_info=True)
-            return {"text": "", "error": str(e)}
\ No newline at end of file
+            return _err(e)
\ No newline at end of file
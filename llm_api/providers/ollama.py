@@ -2,84 +2,188 @@
 # タイトル: OllamaProvider with Centralized Settings
 # 役割: Ollamaと対話するための標準プロバイダー。設定値をconfigモジュールから正しく取得する。
 
+import asyncio
+import json
 import logging
-from typing import Any, Dict
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional
 
 import httpx
-from .base import LLMProvider, ProviderCapability
+from ._retry import status_code_of, with_retry
+from .base import LLMProvider, ProviderCapability, _err, _ok
 from ..config import settings
 
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:  # orjsonは任意依存。未インストール時は標準のjsonを使用する
+    def _json_dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+    _json_loads = json.loads
+
+_JSON_HEADERS = {"Content-Type": "application/json"}
+# 再試行するのはサーバーの起動中・過負荷による一時的な失敗のみ。生成中のタイムアウトは
+# OLLAMA_TIMEOUTが長いため再試行すると待ち時間が数倍になり、再試行しない
+_RETRYABLE_STATUS = frozenset({502, 503, 504})
+_RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
 logger = logging.getLogger(__name__)
 
 class OllamaProvider(LLMProvider):
     """
     Ollamaと対話するための標準プロバイダー
     """
-    def __init__(self):
-        self.api_base_url = settings.OLLAMA_API_BASE_URL
+    def __init__(self, api_base_urls: Optional[List[str]] = None):
+        # 複数のサーバーが指定された場合、処理中のリクエストが最も少ないサーバーへ振り分ける
+        self._endpoints: List[str] = list(api_base_urls or settings.ollama_endpoints())
+        self._inflight: List[int] = [0] * len(self._endpoints)
+        self.api_base_url = self._endpoints[0]
         self.default_model = settings.OLLAMA_DEFAULT_MODEL
         self.timeout = settings.OLLAMA_TIMEOUT
+        # リクエストごとにコネクションプールを作らないよう、サーバーごとのクライアントを使い回す。
+        # httpxのコネクションはイベントループに紐づくため、ループが変わった場合は作り直す。
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
         super().__init__()
-        logger.info(f"Ollama provider initialized with API URL: {self.api_base_url} and default model: {self.default_model}")
+        logger.info(f"Ollama provider initialized with API URL(s): {', '.join(self._endpoints)} and default model: {self.default_model}")
 
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
+    # ケイパビリティは静的なため、クラス定義時に一度だけ作り、変更できないビューとして共有する
+    _CAPABILITIES = MappingProxyType({
+        ProviderCapability.STANDARD_CALL: True,
+        ProviderCapability.ENHANCED_CALL: False,
+        ProviderCapability.STREAMING: True,
+        ProviderCapability.SYSTEM_PROMPT: True,
+        ProviderCapability.TOOLS: False,
+        ProviderCapability.JSON_MODE: True,
+    })
+
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
         """このプロバイダーのケイパビリティを返す。"""
-        return {
-            ProviderCapability.STANDARD_CALL: True,
-            ProviderCapability.ENHANCED_CALL: False,
-            ProviderCapability.STREAMING: False,
-            ProviderCapability.SYSTEM_PROMPT: True,
-            ProviderCapability.TOOLS: False,
-            ProviderCapability.JSON_MODE: True,
-        }
+        return self._CAPABILITIES
 
-    async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
-        """
-        Ollama APIを呼び出し、標準化された辞書形式で結果を返す。
-        """
-        api_url = f"{self.api_base_url}/api/chat"
-        model = kwargs.get("model", self.default_model)
-        
+    def _concurrency_limit(self) -> Optional[int]:
+        # Ollamaサーバーの並列処理スロット数（× サーバー数）を超えてリクエストを送らない
+        return settings.OLLAMA_CONCURRENCY_LIMIT * len(self._endpoints)
+
+    def _get_client(self, endpoint: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client_loop is not loop:
+            self._clients = {}
+            self._client_loop = loop
+        client = self._clients.get(endpoint)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=endpoint,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            )
+            self._clients[endpoint] = client
+        return client
+
+    def _acquire_endpoint(self) -> int:
+        index = min(range(len(self._endpoints)), key=self._inflight.__getitem__)
+        self._inflight[index] += 1
+        return index
+
+    async def close(self) -> None:
+        """保持しているHTTPクライアントのコネクションプールを閉じる。"""
+        for client in self._clients.values():
+            if not client.is_closed:
+                await client.aclose()
+        self._clients = {}
+        self._client_loop = None
+
+    def _build_payload(self, prompt: str, system_prompt: str, kwargs: Dict[str, Any], stream: bool) -> Dict[str, Any]:
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
 
         payload = {
-            "model": model,
+            "model": kwargs.get("model", self.default_model),
             "messages": messages,
-            "stream": False,
+            "stream": stream,
         }
         for key in ['temperature', 'top_p', 'top_k']:
             if key in kwargs:
                 payload[key] = kwargs[key]
+        return payload
 
-        try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(api_url, json=payload)
+    async def stream_call(self, prompt: str, system_prompt: str = "", **kwargs) -> AsyncIterator[str]:
+        """
+        Ollama APIをストリーミングで呼び出し、生成されたテキストを逐次yieldする。
+        呼び出し側が途中で打ち切った場合は接続を閉じ、サーバー側の生成も止める。エラー時は例外を送出する。
+        """
+        payload = self._build_payload(prompt, system_prompt, kwargs, stream=True)
+        async with self._call_slot():
+            endpoint_index = self._acquire_endpoint()
+            try:
+                client = self._get_client(self._endpoints[endpoint_index])
+                async with client.stream("POST", "/api/chat", content=_json_dumps(payload), headers=_JSON_HEADERS) as response:
+                    response.raise_for_status()
+                    # 応答は1行に1つのJSONオブジェクトが並ぶNDJSON形式
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = _json_loads(line)
+                        if chunk.get('error'):
+                            raise RuntimeError(f"Ollama APIエラー: {chunk['error']}")
+                        content = chunk.get('message', {}).get('content')
+                        if content:
+                            yield content
+                        if chunk.get('done'):
+                            break
+            finally:
+                self._inflight[endpoint_index] -= 1
+
+    @staticmethod
+    def _is_transient(exc: BaseException) -> bool:
+        return isinstance(exc, _RETRYABLE_ERRORS) or status_code_of(exc) in _RETRYABLE_STATUS
+
+    async def _post_chat(self, body: bytes) -> Dict[str, Any]:
+        # 再試行の待機中は処理スロットを手放すよう、スロットの確保からサーバー選択までを1回の試行とする
+        async with self._call_slot():
+            endpoint_index = self._acquire_endpoint()
+            try:
+                client = self._get_client(self._endpoints[endpoint_index])
+                response = await client.post("/api/chat", content=body, headers=_JSON_HEADERS)
                 response.raise_for_status()
-                response_data = response.json()
+                return _json_loads(response.content)
+            finally:
+                self._inflight[endpoint_index] -= 1
+
+    async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
+        """
+        Ollama APIを呼び出し、標準化された辞書形式で結果を返す。
+        """
+        model = kwargs.get("model", self.default_model)
+        body = _json_dumps(self._build_payload(prompt, system_prompt, kwargs, stream=False))
+
+        try:
+            response_data = await with_retry(
+                lambda: self._post_chat(body),
+                retryable=self._is_transient,
+                description="Ollama API呼び出し",
+            )
 
             full_response = response_data.get('message', {}).get('content', '')
-            
-            return {
-                "text": full_response,
-                "model": model,
-                "usage": {
-                    "prompt_tokens": response_data.get("prompt_eval_count", 0),
-                    "completion_tokens": response_data.get("eval_count", 0),
-                    "total_tokens": response_data.get("prompt_eval_count", 0) + response_data.get("eval_count", 0)
-                },
-                "error": None
-            }
+            prompt_tokens = response_data.get("prompt_eval_count", 0)
+            completion_tokens = response_data.get("eval_count", 0)
+
+            return _ok(full_response, model, {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            })
         except httpx.HTTPStatusError as e:
             error_msg = f"Ollama API HTTPエラー: {e.response.status_code} - {e.response.text}"
             logger.error(error_msg)
-            return {"text": "", "error": error_msg}
+            return _err(error_msg)
         except Exception as e:
             error_msg = f"Ollama API呼び出し中にエラー: {e}"
             logger.error(error_msg, exc_info=True)
-            return {"text": "", "error": error_msg}
+            return _err(error_msg)
 
     def should_use_enhancement(self, prompt: str, **kwargs) -> bool:
         """標準プロバイダーは拡張機能を使用しない。"""
@@ -1,67 +1,185 @@
 # /llm_api/providers/openai.py
+import asyncio
+import functools
 import logging
-from typing import Any, Dict
+import weakref
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
 
-from openai import AsyncOpenAI
-from .base import LLMProvider, ProviderCapability
+import httpx
+from ._retry import is_retryable_status, with_retry
+from .base import LLMProvider, ProviderCapability, _err, _ok
 from ..config import settings
 
+try:
+    import h2  # noqa: F401  httpxのHTTP/2サポートに必要
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=1)
+def _load_sdk():
+    """
+    openai SDKを初回利用時にインポートする。プロバイダー一覧の構築時など、
+    このプロバイダーを使わないプロセスでSDKのインポートコストを払わないようにする。
+    """
+    import openai
+    return openai
+
+
+def __getattr__(name: str):
+    # 従来の `from llm_api.providers.openai import AsyncOpenAI` との互換性を保つ
+    if name == 'openai':
+        return _load_sdk()
+    if name == 'AsyncOpenAI':
+        return _load_sdk().AsyncOpenAI
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 全てのOpenAIProviderインスタンスで共有するクライアント（コネクションプールを1つにまとめ、HTTP/2で多重化する）。
+# httpxのコネクションはイベントループに紐づくため、ループごとに1つ持つ。終了したループのクライアントは、
+# 次に新しいループでクライアントを作る際に辞書から外し、古いクライアントが参照され続けないようにする。
+_shared_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def _new_client() -> "AsyncOpenAI":
+    openai = _load_sdk()
+    http_client = openai.DefaultAsyncHttpxClient(
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    )
+    # 再試行はwith_retryで行うため、SDK内蔵の再試行は無効にする（二重の再試行を防ぐ）
+    return openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0, http_client=http_client)
+
+
+def _get_shared_client() -> "AsyncOpenAI":
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # イベントループの外では共有先のループがないため、その場限りのクライアントを返す
+        return _new_client()
+    client = _shared_clients.get(loop)
+    if client is None:
+        # 接続がループを参照していると弱参照だけでは解放されないため、終了済みのループのクライアントは明示的に手放す
+        for stale_loop in [l for l in _shared_clients if l.is_closed()]:
+            del _shared_clients[stale_loop]
+        client = _new_client()
+        _shared_clients[loop] = client
+    return client
+
 class OpenAIProvider(LLMProvider):
     """
     OpenAI APIと対話するための標準プロバイダー
     """
+    # batch_callで同時に送るリクエスト数の既定値
+    BATCH_MAX_CONCURRENCY = 16
+
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        _load_sdk()
         self.default_model = settings.OPENAI_DEFAULT_MODEL
         super().__init__()
 
-    def get_capabilities(self) -> Dict[ProviderCapability, bool]:
+    @property
+    def client(self) -> "AsyncOpenAI":
+        return _get_shared_client()
+
+    # ケイパビリティは静的なため、クラス定義時に一度だけ作り、変更できないビューとして共有する
+    _CAPABILITIES = MappingProxyType({
+        ProviderCapability.STANDARD_CALL: True,
+        ProviderCapability.ENHANCED_CALL: False,
+        ProviderCapability.STREAMING: True,
+        ProviderCapability.SYSTEM_PROMPT: True,
+        ProviderCapability.TOOLS: True,
+        ProviderCapability.JSON_MODE: True,
+        ProviderCapability.BATCH_CALL: True,
+    })
+
+    def get_capabilities(self) -> Mapping[ProviderCapability, bool]:
         """このプロバイダーのケイパビリティを返す。"""
-        return {
-            ProviderCapability.STANDARD_CALL: True,
-            ProviderCapability.ENHANCED_CALL: False,
-            ProviderCapability.STREAMING: True,
-            ProviderCapability.SYSTEM_PROMPT: True,
-            ProviderCapability.TOOLS: True,
-            ProviderCapability.JSON_MODE: True,
-        }
+        return self._CAPABILITIES
 
     def should_use_enhancement(self, prompt: str, **kwargs) -> bool:
         """標準プロバイダーは拡張機能を使用しない。"""
         return False
         
-    async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
-        """OpenAI APIを呼び出し、標準化された辞書形式で結果を返す。"""
+    @staticmethod
+    def _build_messages(prompt: str, system_prompt: str):
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
+        return messages
+
+    async def stream_call(self, prompt: str, system_prompt: str = "", **kwargs) -> AsyncIterator[str]:
+        """OpenAI APIをストリーミングで呼び出し、生成されたテキストを逐次yieldする。"""
+        stream = await self.client.chat.completions.create(
+            model=kwargs.get("model", self.default_model),
+            messages=self._build_messages(prompt, system_prompt),
+            temperature=kwargs.get("temperature", 0.7),
+            max_tokens=kwargs.get("max_tokens", 1024),
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # 呼び出し側が途中で打ち切った場合も接続を閉じ、以降のトークン生成を止める
+            await stream.close()
+
+    async def batch_call(self, requests: List[Tuple[str, str, Dict[str, Any]]], max_concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        複数のリクエストを同時実行数を制限しながら並行に送信し、同じ順序で応答を返す。
+        レート制限（429）などの一時的なエラーは、各要素のstandard_call内で指数バックオフにより再試行される。
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.BATCH_MAX_CONCURRENCY)
+
+        async def run(prompt: str, system_prompt: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.call(prompt, system_prompt, **kwargs)
+
+        responses = await asyncio.gather(*(run(*request) for request in requests), return_exceptions=True)
+        return [
+            _err(response) if isinstance(response, Exception) else response
+            for response in responses
+        ]
+
+    @staticmethod
+    def _is_transient(exc: BaseException) -> bool:
+        """レート制限・5xx・接続エラーのみを再試行対象とする。"""
+        return isinstance(exc, _load_sdk().APIConnectionError) or is_retryable_status(exc)
+
+    async def standard_call(self, prompt: str, system_prompt: str = "", **kwargs) -> Dict[str, Any]:
+        """OpenAI APIを呼び出し、標準化された辞書形式で結果を返す。"""
+        messages = self._build_messages(prompt, system_prompt)
 
         model_to_use = kwargs.get("model", self.default_model)
 
         try:
-            response = await self.client.chat.completions.create(
-                model=model_to_use,
-                messages=messages,
-                temperature=kwargs.get("temperature", 0.7),
-                max_tokens=kwargs.get("max_tokens", 1024),
+            response = await with_retry(
+                lambda: self.client.chat.completions.create(
+                    model=model_to_use,
+                    messages=messages,
+                    temperature=kwargs.get("temperature", 0.7),
+                    max_tokens=kwargs.get("max_tokens", 1024),
+                ),
+                retryable=self._is_transient,
+                description="OpenAI API呼び出し",
             )
             
             content = response.choices[0].message.content
             usage = response.usage
 
-            return {
-                "text": content.strip(),
-                "model": response.model,
-                "usage": {
-                    "prompt_tokens": usage.prompt_tokens,
-                    "completion_tokens": usage.completion_tokens,
-                    "total_tokens": usage.total_tokens,
-                },
-                "error": None,
-            }
+            return _ok(content.strip(), response.model, {
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "total_tokens": usage.total_tokens,
+            })
         except Exception as e:
             logger.error(f"OpenAI API呼び出し中にエラー: {e}", exc_info=True)
-            return {"text": "", "error": str(e)}
\ No newline at end of file
+            return _err(e)
\ No newline at end of file
@@ -3,6 +3,7 @@
 # タイトル: KnowledgeBase with updated LangChain components
 # 役割: LangChainの非推奨警告に対応し、新しい推奨コンポーネントを使用する。
 
+import functools
 import logging
 from typing import List, Optional
 
@@ -14,12 +15,17 @@ from langchain_huggingface import HuggingFaceEmbeddings
 
 logger = logging.getLogger(__name__)
 
+
+@functools.lru_cache(maxsize=None)
+def _get_embeddings(model_name: str) -> HuggingFaceEmbeddings:
+    """埋め込みモデルはモデル名ごとに一度だけ読み込み、全てのナレッジベースで共有する。"""
+    return HuggingFaceEmbeddings(model_name=model_name)
+
 class KnowledgeBase:
     """ナレッジベースを管理するクラス"""
     def __init__(self, embedding_model_name: str = 'sentence-transformers/all-MiniLM-L6-v2'):
         self.vector_store: Optional[FAISS] = None
-        # 新しいクラスを使用
-        self.embeddings = HuggingFaceEmbeddings(model_name=embedding_model_name)
+        self.embeddings = _get_embeddings(embedding_model_name)
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
 
     def load_documents(self, source: str):
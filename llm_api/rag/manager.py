@@ -14,6 +14,9 @@ from ..providers.base import LLMProvider # LLMProviderをインポート
 
 logger = logging.getLogger(__name__)
 
+# 抽出した検索クエリから取り除く括弧・引用符（1回の走査で削除する）
+_QUERY_QUOTES_TABLE = str.maketrans('', '', '「」"')
+
 class RAGManager:
     """RAGプロセスを管理するクラス"""
     def __init__(self,
@@ -25,6 +28,15 @@ class RAGManager:
         self.use_wikipedia = use_wikipedia
         self.knowledge_base_path = knowledge_base_path
         self.text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+        # ナレッジベースのベクトルストア構築（埋め込みモデルの読み込みを含む）は初回の検索時に一度だけ行う
+        self._retriever: Optional[Retriever] = None
+
+    def _get_retriever(self) -> Retriever:
+        if self._retriever is None:
+            kb = KnowledgeBase()
+            kb.load_documents(self.knowledge_base_path)
+            self._retriever = Retriever(kb)
+        return self._retriever
 
     async def _extract_search_query(self, prompt: str) -> str:
         """LLMを使ってプロンプトから検索クエリを抽出する"""
@@ -37,7 +49,7 @@ class RAGManager:
             # 検索クエリ抽出のためにLLMを呼び出す
             response = await self.provider.call(extraction_prompt, "")
             # LLMの応答からキーワードをクリーンアップして抽出
-            query = response.get('text', prompt).strip().replace("「", "").replace("」", "").replace("\"", "")
+            query = response.get('text', prompt).strip().translate(_QUERY_QUOTES_TABLE)
             logger.info(f"抽出されたWikipedia検索クエリ: '{query}'")
             return query
         except Exception as e:
@@ -63,10 +75,7 @@ class RAGManager:
     async def _retrieve_from_knowledge_base(self, query: str) -> str:
         """ファイル/URLベースのナレッジベースから情報を検索する"""
         try:
-            kb = KnowledgeBase()
-            kb.load_documents(self.knowledge_base_path)
-            retriever = Retriever(kb)
-            return "\n\n".join(retriever.search(query))
+            return "\n\n".join(self._get_retriever().search(query))
         except Exception as e:
             logger.error(f"ナレッジベースからの検索中にエラー: {e}", exc_info=True)
             return ""
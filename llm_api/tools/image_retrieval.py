@@ -6,7 +6,7 @@ import logging
 import os
 from typing import NamedTuple, Optional
 
-from serpapi.Google Search_results import GoogleSearchResults
+from serpapi.google_search_results import GoogleSearchResults
 from ..config import settings
 
 
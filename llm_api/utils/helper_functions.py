@@ -1,8 +1,14 @@
 # /llm_api/utils/helper_functions.py
+import functools
 import json
 import sys
 import aiofiles
 
+try:
+    import orjson
+except ImportError:  # orjsonは任意依存。未インストール時は標準のjsonを使用する
+    orjson = None
+
 async def read_from_pipe_or_file(prompt_arg, file_arg):
     """パイプまたはファイルからプロンプトを非同期に読み込む"""
     if not sys.stdin.isatty():
@@ -19,8 +25,11 @@ async def read_from_pipe_or_file(prompt_arg, file_arg):
 
 def format_json_output(data: dict) -> str:
     """辞書データを整形されたJSON文字列に変換する"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
     return json.dumps(data, indent=2, ensure_ascii=False)
 
+@functools.lru_cache(maxsize=256)
 def get_model_family(model_name: str) -> str:
     """
     モデル名からモデルファミリーを判定する関数を追加。
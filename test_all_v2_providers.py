@@ -3,13 +3,17 @@
 # 役割: 存在しない関数の呼び出しを修正し、実際に利用可能な関数を使ってプロバイダーの動作確認と性能測定を行う。
 
 import asyncio
+import contextlib
+import copy
 import json
 import logging
 import os
 import sys
 import time
-from typing import Dict, Any, List
+from collections import defaultdict
+from typing import Dict, Any, Final, List, Mapping, NamedTuple, Optional, Tuple
 from pathlib import Path
+from types import MappingProxyType
 
 # パスの設定
 project_root = Path(__file__).parent
@@ -25,20 +29,92 @@ from cli.handler import CogniQuantumCLIV2Fixed # ヘルスチェック機能を
 from llm_api.providers import get_provider, list_providers, list_enhanced_providers, check_provider_health
 from llm_api.config import settings
 
+try:
+    import orjson
+except ImportError:  # orjsonは任意依存。未インストール時は標準のjsonでレポートを書き出す
+    orjson = None
 
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# 同一プロセス内でテストを繰り返し実行する際に、全プロバイダーの再初期化を避けるため健全性チェック結果を保持する期間（秒）
+_HEALTH_CACHE_TTL = 300.0
+_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+
+# モードごとのプロバイダー呼び出しのタイムアウト（秒）。応答が止まったプロバイダーでテスト全体が終わらなくなるのを防ぐ
+_MODE_TIMEOUTS = {
+    'efficient': 10.0,
+    'balanced': 30.0,
+    'decomposed': 60.0,
+    'adaptive': 60.0,
+    'paper_optimized': 90.0,
+}
+_DEFAULT_MODE_TIMEOUT = 90.0
+
+# モードごとのテストプロンプト。呼び出しのたびに辞書を作り直さないよう、読み取り専用の定数として一度だけ用意する
+_TEST_PROMPTS: Final[Mapping[str, str]] = MappingProxyType({
+    'efficient': "1+1は?",
+    'balanced': "機械学習とは何かを簡潔に説明して。",
+    'decomposed': "持続可能な都市交通システムの設計案を考えて。",
+    'adaptive': "太陽光発電のメリットとデメリットは？",
+    'paper_optimized': "AIの倫理について論じて。",
+    'parallel': "量子コンピュータの将来性について。",
+    'quantum_inspired': "意識の謎について、複数の視点から考察して。",
+    'edge': "色を混ぜるとどうなる？"
+})
+
+@contextlib.asynccontextmanager
+async def measure(result: Dict[str, Any]):
+    """
+    ブロック内の経過時間とCPU時間を計測し、例外で抜けた場合も含めてresultに書き込む。
+    単調・高分解能なperf_counter_nsで整数のまま計測し、秒への変換は結果に格納する時だけ行う。
+    CPU時間との差分はI/O待ち（await）の時間の目安になるが、process_time_nsはプロセス全体の値のため、
+    並行実行中は他のテストのCPU時間も含む上限値になる。
+    """
+    start_cpu_ns = time.process_time_ns()
+    start_ns = time.perf_counter_ns()
+    try:
+        yield result
+    finally:
+        wall_time_ns = time.perf_counter_ns() - start_ns
+        cpu_time_ns = time.process_time_ns() - start_cpu_ns
+        result['execution_time'] = wall_time_ns / 1e9
+        result['wall_time_ns'] = wall_time_ns
+        result['cpu_time_ns'] = cpu_time_ns
+        result['await_fraction'] = max(0.0, 1 - cpu_time_ns / wall_time_ns) if wall_time_ns else 0.0
+
+class V2Stats(NamedTuple):
+    """V2機能テスト結果を一度だけ走査して集計した値。レポートはこれを参照する。"""
+    successes_per_provider: Dict[str, int]
+    tested_per_provider: Dict[str, int]
+    mode_success: Dict[str, List[int]]  # モード -> [成功数, 実行数]
+    timed_out: List[Tuple[str, str]]  # タイムアウトした(プロバイダー, モード)
+
 class V2ProviderTester:
     """V2プロバイダーの総合テスター"""
+    # 同時に実行するモードテスト（API呼び出し）の上限。レート制限に一斉に掛からないよう抑える
+    MODE_TEST_CONCURRENCY = 8
     
-    def __init__(self, providers_to_test=None, modes_to_test=None):
+    def __init__(self, providers_to_test=None, modes_to_test=None, json_only: bool = False):
         self.test_results: Dict[str, Any] = {}
+        self.json_only = json_only
         # 利用可能なプロバイダーを動的に設定
         self.available_providers = self._get_available_providers()
         self.providers_to_test = providers_to_test or self.available_providers
         self.v2_modes = modes_to_test or ['efficient', 'balanced', 'decomposed', 'adaptive', 'paper_optimized', 'parallel', 'quantum_inspired', 'edge']
         self.cli_handler = CogniQuantumCLIV2Fixed()
+        self._agg = V2Stats({}, {}, {}, [])
+        self._v2_providers: Optional[Tuple[str, ...]] = None
+        self._available_v2: Tuple[str, ...] = ()
+        # マトリクスの全セルで同じV2拡張プロバイダー（とその接続）を使い回すためのキャッシュ
+        self._provider_cache: Dict[str, Any] = {}
+
+    @property
+    def v2_providers(self) -> Tuple[str, ...]:
+        """V2拡張に対応するプロバイダー名。collect_system_infoで一度だけ確定し、以降は同じタプルを共有する。"""
+        if self._v2_providers is None:
+            self._v2_providers = tuple(list_enhanced_providers()['v2'])
+        return self._v2_providers
 
     def _get_available_providers(self) -> List[str]:
         """APIキーが設定されているなど、利用可能なプロバイダーのリストを取得する"""
@@ -59,20 +135,46 @@ class V2ProviderTester:
 
     async def run_comprehensive_tests(self):
         """総合テストの実行"""
-        print("🚀 CogniQuantum V2 プロバイダー総合テスト開始")
-        print(f"🔬 テスト対象プロバイダー: {self.providers_to_test}")
-        print(f"🕹️ テスト対象モード: {self.v2_modes}")
-        print("=" * 60)
+        logger.info("🚀 CogniQuantum V2 プロバイダー総合テスト開始")
+        logger.info("🔬 テスト対象プロバイダー: %s", self.providers_to_test)
+        logger.info("🕹️ テスト対象モード: %s", self.v2_modes)
         
-        await self.collect_system_info()
-        await self.check_all_providers_health()
-        await self.test_v2_features()
-        await self.run_performance_tests()
-        self.generate_report()
+        try:
+            # システム情報の収集と健全性チェックは互いに依存しないため並行に実行する
+            await asyncio.gather(self.collect_system_info(), self.check_all_providers_health())
+            self._available_v2 = tuple(
+                name for name in self.providers_to_test
+                if name in self.v2_providers and self.is_provider_available(name)
+            )
+            await self.test_v2_features()
+            self._agg = self._aggregate_v2_stats()
+            await self.run_performance_tests()
+            self.generate_report()
+        finally:
+            await self.shutdown()
+
+    def _get_cached_provider(self, provider_name: str):
+        """V2拡張プロバイダーをプロバイダー名ごとに一度だけ生成し、以降は同じインスタンスを返す。"""
+        provider = self._provider_cache.get(provider_name)
+        if provider is None:
+            provider = self._provider_cache.setdefault(provider_name, get_provider(provider_name, enhanced=True))
+        return provider
+
+    async def shutdown(self):
+        """キャッシュしたプロバイダーが保持する接続（HTTPクライアントなど）を閉じる。"""
+        for provider_name, provider in self._provider_cache.items():
+            close = getattr(getattr(provider, 'standard_provider', provider), 'close', None)
+            if close is None:
+                continue
+            try:
+                await close()
+            except Exception as e:
+                logger.warning("%sプロバイダーの接続を閉じる際にエラーが発生しました: %s", provider_name, e)
+        self._provider_cache.clear()
 
     async def collect_system_info(self):
         """システム情報の収集"""
-        print("\n📊 システム情報を収集中...")
+        logger.info("📊 システム情報を収集中...")
         self.test_results['system_info'] = {
             'timestamp': time.time(),
             'python_version': sys.version,
@@ -80,104 +182,159 @@ class V2ProviderTester:
             'standard_providers': list_providers(),
             'enhanced_providers': list_enhanced_providers(),
         }
-        print("✅ システム情報収集完了")
+        self._v2_providers = tuple(self.test_results['system_info']['enhanced_providers']['v2'])
+        logger.info("✅ システム情報収集完了")
 
     async def check_all_providers_health(self):
-        """全プロバイダーの健全性チェック"""
-        print("\n🏥 プロバイダー健全性チェック中...")
-        health_results: Dict[str, Any] = {'providers': {}}
-        available_count = 0
-        enhanced_v2_count = 0
-
-        for provider_name in list_providers():
-            health_results['providers'][provider_name] = {}
-            # 標準プロバイダーのチェック
-            std_health = check_provider_health(provider_name, enhanced=False)
-            health_results['providers'][provider_name]['standard'] = std_health
-            if std_health['available']:
-                available_count += 1
-                
-            # V2拡張プロバイダーのチェック
-            if provider_name in list_enhanced_providers()['v2']:
-                enh_health = check_provider_health(provider_name, enhanced=True)
-                health_results['providers'][provider_name]['enhanced_v2'] = enh_health
-                if enh_health['available']:
-                    enhanced_v2_count += 1
+        """全プロバイダーの健全性チェック（TTL内の再実行ではキャッシュ済みの結果を使う）"""
+        global _health_cache
+        logger.info("🏥 プロバイダー健全性チェック中...")
+        now = time.time()
+        if _health_cache is not None and now - _health_cache[0] < _HEALTH_CACHE_TTL:
+            checked_at, cached_results = _health_cache
+            health_results = copy.deepcopy(cached_results)
+            health_results.update(cache_hit=True, timestamp=checked_at)
+            self.test_results['health_check'] = health_results
+            logger.info("✅ 健全性チェック完了 (キャッシュ済みの結果を使用)")
+            return
+
+        health_results = await self._probe_providers_health()
+        _health_cache = (now, copy.deepcopy(health_results))
+        health_results.update(cache_hit=False, timestamp=now)
+        self.test_results['health_check'] = health_results
+        logger.info("✅ 健全性チェック完了")
+
+    async def _probe_providers_health(self) -> Dict[str, Any]:
+        """
+        各プロバイダーを実際に初期化して健全性を確認する。
+        初期化は同期処理のため、プロバイダーごとのチェックをスレッドで並行に実行してイベントループを塞がないようにする。
+        """
+        # プロバイダーレジストリの初期化はイベントループのスレッドで済ませておき、チェック用スレッド間で競合させない
+        provider_names = list_providers()
+        checks = [(provider_name, 'standard', False) for provider_name in provider_names]
+        checks += [(provider_name, 'enhanced_v2', True) for provider_name in provider_names if provider_name in self.v2_providers]
+        results = await asyncio.gather(*(
+            asyncio.to_thread(check_provider_health, provider_name, enhanced=enhanced)
+            for provider_name, _, enhanced in checks
+        ))
+
+        health_results: Dict[str, Any] = {'providers': {provider_name: {} for provider_name in provider_names}}
+        for (provider_name, kind, _), health in zip(checks, results):
+            health_results['providers'][provider_name][kind] = health
         
         health_results['summary'] = {
-            'total_checked': len(list_providers()),
-            'available': available_count,
-            'enhanced_v2': enhanced_v2_count
+            'total_checked': len(provider_names),
+            'available': sum(1 for (_, kind, _), health in zip(checks, results) if kind == 'standard' and health['available']),
+            'enhanced_v2': sum(1 for (_, kind, _), health in zip(checks, results) if kind == 'enhanced_v2' and health['available']),
         }
-        self.test_results['health_check'] = health_results
-        print("✅ 健全性チェック完了")
+        return health_results
+
+    def is_provider_available(self, provider_name: str) -> bool:
+        """健全性チェックの結果から、V2拡張プロバイダーが利用可能かを返す（辞書の参照のみ）。"""
+        provider_health = self.test_results.get('health_check', {}).get('providers', {}).get(provider_name, {})
+        return bool(provider_health.get('enhanced_v2', {}).get('available'))
 
     async def test_v2_features(self):
         """V2機能の詳細テスト"""
-        print("\n🧪 V2機能テスト中...")
+        logger.info("🧪 V2機能テスト中...")
         self.test_results['v2_features'] = {}
-        
-        for provider_name in self.providers_to_test:
-            if provider_name not in list_enhanced_providers()['v2']:
-                continue
+        # 利用可否は健全性チェックの時点で確定しているため、利用可能なプロバイダーだけを対象にする
+        providers = self._available_v2
+        skipped = [name for name in self.providers_to_test if name in self.v2_providers and name not in providers]
+        if skipped:
+            logger.info("   (健全性チェックで利用不可だったためスキップ: %s)", skipped)
+
+        # プロバイダー×モードの各テストは互いに独立したI/O待ちなので、同時実行数を抑えつつ並行に実行する
+        semaphore = asyncio.Semaphore(self.MODE_TEST_CONCURRENCY)
+
+        async def run_bounded(provider_name: str, mode: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.test_provider_mode(provider_name, mode)
 
-            print(f"\n🔍 {provider_name} V2機能テスト開始...")
+        cells = [(provider_name, mode) for provider_name in providers for mode in self.v2_modes]
+        results = await asyncio.gather(*(run_bounded(*cell) for cell in cells), return_exceptions=True)
+        results_by_cell = dict(zip(cells, results))
+
+        for provider_name in providers:
+            logger.info("🔍 %s V2機能テスト結果:", provider_name)
             provider_results: Dict[str, Any] = {'modes_tested': {}, 'errors': []}
             
             for mode in self.v2_modes:
-                try:
-                    result = await self.test_provider_mode(provider_name, mode)
-                    provider_results['modes_tested'][mode] = result
-                    status = "✅ 成功" if result['success'] else f"❌ 失敗: {result.get('error', '不明')}"
-                    print(f"   - {mode}モード: {status}")
-                except Exception as e:
-                    provider_results['errors'].append(f"{mode}モードテスト中にエラー: {e}")
-                    print(f"   - {mode}モード: ⚠️  エラー ({e})")
+                result = results_by_cell[(provider_name, mode)]
+                if isinstance(result, Exception):
+                    provider_results['errors'].append(f"{mode}モードテスト中にエラー: {result}")
+                    logger.info("   - %sモード: ⚠️  エラー (%s)", mode, result)
+                    continue
+                provider_results['modes_tested'][mode] = result
+                if result['success']:
+                    logger.info("   - %sモード: ✅ 成功", mode)
+                else:
+                    logger.info("   - %sモード: ❌ 失敗: %s", mode, result.get('error', '不明'))
             
             self.test_results['v2_features'][provider_name] = provider_results
 
     async def test_provider_mode(self, provider_name: str, mode: str) -> Dict[str, Any]:
         """特定のプロバイダーとモードをテスト"""
-        prompts = {
-            'efficient': "1+1は?",
-            'balanced': "機械学習とは何かを簡潔に説明して。",
-            'decomposed': "持続可能な都市交通システムの設計案を考えて。",
-            'adaptive': "太陽光発電のメリットとデメリットは？",
-            'paper_optimized': "AIの倫理について論じて。",
-            'parallel': "量子コンピュータの将来性について。",
-            'quantum_inspired': "意識の謎について、複数の視点から考察して。",
-            'edge': "色を混ぜるとどうなる？"
-        }
-        prompt = prompts.get(mode, "一般的なテストプロンプトです。")
+        prompt = _TEST_PROMPTS.get(mode, "一般的なテストプロンプトです。")
+        timeout_s = _MODE_TIMEOUTS.get(mode, _DEFAULT_MODE_TIMEOUT)
+        timing: Dict[str, Any] = {}
         
         try:
-            # V2拡張プロバイダーを直接取得
-            provider = get_provider(provider_name, enhanced=True)
-            start_time = time.time()
-            response = await provider.call(prompt, mode=mode, force_v2=True)
-            execution_time = time.time() - start_time
+            # V2拡張プロバイダーを取得（同じプロバイダーの他のモードと共有する）
+            provider = self._get_cached_provider(provider_name)
+            async with measure(timing):
+                response = await asyncio.wait_for(provider.call(prompt, mode=mode, force_v2=True), timeout=timeout_s)
             
             return {
                 'success': not response.get('error'),
                 'error': response.get('error'),
                 'response_length': len(response.get('text', '')),
-                'execution_time': execution_time,
+                **timing,
                 'version': response.get('version'),
                 'v2_improvements': response.get('paper_based_improvements', {}),
             }
+        except asyncio.TimeoutError:
+            # プロバイダーの故障ではなく時間切れとして区別し、レポートでタイムアウト値の見直しを促せるようにする
+            return {'success': False, 'error': 'timeout', 'timeout_s': timeout_s, **timing}
         except Exception as e:
             return {'success': False, 'error': str(e)}
 
     async def run_performance_tests(self):
         """パフォーマンステスト"""
-        print("\n⚡ パフォーマンステスト中...")
+        logger.info("⚡ パフォーマンステスト中...")
         self.test_results['performance'] = {}
         # この機能は簡略化のため、今回は実行しない
-        print("   (パフォーマンステストは今回はスキップします)")
+        logger.info("   (パフォーマンステストは今回はスキップします)")
 
 
+    def _aggregate_v2_stats(self) -> V2Stats:
+        """プロバイダー別・モード別の成功数を、V2機能テスト結果の1回の走査で集計する。"""
+        successes_per_provider: Dict[str, int] = {}
+        tested_per_provider: Dict[str, int] = {}
+        mode_success = defaultdict(lambda: [0, 0])
+        timed_out: List[Tuple[str, str]] = []
+        for provider, results in self.test_results.get('v2_features', {}).items():
+            successes = 0
+            for mode, result in results['modes_tested'].items():
+                counts = mode_success[mode]
+                counts[1] += 1
+                if result.get('success'):
+                    counts[0] += 1
+                    successes += 1
+                elif result.get('error') == 'timeout':
+                    timed_out.append((provider, mode))
+            successes_per_provider[provider] = successes
+            tested_per_provider[provider] = len(results['modes_tested'])
+        return V2Stats(successes_per_provider, tested_per_provider, dict(mode_success), timed_out)
+
     def generate_report(self):
-        """最終レポートの生成"""
+        """最終レポートの生成（json_only時はコンソールへの表示を省き、JSONレポートだけを保存する）"""
+        if not self.json_only:
+            self._print_report()
+        self.save_json_report()
+
+    def _print_report(self):
+        """集計結果をコンソールに表示する"""
         print("\n" + "=" * 60)
         print("📊 総合テスト結果レポート")
         print("=" * 60)
@@ -185,26 +342,43 @@ class V2ProviderTester:
         # サマリー表示
         health_summary = self.test_results.get('health_check', {}).get('summary', {})
         print(f"\n🏥 健全性: {health_summary.get('available', 0)}/{health_summary.get('total_checked', 0)} のプロバイダーが利用可能")
-        print(f"   - V2拡張: {health_summary.get('enhanced_v2', 0)}/{len(list_enhanced_providers()['v2'])} が利用可能")
+        print(f"   - V2拡張: {health_summary.get('enhanced_v2', 0)}/{len(self.v2_providers)} が利用可能")
         
-        v2_features = self.test_results.get('v2_features', {})
-        if v2_features:
+        stats = self._agg
+        if stats.tested_per_provider:
             print("\n🧪 V2機能テスト結果:")
-            for provider, results in v2_features.items():
-                success_count = sum(1 for res in results['modes_tested'].values() if res['success'])
-                print(f"   - {provider}: {success_count}/{len(results['modes_tested'])} モード成功")
-
-        self.save_json_report()
+            for provider, tested in stats.tested_per_provider.items():
+                print(f"   - {provider}: {stats.successes_per_provider[provider]}/{tested} モード成功")
+            print("\n🕹️ モード別成功率:")
+            for mode, (successes, total) in stats.mode_success.items():
+                print(f"   - {mode}: {successes}/{total}")
+            if stats.timed_out:
+                print(f"\n⏱️ タイムアウト: {len(stats.timed_out)}件 (プロバイダーの故障ではなく時間切れです。必要に応じてタイムアウト値を引き上げてください)")
+                for provider, mode in stats.timed_out:
+                    print(f"   - {provider}/{mode}: {_MODE_TIMEOUTS.get(mode, _DEFAULT_MODE_TIMEOUT):.0f}秒")
 
-    def save_json_report(self):
-        """JSONレポートの保存"""
+    def save_json_report(self, fsync: bool = False):
+        """JSONレポートの保存。レポート全体をUTF-8のバイト列にしてから1回のwriteで書き出す（fsync=Trueでディスクへの反映まで待つ）"""
         try:
             report_file = project_root / "v2_test_report.json"
-            with open(report_file, 'w', encoding='utf-8') as f:
-                json.dump(self.test_results, f, indent=2, ensure_ascii=False)
-            print(f"\n💾 詳細レポートを '{report_file}' に保存しました。")
+            if orjson is not None:
+                # C実装のorjsonでUTF-8のバイト列に直接シリアライズする
+                payload = orjson.dumps(
+                    self.test_results,
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                    default=str,
+                )
+            else:
+                payload = json.dumps(self.test_results, indent=2, ensure_ascii=False, default=str).encode('utf-8')
+            with open(report_file, 'wb') as f:
+                f.write(payload)
+                if fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            if not self.json_only:
+                print(f"\n💾 詳細レポートを '{report_file}' に保存しました。")
         except Exception as e:
-            print(f"\n❌ レポートの保存に失敗しました: {e}")
+            logger.error("❌ レポートの保存に失敗しました: %s", e)
 
 async def main():
     """メイン実行関数"""
@@ -212,12 +386,19 @@ async def main():
     parser = argparse.ArgumentParser(description="CogniQuantum V2プロバイダー総合テスト")
     parser.add_argument("--providers", nargs='+', help="テストするプロバイダーを指定 (例: openai ollama)")
     parser.add_argument("--modes", nargs='+', help="テストするモードを指定 (例: efficient balanced)")
+    parser.add_argument("--json-only", action="store_true", help="コンソール出力を抑え、JSONレポートだけを保存する")
     args = parser.parse_args()
+    if args.json_only:
+        # 進捗ログはINFOで出しているため、WARNING以上に絞ればメッセージの整形自体が行われない
+        logging.getLogger().setLevel(logging.WARNING)
     
-    tester = V2ProviderTester(providers_to_test=args.providers, modes_to_test=args.modes)
+    tester = V2ProviderTester(providers_to_test=args.providers, modes_to_test=args.modes, json_only=args.json_only)
     await tester.run_comprehensive_tests()
 
 if __name__ == "__main__":
     if sys.platform == 'win32':
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    else:
+        from llm_api._eventloop import install as install_event_loop
+        install_event_loop()
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,23 @@
+# /tests/test_analyzer.py
+
+import pytest
+
+from llm_api.cogniquantum.analyzer import AdaptiveComplexityAnalyzer
+
+
+@pytest.fixture
+def analyzer():
+    return AdaptiveComplexityAnalyzer()
+
+
+@pytest.mark.parametrize("prompt, lang, expected", [
+    # 14 words -> length 2.8; 'if' x2 + 'when' -> 9; 'must' + 'should not' -> 8; no domain keywords
+    ("If it rains we must stay, when dry we should not wait if late.", 'en', 2.8 * 0.2 + 17 * 0.4),
+    # 'なら' is counted inside 'ならない' as well as on its own (per-keyword str.count semantics)
+    ("雨ならば外出してはならない", 'ja', 0.2 * 0.2 + (2 * 3 + 1 * 4) * 0.4),
+    # overlapping domain keywords: 'calculate' (math) and 'plan' (planning)
+    ("calculate a plan", 'en', 0.6 * 0.2 + 30 * 0.4),
+])
+def test_keyword_scores_are_pinned(analyzer, prompt, lang, expected):
+    """Keyword scoring keeps the per-keyword substring count semantics of the original implementation."""
+    assert analyzer._keyword_based_analysis(prompt, lang) == pytest.approx(expected)
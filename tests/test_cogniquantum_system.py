@@ -0,0 +1,170 @@
+# /tests/test_cogniquantum_system.py
+
+import asyncio
+from collections import OrderedDict
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+import llm_api.cogniquantum.system as system_module
+from llm_api.cogniquantum.enums import ComplexityRegime
+from llm_api.cogniquantum.system import CogniQuantumSystemV2
+
+
+def _bare_system(**base_model_kwargs):
+    """Build a CogniQuantumSystemV2 without its heavy collaborators (analyzer, engines, RAG)."""
+    system = CogniQuantumSystemV2.__new__(CogniQuantumSystemV2)
+    system.base_model_kwargs = base_model_kwargs
+    system._result_cache = OrderedDict()
+    return system
+
+
+def _confident_result():
+    return {
+        'success': True,
+        'final_solution': '2',
+        'thought_process': {'self_evaluation': {'outcome': 'sufficient', 'reason': 'ok'}},
+        'version': 'v2',
+    }
+
+
+def _solve_twice(system):
+    async def run():
+        first = await system.solve_problem("1+1は?")
+        second = await system.solve_problem("1+1は?")
+        return first, second
+    return asyncio.run(run())
+
+
+def test_sampled_solution_is_not_reused():
+    """A solution generated with temperature > 0 must not be served again from the solution cache."""
+    system = _bare_system(temperature=0.7)
+    with patch.object(system_module.settings, 'SOLUTION_CACHE_ENABLED', True), \
+            patch.object(system, '_solve_problem_uncached', AsyncMock(side_effect=lambda *a: _confident_result())) as solve:
+        first, second = _solve_twice(system)
+    assert solve.await_count == 2
+    assert 'cached' not in second
+    assert not system._result_cache
+
+
+def test_confident_deterministic_solution_is_reused():
+    """Only a deterministic (temperature <= 0), high-confidence solution is reused."""
+    system = _bare_system(temperature=0.0)
+    with patch.object(system_module.settings, 'SOLUTION_CACHE_ENABLED', True), \
+            patch.object(system, '_solve_problem_uncached', AsyncMock(side_effect=lambda *a: _confident_result())) as solve:
+        first, second = _solve_twice(system)
+    assert solve.await_count == 1
+    assert second['cached'] is True
+    assert second['final_solution'] == first['final_solution']
+
+
+def test_solution_cache_is_off_by_default():
+    """Without opting in, every call runs the pipeline even for deterministic, confident results."""
+    system = _bare_system(temperature=0.0)
+    with patch.object(system_module.settings, 'SOLUTION_CACHE_ENABLED', False), \
+            patch.object(system, '_solve_problem_uncached', AsyncMock(side_effect=lambda *a: _confident_result())) as solve:
+        _solve_twice(system)
+    assert solve.await_count == 2
+
+
+def test_confident_low_result_cancels_medium_and_high():
+    """A fast LOW answer the evaluator accepts ends the parallel run and cancels the slower pipelines."""
+    from llm_api.cogniquantum.engine import EnhancedReasoningEngine
+
+    cancelled = []
+
+    async def hang(label):
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.append(label)
+            raise
+
+    async def execute_reasoning(prompt, system_prompt, regime=None):
+        if regime == ComplexityRegime.LOW:
+            return {'solution': '2', 'error': None, 'complexity_regime': ComplexityRegime.LOW.value}
+        await hang('high')
+
+    async def batch_call(requests):
+        await hang('medium')
+
+    engine = EnhancedReasoningEngine.__new__(EnhancedReasoningEngine)
+    engine.base_model_kwargs = {}
+    engine.provider = AsyncMock()
+    engine.provider.batch_call = batch_call
+    engine.execute_reasoning = execute_reasoning
+
+    system = _bare_system()
+    system.reasoning_engine = engine
+    system._eval_kwargs = {}
+    system.evaluation_provider = AsyncMock()
+    system.evaluation_provider.call = AsyncMock(return_value={'text': '{"is_sufficient": true, "reason": "correct"}'})
+
+    async def run():
+        return await asyncio.wait_for(system._execute_parallel_pipelines("1+1は?", "", False, None, False), timeout=5)
+
+    result = asyncio.run(run())
+    assert result['success'] is True
+    assert result['final_solution'] == '2'
+    assert result['thought_process']['early_exit'] is True
+    assert sorted(cancelled) == ['high', 'medium']
+
+
+def _evaluating_system(**call_kwargs):
+    """A bare system whose evaluation provider is an AsyncMock configured with call_kwargs."""
+    system = _bare_system()
+    system._eval_kwargs = {}
+    system.evaluation_provider = AsyncMock()
+    system.evaluation_provider.call = AsyncMock(**call_kwargs)
+    return system
+
+
+def test_self_evaluation_reports_insufficient_verdict():
+    """The evaluator's verdict is returned with the next regime to escalate to."""
+    system = _evaluating_system(return_value={'text': '{"is_sufficient": false, "reason": "incomplete"}'})
+    evaluation = asyncio.run(system._self_evaluate_solution("2", "1+1は?", ComplexityRegime.LOW))
+    assert evaluation == {
+        'is_sufficient': False, 'reason': 'incomplete', 'next_regime': ComplexityRegime.MEDIUM, 'judged': True,
+    }
+    system.evaluation_provider.call.assert_awaited_once()
+
+
+def test_self_evaluation_rejects_empty_solution_without_llm_call():
+    """An empty answer is judged insufficient by the heuristic alone."""
+    system = _evaluating_system()
+    evaluation = asyncio.run(system._self_evaluate_solution("  ", "1+1は?", ComplexityRegime.MEDIUM))
+    assert evaluation['is_sufficient'] is False
+    assert evaluation['next_regime'] == ComplexityRegime.HIGH
+    system.evaluation_provider.call.assert_not_awaited()
+
+
+@pytest.mark.parametrize("call_kwargs", [
+    {'return_value': {'text': 'not json at all'}},
+    {'side_effect': RuntimeError("boom")},
+])
+def test_self_evaluation_failure_defaults_to_sufficient_but_unjudged(call_kwargs):
+    """Parse failures and errors keep the answer (sufficient) but are not counted as a real verdict."""
+    system = _evaluating_system(**call_kwargs)
+    evaluation = asyncio.run(system._self_evaluate_solution("2", "1+1は?", ComplexityRegime.LOW))
+    assert evaluation['is_sufficient'] is True
+    assert evaluation['judged'] is False
+
+
+def test_limited_refinement_returns_refined_text():
+    """A successful refinement replaces the solution (stripped)."""
+    system = _evaluating_system(return_value={'text': '  refined answer \n', 'error': None})
+    refined = asyncio.run(system._perform_limited_refinement("draft", "prompt", "system"))
+    assert refined == "refined answer"
+    prompt_arg, system_arg = system.evaluation_provider.call.await_args.args
+    assert "draft" in prompt_arg and system_arg == "system"
+
+
+@pytest.mark.parametrize("call_kwargs", [
+    {'return_value': {'text': '', 'error': None}},
+    {'return_value': {'text': 'partial', 'error': 'rate limited'}},
+    {'side_effect': RuntimeError("boom")},
+])
+def test_limited_refinement_keeps_original_on_failure(call_kwargs):
+    """Empty responses, provider errors and exceptions fall back to the original solution."""
+    system = _evaluating_system(**call_kwargs)
+    assert asyncio.run(system._perform_limited_refinement("draft", "prompt", "system")) == "draft"
@@ -0,0 +1,88 @@
+# /tests/test_enhanced_provider.py
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+import llm_api.cogniquantum.system  # noqa: F401  (make the patch target importable)
+from llm_api.providers.base import LLMProvider
+from llm_api.providers.enhanced_claude_v2 import EnhancedClaudeProviderV2
+
+
+class StubProvider(LLMProvider):
+    """A standard provider that never reaches a backend."""
+
+    def get_capabilities(self):
+        return {}
+
+    async def standard_call(self, prompt, system_prompt="", **kwargs):
+        return {'text': 'stub', 'error': None}
+
+    def should_use_enhancement(self, prompt, **kwargs):
+        return False
+
+
+@pytest.fixture
+def system_class():
+    """Replace CogniQuantumSystemV2 with a factory that returns a distinct mock per construction."""
+    with patch("llm_api.cogniquantum.system.CogniQuantumSystemV2", side_effect=lambda *a, **k: MagicMock()) as mocked:
+        yield mocked
+
+
+@pytest.fixture
+def provider():
+    return EnhancedClaudeProviderV2(StubProvider())
+
+
+def test_same_parameters_reuse_one_system(provider, system_class):
+    """Calls with equal generation parameters share a single CogniQuantumSystemV2."""
+    first = provider._get_cq_system({'temperature': 0.0, 'max_tokens': 100})
+    second = provider._get_cq_system({'max_tokens': 100, 'temperature': 0.0})
+    other = provider._get_cq_system({'temperature': 0.7, 'max_tokens': 100})
+
+    assert first is second
+    assert other is not first
+    assert system_class.call_count == 2
+
+
+def test_least_recently_used_system_is_evicted(provider, system_class):
+    """Beyond CQ_SYSTEM_CACHE_SIZE entries, the least recently used system is dropped."""
+    size = provider.CQ_SYSTEM_CACHE_SIZE
+    systems = [provider._get_cq_system({'max_tokens': n}) for n in range(size)]
+    # Touch the oldest so the second-oldest becomes the eviction candidate
+    assert provider._get_cq_system({'max_tokens': 0}) is systems[0]
+
+    provider._get_cq_system({'max_tokens': size})
+
+    assert len(provider._cq_cache) == size
+    assert provider._get_cq_system({'max_tokens': 0}) is systems[0]
+    assert provider._get_cq_system({'max_tokens': 1}) is not systems[1]
+    assert system_class.call_count == size + 2
+
+
+def test_unhashable_parameters_get_a_fresh_system(provider, system_class):
+    """Parameters that cannot form a cache key are served by a throwaway instance."""
+    first = provider._get_cq_system({'stop': ['\n']})
+    second = provider._get_cq_system({'stop': ['\n']})
+
+    assert first is not second
+    assert not provider._cq_cache
+
+
+def test_enhanced_call_reuses_cq_system(provider):
+    """enhanced_call succeeds and shares one CogniQuantumSystemV2 across calls with the same parameters."""
+    def make_system(*args, **kwargs):
+        system = MagicMock()
+        system.solve_problem = AsyncMock(return_value={'success': True, 'final_solution': 'ok', 'v2_improvements': {}})
+        return system
+
+    with patch("llm_api.cogniquantum.system.CogniQuantumSystemV2", side_effect=make_system) as system_class:
+        first = asyncio.run(provider.enhanced_call("1+1は?", mode="efficient"))
+        second = asyncio.run(provider.enhanced_call("1+1は?", mode="efficient"))
+
+    assert first['error'] is None and second['error'] is None
+    assert system_class.call_count == 1
+    assert len(provider._cq_cache) == 1
+    cached_system = next(iter(provider._cq_cache.values()))
+    assert cached_system.solve_problem.await_count == 2
@@ -0,0 +1,88 @@
+# /tests/test_json_scanner.py
+
+import asyncio
+
+import pytest
+
+from llm_api.cogniquantum.engine import EnhancedReasoningEngine, _JsonObjectScanner, _find_json_object
+from llm_api.providers.base import ProviderCapability
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('noise {"a": 1} trailing', {'a': 1}),
+    ('{"text": "a } inside { a string"}', {'text': 'a } inside { a string'}),
+    ('{"quote": "she said \\"}\\" loudly", "n": 2}', {'quote': 'she said "}" loudly', 'n': 2}),
+    ('{"outer": {"inner": [1, 2]}}', {'outer': {'inner': [1, 2]}}),
+    ('{not json} then {"ok": true}', {'ok': True}),
+    ('no object here', None),
+])
+def test_find_json_object(text, expected):
+    """Braces and escaped quotes inside strings do not affect the object boundaries."""
+    assert _find_json_object(text) == expected
+
+
+def test_object_split_across_chunks():
+    """The scanner keeps its state between feeds, including mid-string and mid-escape splits."""
+    scanner = _JsonObjectScanner()
+    chunks = ['prefix {"ke', 'y": "va\\', '"lue}', '", "n": {"m"', ': 1}', '} suffix']
+    results = [scanner.feed(chunk) for chunk in chunks]
+    assert results[:-1] == [None] * (len(chunks) - 1)
+    assert results[-1] == {'key': 'va"lue}', 'n': {'m': 1}}
+
+
+def test_unclosed_object_returns_none():
+    """An object that never closes yields nothing, however many chunks arrive."""
+    scanner = _JsonObjectScanner()
+    assert all(scanner.feed(chunk) is None for chunk in ['{"a": ', '[1, 2', ', 3]', ' "unterminated'])
+
+
+class StreamingProvider:
+    """A provider double that streams fixed chunks and records how far the stream was consumed."""
+    provider_name = "streaming"
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.consumed = 0
+        self.closed = False
+        self.calls = 0
+
+    def get_capabilities(self):
+        return {ProviderCapability.STREAMING: True}
+
+    async def stream_call(self, prompt, system_prompt="", **kwargs):
+        try:
+            for chunk in self.chunks:
+                self.consumed += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+    async def call(self, prompt, system_prompt="", **kwargs):
+        self.calls += 1
+        return {'text': 'fallback', 'error': None}
+
+
+def _engine(provider):
+    engine = EnhancedReasoningEngine.__new__(EnhancedReasoningEngine)
+    engine.provider = provider
+    engine.base_model_kwargs = {}
+    return engine
+
+
+def test_call_until_json_stops_when_object_closes():
+    """Streaming stops right after the chunk that completes the object."""
+    provider = StreamingProvider(['{"sub_problems": ', '["a", "b"]', '}', ' extra', ' tokens'])
+    response = asyncio.run(_engine(provider)._call_until_json("prefix", "body", ""))
+    assert response == {'text': '{"sub_problems": ["a", "b"]}', 'error': None}
+    assert provider.consumed == 3
+    assert provider.closed
+    assert provider.calls == 0
+
+
+def test_call_until_json_returns_full_text_when_object_never_closes():
+    """A stream that never closes the object is read to the end and returned as-is."""
+    provider = StreamingProvider(['{"sub_problems": ', '["a", ', '"b"'])
+    response = asyncio.run(_engine(provider)._call_until_json("prefix", "body", ""))
+    assert response == {'text': '{"sub_problems": ["a", "b"', 'error': None}
+    assert provider.consumed == 3
+    assert provider.calls == 0
@@ -0,0 +1,104 @@
+# /tests/test_ollama_balancing.py
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+import llm_api.providers.ollama as ollama_module
+from llm_api.providers.ollama import OllamaProvider
+
+
+class FakeResponse:
+    content = b'{"message": {"content": "ok"}, "prompt_eval_count": 1, "eval_count": 1}'
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeClient:
+    """Stands in for the per-endpoint httpx client used by _post_chat."""
+
+    def __init__(self, endpoint, gate, posted, error=None):
+        self.endpoint = endpoint
+        self.gate = gate
+        self.posted = posted
+        self.error = error
+
+    async def post(self, path, content=None, headers=None):
+        self.posted.append(self.endpoint)
+        await self.gate.wait()
+        if self.error is not None:
+            raise self.error
+        return FakeResponse()
+
+
+@pytest.fixture(autouse=True)
+def one_slot_per_server():
+    with patch.object(ollama_module.settings, 'OLLAMA_CONCURRENCY_LIMIT', 1):
+        yield
+
+
+def _run_with_fake_clients(provider, calls, error=None):
+    """Start `calls` requests, let them all reach the server, then release them; return endpoints hit and results."""
+    posted = []
+
+    async def run():
+        gate = asyncio.Event()
+        with patch.object(provider, '_get_client', lambda endpoint: FakeClient(endpoint, gate, posted, error)):
+            tasks = [asyncio.create_task(provider.standard_call(f"q{i}")) for i in range(calls)]
+            while len(posted) < calls:
+                await asyncio.sleep(0)
+            in_flight = list(provider._inflight)
+            gate.set()
+            results = await asyncio.gather(*tasks)
+        return in_flight, results
+
+    in_flight, results = asyncio.run(run())
+    return posted, in_flight, results
+
+
+def test_requests_spread_across_endpoints():
+    """Concurrent requests go to the endpoint with the fewest requests in flight."""
+    provider = OllamaProvider(["http://gpu0:11434", "http://gpu1:11434"])
+    posted, in_flight, results = _run_with_fake_clients(provider, calls=2)
+
+    assert sorted(posted) == ["http://gpu0:11434", "http://gpu1:11434"]
+    assert in_flight == [1, 1]
+    assert all(r['error'] is None for r in results)
+    assert provider._inflight == [0, 0]
+
+
+def test_inflight_count_is_released_after_failure():
+    """A failed request still decrements its endpoint's in-flight count."""
+    provider = OllamaProvider(["http://gpu0:11434", "http://gpu1:11434"])
+    posted, in_flight, results = _run_with_fake_clients(provider, calls=2, error=RuntimeError("model crashed"))
+
+    assert in_flight == [1, 1]
+    assert all(r['error'] for r in results)
+    assert provider._inflight == [0, 0]
+
+
+def test_endpoints_come_from_settings():
+    """OLLAMA_ENDPOINTS is split into the balanced server list."""
+    with patch.object(ollama_module.settings, 'OLLAMA_ENDPOINTS', "http://gpu0:11434/, http://gpu1:11434"):
+        provider = OllamaProvider()
+    assert provider._endpoints == ["http://gpu0:11434", "http://gpu1:11434"]
+    assert provider._inflight == [0, 0]
+
+
+def test_single_endpoint_serves_every_request():
+    """With one server, every request goes to it and the in-flight count returns to zero."""
+    provider = OllamaProvider(["http://localhost:11434"])
+    posted = []
+
+    async def run():
+        gate = asyncio.Event()
+        gate.set()
+        with patch.object(provider, '_get_client', lambda endpoint: FakeClient(endpoint, gate, posted)):
+            return await asyncio.gather(*(provider.standard_call(f"q{i}") for i in range(3)))
+
+    results = asyncio.run(run())
+    assert posted == ["http://localhost:11434"] * 3
+    assert [r['text'] for r in results] == ["ok"] * 3
+    assert provider._inflight == [0]
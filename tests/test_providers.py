@@ -62,4 +62,10 @@ def test_provider_availability_check():
     with patch.dict(os.environ, {"OPENAI_API_KEY": "fake_key"}):
         importlib.reload(openai)
         provider = openai.OpenAIProvider()
-        assert provider.is_available()
\ No newline at end of file
+        assert provider.is_available()
+
+@patch.dict(os.environ, {"OPENAI_API_KEY": "test_key"})
+def test_enhanced_openai_v2_handles_parallel_mode():
+    """The surviving class must route 'parallel' mode to the CogniQuantum pipeline."""
+    provider = get_provider("enhanced_openai_v2")
+    assert provider.should_use_enhancement("prompt", mode="parallel")
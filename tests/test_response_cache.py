@@ -0,0 +1,190 @@
+# /tests/test_response_cache.py
+
+import asyncio
+
+import pytest
+
+import llm_api.cogniquantum.cache as cache_module
+from llm_api.cogniquantum.cache import CachedProvider
+
+
+class CountingProvider:
+    """A minimal provider double that records how often each entry point reaches the backend."""
+    provider_name = "counting"
+
+    def __init__(self):
+        self.calls = 0
+        self.batch_requests = []
+        self.stream_calls = 0
+
+    async def call(self, prompt, system_prompt="", **kwargs):
+        self.calls += 1
+        return {'text': f"{prompt}#{self.calls}", 'error': None}
+
+    async def batch_call(self, requests):
+        self.batch_requests.append(list(requests))
+        return [{'text': f"{prompt}#batch", 'error': None} for prompt, _, _ in requests]
+
+    async def stream_call(self, prompt, system_prompt="", **kwargs):
+        self.stream_calls += 1
+        for chunk in ("Hello", ", ", "world"):
+            yield chunk
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache():
+    """Each test starts with an empty in-process tier, zeroed stats and no open SQLite connections."""
+    cache_module._memory_tier.clear()
+    cache_module._stats.update(hits=0, misses=0)
+    yield
+    cache_module.close_connections()
+    cache_module._memory_tier.clear()
+
+
+@pytest.fixture
+def cached(tmp_path):
+    backend = CountingProvider()
+    return backend, CachedProvider(backend, cache_path=str(tmp_path / "cache.sqlite3"))
+
+
+def test_deterministic_call_hits_after_first_miss(cached):
+    """The second identical temperature=0 call is served from the cache."""
+    backend, provider = cached
+
+    async def run():
+        first = await provider.call("q", temperature=0)
+        second = await provider.call("q", temperature=0)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert backend.calls == 1
+    assert second['text'] == first['text']
+    assert cache_module.get_cache_stats() == {'hits': 1, 'misses': 1}
+
+
+def test_different_prompt_misses(cached):
+    """A different prompt produces a different key and reaches the backend."""
+    backend, provider = cached
+
+    async def run():
+        await provider.call("q1", temperature=0)
+        await provider.call("q2", temperature=0)
+
+    asyncio.run(run())
+    assert backend.calls == 2
+    assert cache_module.get_cache_stats() == {'hits': 0, 'misses': 2}
+
+
+@pytest.mark.parametrize("kwargs", [{'temperature': 0.7}, {}])
+def test_sampled_calls_bypass_cache(cached, kwargs):
+    """temperature > 0, or no explicit temperature, never touches the cache."""
+    backend, provider = cached
+
+    async def run():
+        await provider.call("q", **kwargs)
+        await provider.call("q", **kwargs)
+
+    asyncio.run(run())
+    assert backend.calls == 2
+    assert cache_module.get_cache_stats() == {'hits': 0, 'misses': 0}
+
+
+def test_persistent_tier_survives_memory_eviction(cached):
+    """A response stored in SQLite is still served when the in-process tier has been cleared."""
+    backend, provider = cached
+
+    async def run():
+        await provider.call("q", temperature=0)
+        cache_module._memory_tier.clear()
+        return await provider.call("q", temperature=0)
+
+    second = asyncio.run(run())
+    assert backend.calls == 1
+    assert second['text'] == "q#1"
+
+
+def test_wrap_is_opt_in(tmp_path, monkeypatch):
+    """wrap() leaves the provider untouched unless RESPONSE_CACHE_ENABLED is set, and never double-wraps."""
+    backend = CountingProvider()
+    monkeypatch.setattr(cache_module.settings, 'RESPONSE_CACHE_PATH', str(tmp_path / "cache.sqlite3"))
+
+    monkeypatch.setattr(cache_module.settings, 'RESPONSE_CACHE_ENABLED', False)
+    assert CachedProvider.wrap(backend) is backend
+
+    monkeypatch.setattr(cache_module.settings, 'RESPONSE_CACHE_ENABLED', True)
+    wrapped = CachedProvider.wrap(backend, max_temperature=0.1)
+    assert isinstance(wrapped, CachedProvider)
+    assert wrapped.max_temperature == 0.1
+    assert CachedProvider.wrap(wrapped) is wrapped
+    assert wrapped.provider_name == "counting"
+
+
+def test_max_temperature_raises_the_bypass_threshold(tmp_path):
+    """Calls at or below max_temperature are cached; hotter calls bypass the cache."""
+    backend = CountingProvider()
+    provider = CachedProvider(backend, cache_path=str(tmp_path / "cache.sqlite3"), max_temperature=0.2)
+
+    async def run():
+        for _ in range(2):
+            await provider.call("cool", temperature=0.1)
+            await provider.call("hot", temperature=0.5)
+
+    asyncio.run(run())
+    assert backend.calls == 3
+    assert cache_module.get_cache_stats() == {'hits': 1, 'misses': 1}
+
+
+def test_entries_expire_after_ttl(tmp_path, monkeypatch):
+    """An entry older than ttl_seconds is treated as a miss in both tiers."""
+    backend = CountingProvider()
+    provider = CachedProvider(backend, cache_path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+
+    async def run():
+        await provider.call("q", temperature=0)
+        now[0] += 59
+        fresh = await provider.call("q", temperature=0)
+        now[0] += 2
+        cache_module._memory_tier.clear()
+        expired = await provider.call("q", temperature=0)
+        return fresh, expired
+
+    fresh, expired = asyncio.run(run())
+    assert fresh['text'] == "q#1"
+    assert expired['text'] == "q#2"
+    assert backend.calls == 2
+
+
+def test_batch_call_only_sends_misses(cached):
+    """Cached requests are answered locally; the rest go to the backend's batch_call in one batch."""
+    backend, provider = cached
+
+    async def run():
+        await provider.call("warm", temperature=0)
+        return await provider.batch_call([
+            ("warm", "", {'temperature': 0}),
+            ("cold", "", {'temperature': 0}),
+            ("sampled", "", {'temperature': 0.9}),
+        ])
+
+    results = asyncio.run(run())
+    assert [r['text'] for r in results] == ["warm#1", "cold#batch", "sampled#batch"]
+    assert backend.batch_requests == [[("cold", "", {'temperature': 0}), ("sampled", "", {'temperature': 0.9})]]
+
+
+def test_stream_call_relays_then_replays(cached):
+    """A streamed miss is relayed chunk by chunk and stored; the next identical stream replays it as one chunk."""
+    backend, provider = cached
+
+    async def collect(**kwargs):
+        return [chunk async for chunk in provider.stream_call("q", **kwargs)]
+
+    async def run():
+        return await collect(temperature=0), await collect(temperature=0), await collect(temperature=0.7)
+
+    first, second, sampled = asyncio.run(run())
+    assert first == ["Hello", ", ", "world"]
+    assert second == ["Hello, world"]
+    assert sampled == ["Hello", ", ", "world"]
+    assert backend.stream_calls == 2
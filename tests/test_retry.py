@@ -0,0 +1,101 @@
+# /tests/test_retry.py
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import llm_api.providers._retry as retry_module
+from llm_api.providers._retry import is_retryable_status, with_retry
+
+
+class StatusError(Exception):
+    """An SDK-style error carrying an HTTP status and optional response headers."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record requested backoff delays instead of sleeping."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(retry_module.asyncio, "sleep", fake_sleep)
+    return delays
+
+
+def _failing_then_ok(*errors):
+    """Return a coroutine factory that raises each error in turn, then succeeds."""
+    remaining = list(errors)
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return "ok"
+
+    return attempt, calls
+
+
+def test_jitter_never_drops_below_min_wait(sleeps, monkeypatch):
+    """Full jitter may draw 0, but the delay is floored at min_wait."""
+    monkeypatch.setattr(retry_module.random, "uniform", lambda a, b: 0.0)
+    factory, calls = _failing_then_ok(StatusError(503), StatusError(503))
+
+    result = asyncio.run(with_retry(factory, retryable=is_retryable_status, attempts=3, min_wait=0.5))
+
+    assert result == "ok"
+    assert len(calls) == 3
+    assert sleeps == [0.5, 0.5]
+
+
+def test_jitter_is_bounded_by_max_wait(sleeps, monkeypatch):
+    """The jitter window is capped at max_wait however many attempts have failed."""
+    monkeypatch.setattr(retry_module.random, "uniform", lambda a, b: b)
+    factory, _ = _failing_then_ok(*[StatusError(500)] * 5)
+
+    asyncio.run(with_retry(factory, retryable=is_retryable_status, attempts=6, min_wait=1.0, max_wait=4.0))
+
+    assert sleeps == [2.0, 4.0, 4.0, 4.0, 4.0]
+
+
+def test_retry_after_header_extends_the_delay(sleeps, monkeypatch):
+    """A Retry-After longer than the jittered delay is honoured, capped at 4 * max_wait."""
+    monkeypatch.setattr(retry_module.random, "uniform", lambda a, b: 0.0)
+    factory, _ = _failing_then_ok(
+        StatusError(429, {"retry-after": "7"}),
+        StatusError(429, {"retry-after": "600"}),
+    )
+
+    asyncio.run(with_retry(factory, retryable=is_retryable_status, attempts=3, min_wait=0.5, max_wait=16.0))
+
+    assert sleeps == [7.0, 64.0]
+
+
+def test_non_retryable_status_is_raised_immediately(sleeps):
+    """A 4xx other than 429 is not retried."""
+    factory, calls = _failing_then_ok(StatusError(400))
+
+    with pytest.raises(StatusError):
+        asyncio.run(with_retry(factory, retryable=is_retryable_status, attempts=5))
+
+    assert len(calls) == 1
+    assert sleeps == []
+
+
+def test_last_attempt_error_is_raised(sleeps):
+    """When every attempt fails with a transient error, the final error propagates."""
+    factory, calls = _failing_then_ok(*[StatusError(502)] * 3)
+
+    with pytest.raises(StatusError):
+        asyncio.run(with_retry(factory, retryable=is_retryable_status, attempts=3))
+
+    assert len(calls) == 3
+    assert len(sleeps) == 2